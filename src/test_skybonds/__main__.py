@@ -0,0 +1,51 @@
+"""Entry point of all programs, e.g.
+
+    python -m test_skybonds mega-trader --bulk < input.txt
+    python -m test_skybonds fractions --workers 4 < input.txt
+
+Programs are started once per job, so only the module of the requested program is imported and
+modules needed by particular paths are imported when a path is taken.
+"""
+import sys
+from importlib import import_module
+
+#: Modules of programs by command names.
+COMMANDS = {
+    'mega-trader': 'test_skybonds.mega_trader.mega_trader',
+    'scenarios': 'test_skybonds.mega_trader.scenarios',
+    'fractions': 'test_skybonds.fraction_percent_calculation.fraction_percent_calculation',
+    'fractions-decimal': 'test_skybonds.fraction_percent_calculation_decimal.fraction_percent_calculation',
+    'benchmarks': 'test_skybonds.benchmarks',
+    'service': 'test_skybonds.service',
+    'workloads': 'test_skybonds.workloads',
+    'binary': 'test_skybonds.binary',
+}
+USAGE = f'usage: python -m test_skybonds {{{",".join(COMMANDS)}}} [arguments]'
+
+
+def main(argv=()) -> int:
+    """Run the program of a command.
+
+    :param argv: Command name and arguments of the program.
+    :return: Exit code.
+    """
+    if not argv or argv[0] in ('-h', '--help'):
+        print(f'{USAGE}\n\n{__doc__}', file=sys.stdout if argv else sys.stderr)
+        return 0 if argv else 2
+    command, *arguments = argv
+    if command not in COMMANDS:
+        print(f'{USAGE}\nunknown command: {command}', file=sys.stderr)
+        return 2
+    try:
+        return import_module(COMMANDS[command]).main(arguments) or 0
+    except EOFError as exc:
+        # Programs retry invalid lines, so truncated input ends them instead of retrying forever.
+        print(exc, file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        exit(0)
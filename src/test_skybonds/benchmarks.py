@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""Benchmarks of all programs.
+
+Every benchmark generates seeded input of given size and measures parse, compute and output
+stages separately. Times are the best of several runs, peak memory of every stage is measured
+with tracemalloc in a separate run, so tracing does not affect times. Results are written as JSON
+and can be compared with a baseline, e.g.:
+
+    python -m test_skybonds.benchmarks run --sizes 1000 100000 --output baseline.json
+    python -m test_skybonds.benchmarks run --large --output baseline.json
+    python -m test_skybonds.benchmarks compare baseline.json current.json
+
+Startup of programs is checked separately: every program module is imported by a new interpreter
+with -X importtime, its cumulative import time is reported and modules which programs should
+import only on paths needing them must not be imported at startup:
+
+    python -m test_skybonds.benchmarks startup --max-time 0.05
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from functools import partial
+from io import StringIO
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+from unittest.mock import patch
+
+from .workloads import BACKEND, generate, write_fractions_input, write_mega_trader_input
+
+#: Names of measured stages.
+STAGES: Tuple[str, ...] = ('parse', 'compute', 'output')
+#: Sizes measured by default.
+DEFAULT_SIZES: Tuple[int, ...] = (1000, 10000, 100000)
+#: Sizes measured in addition with --large, they take minutes and gigabytes of memory.
+LARGE_SIZES: Tuple[int, ...] = (1000000, 10000000)
+#: Relative growth of time or memory considered as regression by default.
+DEFAULT_THRESHOLD: float = 0.1
+#: Times less than this amount of seconds are too noisy to be compared.
+MIN_COMPARED_TIME: float = 0.001
+#: Modules of programs by benchmark names.
+PROGRAM_MODULES: Dict[str, str] = {
+    'mega_trader': 'test_skybonds.mega_trader.mega_trader',
+    'fraction_percent_calculation': 'test_skybonds.fraction_percent_calculation.fraction_percent_calculation',
+    'fraction_percent_calculation_decimal':
+        'test_skybonds.fraction_percent_calculation_decimal.fraction_percent_calculation',
+}
+#: Modules imported by program paths needing them only, programs must not import them at startup.
+DEFERRED_MODULES: Tuple[str, ...] = ('argparse', 'dataclasses', 'decimal', 'json', 'logging', 'numpy', 'pathlib', 're',
+                                     'tracemalloc', 'typing')
+#: Deferred modules which programs need at startup anyway by benchmark names.
+STARTUP_MODULES: Dict[str, Tuple[str, ...]] = {'fraction_percent_calculation_decimal': ('decimal',)}
+
+
+def mega_trader_stages(data: str) -> Tuple[Callable[[], Any], Callable[[Any], Any], Callable[[Any], str]]:
+    """Get stages of the mega trader.
+
+    :param data: Input data.
+    :return: Parse, compute and output stages, every one takes the result of the previous one.
+    """
+    from .mega_trader.mega_trader import Market, MegaTrader, format_money, read_initial_data, read_lot, serialize_lot
+
+    def parse() -> Tuple[Tuple[int, int, int], list]:
+        stream = StringIO(data)
+        return read_initial_data(stream), list(iter(lambda: read_lot(stream), None))
+
+    def compute(parsed: Tuple[Tuple[int, int, int], list]) -> Tuple[int, list]:
+        (days, lots_per_day, balance), lots = parsed
+        market = Market(days, lots_per_day)
+        for lot in lots:
+            try:
+                market.add(lot)
+            except market.InapplicableSlot:
+                pass
+        trader = MegaTrader(balance)
+        trader.buy_lots(market)
+        return sum(market.evaluate_income(lot) for lot in trader.lots), trader.lots
+
+    def output(result: Tuple[int, list]) -> str:
+        income, lots = result
+        return '\n'.join([str(format_money(income))] + [serialize_lot(lot) for lot in lots])
+
+    return parse, compute, output
+
+
+def fractions_stages(module_name: str) -> Callable[[str], Tuple[Callable[[], Any], Callable[[Any], Any],
+                                                              Callable[[Any], str]]]:
+    """Make stages of a fraction percent calculation package.
+
+    :param module_name: Name of the program module.
+    :return: Function getting parse, compute and output stages for input data.
+    """
+    def stages(data: str) -> Tuple[Callable[[], Any], Callable[[Any], Any], Callable[[Any], str]]:
+        module = importlib.import_module(module_name)
+
+        def parse() -> Tuple[Sequence, Any]:
+            with patch('sys.stdin', StringIO(data)):
+                return module.read_fractions()
+
+        def compute(parsed: Tuple[Sequence, Any]) -> list:
+            return list(module.calculate_percents(*parsed))
+
+        def output(percents: list) -> str:
+            return '\n'.join(map(getattr(module, 'format_fraction', str), percents))
+
+        return parse, compute, output
+
+    return stages
+
+
+@dataclass
+class Benchmark:
+    """Benchmark of a program."""
+    __slots__ = ['generate', 'stages']
+
+    #: Function generating input data of given size with given seed.
+    generate: Callable[[int, int], str]
+    #: Function getting stages for input data.
+    stages: Callable[[str], Tuple[Callable[[], Any], Callable[[Any], Any], Callable[[Any], str]]]
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    'mega_trader': Benchmark(partial(generate, write_mega_trader_input), mega_trader_stages),
+    'fraction_percent_calculation': Benchmark(
+        partial(generate, write_fractions_input),
+        fractions_stages('test_skybonds.fraction_percent_calculation.fraction_percent_calculation')),
+    'fraction_percent_calculation_decimal': Benchmark(
+        partial(generate, write_fractions_input),
+        fractions_stages('test_skybonds.fraction_percent_calculation_decimal.fraction_percent_calculation')),
+}
+
+
+def timed(call: Callable[[], Any]) -> Tuple[Any, float]:
+    """Measure time of a call.
+
+    :param call: Function to call.
+    :return: Result of the call and its time in seconds.
+    """
+    start: float = time.perf_counter()
+    result: Any = call()
+    return result, time.perf_counter() - start
+
+
+def traced(call: Callable[[], Any]) -> Tuple[Any, float]:
+    """Measure peak memory allocated during a call, tracemalloc should be started.
+
+    :param call: Function to call.
+    :return: Result of the call and peak of memory allocated since the call started in bytes.
+    """
+    tracemalloc.reset_peak()
+    start: int = tracemalloc.get_traced_memory()[0]
+    result: Any = call()
+    return result, tracemalloc.get_traced_memory()[1] - start
+
+
+def run_stages(data: str, benchmark: Benchmark,
+               measure: Callable[[Callable[[], Any]], Tuple[Any, float]]) -> Dict[str, float]:
+    """Run stages once measuring every one.
+
+    :param data: Input data.
+    :param benchmark: Benchmark.
+    :param measure: Function calling a stage and measuring it.
+    :return: Measurements by stage names.
+    """
+    result: Any = None
+    measurements: Dict[str, float] = {}
+    for name, stage in zip(STAGES, benchmark.stages(data)):
+        result, measurements[name] = measure(stage if name == 'parse' else lambda: stage(result))
+    return measurements
+
+
+def run_benchmark(name: str, size: int, seed: int, repeat: int) -> Dict[str, Any]:
+    """Run a benchmark.
+
+    :param name: Benchmark name.
+    :param size: Input size.
+    :param seed: Random seed.
+    :param repeat: Amount of timed runs, the best time of every stage is taken.
+    :return: Result with times in seconds and peak memory in bytes by stages.
+    """
+    benchmark: Benchmark = BENCHMARKS[name]
+    data: str = benchmark.generate(size, seed)
+    runs: List[Dict[str, float]] = [run_stages(data, benchmark, timed) for _ in range(repeat)]
+
+    tracemalloc.start()
+    try:
+        peaks: Dict[str, float] = run_stages(data, benchmark, traced)
+    finally:
+        tracemalloc.stop()
+
+    return {'benchmark': name, 'size': size, 'seed': seed,
+            'stages': {stage: {'time': min(run[stage] for run in runs), 'peak_memory': int(peaks[stage])}
+                       for stage in STAGES}}
+
+
+def run(names: Sequence[str], sizes: Sequence[int], seed: int, repeat: int) -> Dict[str, Any]:
+    """Run benchmarks.
+
+    :param names: Benchmark names.
+    :param sizes: Input sizes.
+    :param seed: Random seed.
+    :param repeat: Amount of timed runs.
+    :return: Report with environment description and results.
+    """
+    # Errors of generated input are not interesting, so logging is silenced while running.
+    logging.disable(logging.CRITICAL)
+    try:
+        results: List[Dict[str, Any]] = [run_benchmark(name, size, seed, repeat) for name in names for size in sizes]
+    finally:
+        logging.disable(logging.NOTSET)
+    return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'platform': platform.platform(), 'random': BACKEND, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results}
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Compare results with a baseline.
+
+    :param baseline: Baseline report.
+    :param current: Current report.
+    :param threshold: Relative growth of time or memory considered as regression.
+    :return: Descriptions of regressions.
+    """
+    baseline_results: Dict[Tuple[str, int], Dict[str, Any]] = {
+        (result['benchmark'], result['size']): result for result in baseline['results']}
+    regressions: List[str] = []
+    for result in current['results']:
+        base: Dict[str, Any] = baseline_results.get((result['benchmark'], result['size']))
+        if base is None:
+            continue
+        for stage in STAGES:
+            for metric, unit in [('time', 's'), ('peak_memory', 'B')]:
+                before, after = base['stages'][stage][metric], result['stages'][stage][metric]
+                if metric == 'time' and max(before, after) < MIN_COMPARED_TIME:
+                    continue
+                if after > before * (1 + threshold):
+                    regressions.append(f'{result["benchmark"]} size {result["size"]} {stage} {metric}: '
+                                       f'{before:.6g}{unit} -> {after:.6g}{unit} '
+                                       f'(+{(after / before - 1) * 100 if before else float("inf"):.1f}%)')
+    return regressions
+
+
+def measure_import(module: str, repeat: int) -> Tuple[float, List[str]]:
+    """Measure import of a module by new interpreters with -X importtime.
+
+    :param module: Module name.
+    :param repeat: Amount of runs, the best time is taken.
+    :return: Cumulative import time of the module in seconds and deferred modules it imports.
+    """
+    environment: Dict[str, str] = dict(os.environ)
+    source_path: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [source_path, environment.get('PYTHONPATH')]))
+    best: float = float('inf')
+    imported: List[str] = []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], env=environment,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+        # Lines look like "import time: <self us> | <cumulative us> | <indented name>".
+        times: Dict[str, int] = {}
+        for line in process.stderr.splitlines():
+            if line.startswith('import time:') and line.count('|') == 2:
+                _, cumulative, name = line.split('|')
+                if cumulative.strip().isdigit():
+                    times[name.strip()] = int(cumulative)
+        best = min(best, times[module] / 1e6)
+        imported = sorted(name for name in times if name.split('.')[0] in DEFERRED_MODULES)
+    return best, imported
+
+
+def startup(names: Sequence[str], repeat: int, max_time: float) -> List[str]:
+    """Check startup of programs printing their import times.
+
+    :param names: Benchmark names.
+    :param repeat: Amount of runs.
+    :param max_time: Limit of cumulative import time of a program module in seconds.
+    :return: Descriptions of problems.
+    """
+    problems: List[str] = []
+    print(f'{"program":<38}{"import ms":>12}')
+    for name in names:
+        seconds, imported = measure_import(PROGRAM_MODULES[name], repeat)
+        imported = [module for module in imported if module.split('.')[0] not in STARTUP_MODULES.get(name, ())]
+        print(f'{name:<38}{seconds * 1000:>12.2f}')
+        if seconds > max_time:
+            problems.append(f'{name} is imported in {seconds * 1000:.2f}ms, the limit is {max_time * 1000:.2f}ms')
+        if imported:
+            problems.append(f'{name} imports deferred modules at startup: {", ".join(imported)}')
+    return problems
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Format report as a table.
+
+    :param report: Report.
+    :return: Table.
+    """
+    lines: List[str] = [f'{"benchmark":<38}{"size":>10}' + ''.join(f'{stage + " s":>12}{stage + " MiB":>14}'
+                                                                  for stage in STAGES)]
+    for result in report['results']:
+        lines.append(f'{result["benchmark"]:<38}{result["size"]:>10}' + ''.join(
+            f'{result["stages"][stage]["time"]:>12.4f}{result["stages"][stage]["peak_memory"] / 2 ** 20:>14.2f}'
+            for stage in STAGES))
+    return '\n'.join(lines)
+
+
+def parse_arguments(argv: Sequence[str]) -> argparse.Namespace:
+    """Parse command line arguments.
+
+    :param argv: Command line arguments without the program name.
+    :return: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run benchmarks')
+    run_parser.add_argument('--benchmarks', nargs='+', choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS))
+    run_parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+    run_parser.add_argument('--large', action='store_true', help=f'measure sizes {LARGE_SIZES} in addition')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--repeat', type=int, default=3, help='amount of timed runs, the best one is taken')
+    run_parser.add_argument('--output', type=argparse.FileType('w'), help='file to write JSON report to')
+    compare_parser = commands.add_parser('compare', help='compare a report with a baseline')
+    compare_parser.add_argument('baseline', type=argparse.FileType())
+    compare_parser.add_argument('current', type=argparse.FileType())
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help='relative growth considered as regression')
+    startup_parser = commands.add_parser('startup', help='check import time of programs')
+    startup_parser.add_argument('--benchmarks', nargs='+', choices=sorted(PROGRAM_MODULES),
+                                default=sorted(PROGRAM_MODULES))
+    startup_parser.add_argument('--repeat', type=int, default=5, help='amount of runs, the best one is taken')
+    startup_parser.add_argument('--max-time', type=float, default=float('inf'),
+                                help='limit of import time of a program in seconds')
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] = ()) -> int:
+    """Execute main program flow.
+
+    :param argv: Command line arguments without the program name.
+    :return: Exit code, 1 if there are regressions.
+    """
+    arguments: argparse.Namespace = parse_arguments(argv)
+    if arguments.command == 'run':
+        sizes: List[int] = list(arguments.sizes) + (list(LARGE_SIZES) if arguments.large else [])
+        report: Dict[str, Any] = run(arguments.benchmarks, sizes, arguments.seed, arguments.repeat)
+        print(format_report(report))
+        if arguments.output is not None:
+            with arguments.output:
+                json.dump(report, arguments.output, indent=2)
+        return 0
+    if arguments.command == 'startup':
+        problems: List[str] = startup(arguments.benchmarks, arguments.repeat, arguments.max_time)
+        for problem in problems:
+            print(f'Problem: {problem}')
+        return 1 if problems else 0
+
+    with arguments.baseline, arguments.current:
+        regressions: List[str] = compare(json.load(arguments.baseline), json.load(arguments.current),
+                                         arguments.threshold)
+    for regression in regressions:
+        print(f'Regression: {regression}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        exit(0)
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""Binary columnar input of all programs.
+
+Binary input is loaded without parsing: the file is memory-mapped (or read at once if it is not
+a regular file) and columns are memoryviews of it, so values are taken from the file directly.
+All numbers are little-endian 64-bit signed integers, columns follow the header one after another.
+
+Lots of the mega trader::
+
+    header   magic b'SKYBLOT1', issue period in days, amount of lots per day, balance in thousandths,
+             amount of lots N, size of the name table in bytes
+    columns  N days, N price percents in tenths, N bonds amounts, N bond name ids
+    names    bond names in UTF-8 separated by new lines, a name id is an index in this table
+
+Fractions of fraction percent calculations::
+
+    header   magic b'SKYBFRC1', amount of fractions N
+    column   N fractions in thousandths
+
+Programs read binary input with --input-format binary. Text and binary inputs are converted with
+
+    python -m test_skybonds.binary to-binary mega-trader < input.txt > input.bin
+    python -m test_skybonds.binary to-text fractions < input.bin > input.txt
+
+Lines of text input with errors are logged and not converted, lots the market does not accept are
+converted and rejected by the program reading the binary input. Lots which do not fit the binary format
+(numbers beyond 64-bit integers or price percents with digits below tenths) are logged and not converted,
+and the conversion fails then.
+"""
+from __future__ import annotations
+
+import mmap
+import struct
+import sys
+from array import array
+from decimal import Decimal
+from io import UnsupportedOperation
+
+try:
+    from .logs import lazy_logger
+except ImportError:
+    # The program is started as a script, so the package is imported from the source folder.
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from test_skybonds.logs import lazy_logger
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import argparse
+    import logging
+    from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+    from .mega_trader.mega_trader import Market
+    from .validation import ErrorReport
+
+get_logger, __getattr__ = lazy_logger(globals())
+logger: logging.Logger
+
+#: Format marker of lots.
+LOTS_MAGIC: bytes = b'SKYBLOT1'
+#: Header of lots: magic, issue period, amount of lots per day, balance, amount of lots and size of names.
+LOTS_HEADER = struct.Struct('<8s5q')
+#: Lot columns in order of the file.
+LOT_COLUMNS: Tuple[str, ...] = ('days', 'bond_price_percents', 'bonds_amounts', 'name_ids')
+#: Format marker of fractions.
+FRACTIONS_MAGIC: bytes = b'SKYBFRC1'
+#: Header of fractions: magic and amount of fractions.
+FRACTIONS_HEADER = struct.Struct('<8sq')
+#: Size of a column value.
+ITEM_SIZE: int = array('q').itemsize
+#: Range of 64-bit integers.
+INT64_MIN: int = -1 << 63
+INT64_MAX: int = (1 << 63) - 1
+#: Amount of lines formatted at once by conversion to text.
+CHUNK_SIZE: int = 1 << 16
+
+
+class BinaryFormatError(ValueError):
+    """Error happens if binary input is malformed."""
+    ...
+
+
+def map_input(stream: BinaryIO) -> memoryview:
+    """Map the rest of a binary stream into memory.
+
+    Regular files are memory-mapped, other streams are read at once.
+    :param stream: Binary stream.
+    :return: Input data.
+    """
+    try:
+        if stream.tell() == 0:
+            return memoryview(mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError, UnsupportedOperation):
+        # Pipes and in-memory streams can not be mapped, mmap also fails on empty files.
+        pass
+    return memoryview(stream.read())
+
+
+def column(data: memoryview, offset: int, amount: int) -> memoryview:
+    """Get a column of 64-bit integers.
+
+    :param data: Input data.
+    :param offset: Offset of the column.
+    :param amount: Amount of values.
+    :return: Values in native byte order, they are copied only on big-endian platforms.
+    """
+    view: memoryview = data[offset:offset + amount * ITEM_SIZE].cast('q')
+    if sys.byteorder == 'little':
+        return view
+    values: array = array('q', view)
+    values.byteswap()
+    return memoryview(values)
+
+
+def pack_column(values: Iterable[int]) -> bytes:
+    """Pack a column of 64-bit integers.
+
+    :param values: Values.
+    :return: Little-endian values.
+    """
+    packed: array = array('q', values)
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+class BondNames:
+    """Bond names of lots looked up by name ids without creating a list of names."""
+
+    def __init__(self, name_ids: Sequence[int], names: List[str]) -> None:
+        """Initialize an instance.
+
+        :param name_ids: Name ids of lots.
+        :param names: Name table.
+        """
+        self.name_ids: Sequence[int] = name_ids
+        self.names: List[str] = names
+
+    def __len__(self) -> int:
+        return len(self.name_ids)
+
+    def __getitem__(self, position: int) -> str:
+        return self.names[self.name_ids[position]]
+
+    def __iter__(self) -> Iterator[str]:
+        return map(self.names.__getitem__, self.name_ids)
+
+
+class BinaryLots:
+    """Lots loaded from binary input, columns are views of the input."""
+    __slots__ = ['initial_data', 'days', 'bond_price_percents', 'bonds_amounts', 'name_ids', 'bond_names']
+
+    #: Issue period in days, amount of lots per day and balance in thousandths.
+    initial_data: Tuple[int, int, int]
+    days: memoryview
+    #: Price percents in tenths.
+    bond_price_percents: memoryview
+    bonds_amounts: memoryview
+    name_ids: memoryview
+    bond_names: BondNames
+
+    def __init__(self, initial_data: Tuple[int, int, int], days: memoryview, bond_price_percents: memoryview,
+                 bonds_amounts: memoryview, name_ids: memoryview, names: List[str]) -> None:
+        """Initialize an instance.
+
+        :param initial_data: Issue period in days, amount of lots per day and balance in thousandths.
+        :param days: Start days when lots are issued.
+        :param bond_price_percents: Price percents of one bond in tenths.
+        :param bonds_amounts: Amounts of bonds in lots.
+        :param name_ids: Bond name ids of lots.
+        :param names: Name table.
+        """
+        self.initial_data = initial_data
+        self.days = days
+        self.bond_price_percents = bond_price_percents
+        self.bonds_amounts = bonds_amounts
+        self.name_ids = name_ids
+        self.bond_names = BondNames(name_ids, names)
+
+    @classmethod
+    def parse(cls, data: memoryview) -> BinaryLots:
+        """Parse binary lots.
+
+        :param data: Input data.
+        :return: Lots.
+        """
+        try:
+            magic, days, lots_per_day, balance, lots_amount, names_size = LOTS_HEADER.unpack_from(data)
+        except struct.error:
+            raise BinaryFormatError('Malformed binary lots. The header is truncated')
+        columns_size: int = len(LOT_COLUMNS) * lots_amount * ITEM_SIZE
+        if magic != LOTS_MAGIC:
+            raise BinaryFormatError(f'Malformed binary lots. The input should start with {LOTS_MAGIC!r}')
+        if lots_amount < 0 or names_size < 0 or len(data) != LOTS_HEADER.size + columns_size + names_size:
+            raise BinaryFormatError('Malformed binary lots. Sizes of columns and names do not match the header')
+
+        offset: int = LOTS_HEADER.size + columns_size
+        try:
+            names: List[str] = list(map(sys.intern, str(data[offset:], 'utf-8').split('\n'))) if lots_amount else []
+        except UnicodeDecodeError:
+            raise BinaryFormatError('Malformed binary lots. Bond names should be encoded in UTF-8')
+        lots = cls((days, lots_per_day, balance),
+                   *(column(data, LOTS_HEADER.size + index * lots_amount * ITEM_SIZE, lots_amount)
+                     for index in range(len(LOT_COLUMNS))), names)
+        if lots_amount and not (0 <= min(lots.name_ids) and max(lots.name_ids) < len(names)):
+            raise BinaryFormatError('Malformed binary lots. Bond name ids should be indexes of the name table')
+        if lots_amount and min(lots.bond_price_percents) < 0:
+            raise BinaryFormatError('Malformed binary lots. Price percents should not be negative')
+        return lots
+
+    def fill(self, market: Market, report: Optional[ErrorReport] = None) -> None:
+        """Issue lots to given market.
+
+        Lots the market does not accept are logged in order with their numbers in the input.
+        :param market: Market to issue lots to.
+        :param report: Report to collect errors into, errors are logged one by one if it is not given.
+        """
+        errors: List[Tuple[int, str]] = [(position + 1, str(exc)) for position, exc in market.extend(
+            self.days, self.bond_price_percents, self.bonds_amounts, self.bond_names)]
+
+        if report is not None:
+            report.extend(errors)
+            return
+        for number, message in errors:
+            get_logger().error(f'Lot {number}: {message}')
+
+
+def parse_fractions(data: memoryview) -> memoryview:
+    """Parse binary fractions.
+
+    :param data: Input data.
+    :return: Fractions in thousandths.
+    """
+    try:
+        magic, fractions_amount = FRACTIONS_HEADER.unpack_from(data)
+    except struct.error:
+        raise BinaryFormatError('Malformed binary fractions. The header is truncated')
+    if magic != FRACTIONS_MAGIC:
+        raise BinaryFormatError(f'Malformed binary fractions. The input should start with {FRACTIONS_MAGIC!r}')
+    if fractions_amount < 0 or len(data) != FRACTIONS_HEADER.size + fractions_amount * ITEM_SIZE:
+        raise BinaryFormatError('Malformed binary fractions. Size of the column does not match the header')
+
+    fractions: memoryview = column(data, FRACTIONS_HEADER.size, fractions_amount)
+    if fractions_amount and min(fractions) <= 0:
+        raise BinaryFormatError('Malformed binary fractions. Fractions should be greater than 0')
+    return fractions
+
+
+def read_lots(stream: BinaryIO) -> Optional[BinaryLots]:
+    """Load binary lots from a stream.
+
+    :param stream: Binary stream.
+    :return: Lots or None if the input is malformed, the error is logged.
+    """
+    try:
+        return BinaryLots.parse(map_input(stream))
+    except BinaryFormatError as exc:
+        get_logger().error(str(exc))
+    return None
+
+
+def read_fractions(stream: BinaryIO) -> Optional[memoryview]:
+    """Load binary fractions from a stream.
+
+    :param stream: Binary stream.
+    :return: Fractions in thousandths or None if the input is malformed, the error is logged.
+    """
+    try:
+        return parse_fractions(map_input(stream))
+    except BinaryFormatError as exc:
+        get_logger().error(str(exc))
+    return None
+
+
+def fits_int64(value: int) -> bool:
+    """Check whether a value can be written into a column.
+
+    :param value: Value.
+    :return: Whether the value is a 64-bit integer.
+    """
+    return type(value) is int and INT64_MIN <= value <= INT64_MAX
+
+
+def whole_tenths(value: Union[int, Decimal]) -> Union[int, Decimal]:
+    """Convert a price percent in whole tenths into an integer.
+
+    :param value: Price percent in tenths.
+    :return: Integer tenths or the decimal itself if it has digits below tenths.
+    """
+    if isinstance(value, Decimal) and value == value.to_integral_value():
+        return int(value)
+    return value
+
+
+def write_lots(stream: BinaryIO, initial_data: Tuple[int, int, int], days: Sequence[int],
+               bond_price_percents: Sequence[int], bonds_amounts: Sequence[int], bond_names: Sequence[str]) -> None:
+    """Write binary lots.
+
+    :param stream: Binary output stream.
+    :param initial_data: Issue period in days, amount of lots per day and balance in thousandths.
+    :param days: Start days when lots are issued.
+    :param bond_price_percents: Price percents of one bond in tenths.
+    :param bonds_amounts: Amounts of bonds in lots.
+    :param bond_names: Bond names, they can not contain new lines.
+    """
+    name_ids: Dict[str, int] = {}
+    ids: bytes = pack_column([name_ids.setdefault(bond_name, len(name_ids)) for bond_name in bond_names])
+    names: bytes = '\n'.join(name_ids).encode()
+    stream.write(LOTS_HEADER.pack(LOTS_MAGIC, *initial_data, len(days), len(names)))
+    for values in (days, bond_price_percents, bonds_amounts):
+        stream.write(pack_column(values))
+    stream.write(ids)
+    stream.write(names)
+
+
+def write_fractions(stream: BinaryIO, fractions: Sequence[int]) -> None:
+    """Write binary fractions.
+
+    :param stream: Binary output stream.
+    :param fractions: Fractions in thousandths.
+    """
+    stream.write(FRACTIONS_HEADER.pack(FRACTIONS_MAGIC, len(fractions)))
+    stream.write(pack_column(fractions))
+
+
+def format_thousandths(value: int) -> str:
+    """Format thousandths without trailing zero decimals.
+
+    :param value: Value in thousandths.
+    :return: String representation.
+    """
+    integral, fractional = divmod(value, 1000)
+    return f'{integral}.{fractional:03}'.rstrip('0').rstrip('.') if fractional else str(integral)
+
+
+def lots_to_binary(target: BinaryIO) -> bool:
+    """Convert text lots of standard input into binary ones.
+
+    Percents without digits below tenths are converted whatever decimals they are written with.
+    :param target: Binary output.
+    :return: Whether the input has valid initial data and all valid lots are converted.
+    """
+    from .mega_trader.bulk import BulkInput, logger as bulk_logger
+
+    bulk_input: BulkInput = BulkInput.read(sys.stdin)
+    columns: Tuple[Sequence, ...] = (bulk_input.days, bulk_input.bond_price_percents, bulk_input.bonds_amounts,
+                                     bulk_input.bond_names)
+    errors: List[Tuple[int, str]] = list(bulk_input.errors)
+    dropped: bool = False
+    if not all(isinstance(values, array) for values in columns[:-1]):
+        # Lines parsed one by one can have numbers which do not fit columns of the binary format.
+        columns = (columns[0], list(map(whole_tenths, columns[1])), *columns[2:])
+        positions: List[int] = []
+        for position, values in enumerate(zip(*columns[:-1])):
+            if all(map(fits_int64, values)):
+                positions.append(position)
+            else:
+                dropped = True
+                errors.append((bulk_input.line_numbers[position], 'Lot does not fit the binary format. '
+                               'Numbers should fit 64-bit integers and price percents should be in whole tenths'))
+        columns = tuple([values[position] for position in positions] for values in columns)
+    for line_number, message in sorted(errors):
+        bulk_logger.error(f'Line {line_number}: {message}')
+    if bulk_input.initial_data is None:
+        return False
+    if not all(map(fits_int64, bulk_input.initial_data)):
+        get_logger().error('Initial data does not fit the binary format. Numbers should fit 64-bit integers')
+        return False
+
+    write_lots(target, bulk_input.initial_data, *columns)
+    return not dropped
+
+
+def lots_to_text(target: BinaryIO) -> bool:
+    """Convert binary lots of standard input into text ones.
+
+    :param target: Text output.
+    :return: Whether the input is valid.
+    """
+    lots: Optional[BinaryLots] = read_lots(sys.stdin.buffer)
+    if lots is None:
+        return False
+    days, lots_per_day, balance = lots.initial_data
+    target.write(f'{days} {lots_per_day} {format_thousandths(balance)}\n'.encode())
+    for first in range(0, len(lots.days), CHUNK_SIZE):
+        last: int = first + CHUNK_SIZE
+        target.write(''.join(
+            f'{day} {bond_name} {bond_price_percent // 10}.{bond_price_percent % 10} {bonds_amount}\n'
+            for day, bond_name, bond_price_percent, bonds_amount in zip(
+                lots.days[first:last], map(lots.bond_names.names.__getitem__, lots.name_ids[first:last]),
+                lots.bond_price_percents[first:last], lots.bonds_amounts[first:last])).encode())
+    return True
+
+
+def fractions_to_binary(target: BinaryIO) -> bool:
+    """Convert text fractions of standard input into binary ones.
+
+    Fractions are validated the same way as by the Decimal calculation.
+    :param target: Binary output.
+    :return: Whether all fractions are whole thousandths.
+    """
+    from .fraction_percent_calculation_decimal import fixed_point
+    from .fraction_percent_calculation_decimal.fraction_percent_calculation import read_fraction_amount
+
+    fractions, decimals = fixed_point.read_fractions(read_fraction_amount())
+    if decimals != fixed_point.DEFAULT_DECIMALS:
+        get_logger().error(f'Fractions with more than {fixed_point.DEFAULT_DECIMALS} decimals '
+                           'can not be written in thousandths.')
+        return False
+    write_fractions(target, fractions)
+    return True
+
+
+def fractions_to_text(target: BinaryIO) -> bool:
+    """Convert binary fractions of standard input into text ones.
+
+    :param target: Text output.
+    :return: Whether the input is valid.
+    """
+    fractions: Optional[memoryview] = read_fractions(sys.stdin.buffer)
+    if fractions is None:
+        return False
+    target.write(f'{len(fractions)}\n'.encode())
+    for first in range(0, len(fractions), CHUNK_SIZE):
+        target.write(''.join(f'{fraction // 1000}.{fraction % 1000:03}\n'
+                             for fraction in fractions[first:first + CHUNK_SIZE]).encode())
+    return True
+
+
+#: Converters by direction and program.
+CONVERTERS = {
+    ('to-binary', 'mega-trader'): lots_to_binary,
+    ('to-text', 'mega-trader'): lots_to_text,
+    ('to-binary', 'fractions'): fractions_to_binary,
+    ('to-text', 'fractions'): fractions_to_text,
+}
+
+
+def parse_arguments(argv: Sequence[str]) -> argparse.Namespace:
+    """Parse command line arguments.
+
+    :param argv: Command line arguments without the program name.
+    :return: Parsed arguments.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('direction', choices=['to-binary', 'to-text'], help='form to convert standard input to')
+    parser.add_argument('program', choices=['mega-trader', 'fractions'], help='program the input is for')
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] = ()) -> int:
+    """Convert standard input and write it to standard output.
+
+    :param argv: Command line arguments without the program name.
+    :return: Exit code.
+    """
+    arguments: argparse.Namespace = parse_arguments(argv)
+    converted: bool = CONVERTERS[arguments.direction, arguments.program](sys.stdout.buffer)
+    sys.stdout.buffer.flush()
+    return 0 if converted else 1
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        exit(0)
@@ -0,0 +1,75 @@
+"""Bulk fraction reading.
+
+The whole input is read at once and split into lines. Blocks of lines are converted with a single
+call and checked together, lines are validated one by one only in blocks with invalid ones.
+Errors are collected into an aggregated report instead of being logged line by line.
+"""
+from array import array
+from itertools import repeat
+from typing import List, Tuple
+
+from ..validation import ErrorReport
+from .fraction_percent_calculation import logger
+
+
+def read_fractions(data: bytes, report: ErrorReport) -> Tuple[array, float]:
+    """Read fraction amount and fractions validating them the same way reading from standard input does.
+
+    Invalid lines are replaced with the following ones, lines after the last needed fraction are ignored.
+    :param data: Input data.
+    :param report: Report to collect errors into.
+    :return: Fractions and their sum.
+    """
+    lines: List[bytes] = data.splitlines()
+    position: int = 0
+    while position < len(lines) and not lines[position].strip().decode(errors='replace').isdigit():
+        report.add(position + 1, 'Incorrect input. Should be an integer.')
+        position += 1
+
+    fractions: array = array('f')
+    fractions_sum: float = 0
+    if position == len(lines):
+        return fractions, fractions_sum
+
+    fractions_amount: int = int(lines[position])
+    position += 1
+    while len(fractions) < fractions_amount and position < len(lines):
+        block: List[bytes] = lines[position:position + fractions_amount - len(fractions)]
+        try:
+            values: List[float] = list(map(float, block))
+        except ValueError:
+            values = []
+        # NaN is accepted as it is not less than or equal to 0.
+        if len(values) < len(block) or any(value <= 0 for value in values):
+            values = parse_values(block, position + 1, report)
+        position += len(block)
+
+        values = list(map(round, values, repeat(3)))
+        fractions.extend(values)
+        for value in values:
+            fractions_sum += value
+
+    if len(fractions) < fractions_amount:
+        logger.error(f'Unexpected end of input. {fractions_amount} fractions should be given.')
+    return fractions, fractions_sum
+
+
+def parse_values(lines: List[bytes], first_line_number: int, report: ErrorReport) -> List[float]:
+    """Parse lines one by one.
+
+    :param lines: Lines.
+    :param first_line_number: Number of the first line in the input.
+    :param report: Report to collect errors into.
+    :return: Valid fractions.
+    """
+    values: List[float] = []
+    for line_number, line in enumerate(lines, first_line_number):
+        try:
+            value: float = float(line.decode(errors='replace'))
+        except ValueError:
+            value = 0
+        if value <= 0:
+            report.add(line_number, 'Incorrect input. Should be a rational positive number greater than 0.')
+        else:
+            values.append(value)
+    return values
@@ -1,53 +1,86 @@
 #!/usr/bin/env python3
 """The program converts fractions to their percentage values."""
-import logging
+from __future__ import annotations
+
 import sys
 from array import array
-from typing import Iterable, Optional
+from contextlib import nullcontext
+
+try:
+    from ..instrumentation import MODES, Instrumentation, measure
+    from ..logs import lazy_logger
+    from ..output import BINARY_FORMATS, BulkWriter
+except ImportError:
+    # The program is started as a script, so the package is imported from the source folder.
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+    from test_skybonds.instrumentation import MODES, Instrumentation, measure
+    from test_skybonds.logs import lazy_logger
+    from test_skybonds.output import BINARY_FORMATS, BulkWriter
+
+# Modules which are used for annotations only are not imported to start faster.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import argparse
+    import logging
+    from typing import Iterable, List, Optional, Sequence, Tuple
 
-logger = logging.Logger(__name__, level=logging.INFO)
-logger.addHandler(logging.StreamHandler())
+get_logger, __getattr__ = lazy_logger(globals())
+logger: logging.Logger
+
+#: Amount of fractions kept in memory at once by two pass calculation.
+BLOCK_SIZE: int = 4096
 
 
 def read_fraction_amount() -> int:
     """Read fraction amount from standard input.
 
     :return: Fraction amount.
+    :raise EOFError: If the input ends before the amount.
     """
     while True:
-        value: str = sys.stdin.readline().strip()
+        line: str = sys.stdin.readline()
+        if not line:
+            raise EOFError('Unexpected end of input. Fraction amount should be given.')
+        value: str = line.strip()
         if not value.isdigit():
-            logger.error('Incorrect input. Should be an integer.')
+            get_logger().error('Incorrect input. Should be an integer.')
         else:
             break
 
     return int(value)
 
 
-def read_fraction() -> float:
+def read_fraction(log_errors: bool = True) -> float:
     """Read fraction value from given read stream function.
 
+    :param log_errors: Whether incorrect lines are logged, they are skipped anyway.
     :return: Fraction value.
+    :raise EOFError: If the input ends before the fraction.
     """
     value: Optional[float] = None
     while True:
+        line: str = sys.stdin.readline()
+        if not line:
+            raise EOFError('Unexpected end of input. Fewer fractions are given than their amount.')
         try:
-            value = float(sys.stdin.readline().strip())
+            value = float(line.strip())
         except ValueError:
             pass
 
         if value is None or value <= 0:
-            logger.error('Incorrect input. Should be a rational positive number greater than 0.')
+            if log_errors:
+                get_logger().error('Incorrect input. Should be a rational positive number greater than 0.')
         else:
             break
 
     return round(value, 3)
 
 
-def calculate_fraction_percents() -> Iterable[float]:
-    """Calculate faction percents.
+def read_fractions() -> Tuple[array, float]:
+    """Read fraction amount and fractions from standard input.
 
-    :return: Iterable with calculated percents.
+    :return: Fractions and their sum.
     """
     fractions_amount: int = read_fraction_amount()
     fractions: array = array('f')
@@ -56,10 +89,62 @@ def calculate_fraction_percents() -> Iterable[float]:
         fraction = read_fraction()
         fractions.append(fraction)
         fractions_sum += fraction
+    return fractions, fractions_sum
+
+
+def scale_thousandths(thousandths: Sequence[int]) -> Tuple[array, float]:
+    """Convert fractions in thousandths the same way reading of text fractions does.
+
+    :param thousandths: Fractions in thousandths.
+    :return: Fractions and their sum.
+    """
+    values: List[float] = [fraction / 1000 for fraction in thousandths]
+    fractions_sum: float = 0
+    for fraction in values:
+        fractions_sum += fraction
+    return array('f', values), fractions_sum
+
+
+def calculate_percents(fractions: Iterable[float], fractions_sum: float) -> Iterable[float]:
+    """Calculate percents of fractions.
+
+    :param fractions: Fractions.
+    :param fractions_sum: Sum of fractions.
+    :return: Iterable with calculated percents.
+    """
     for fraction in fractions:
         yield fraction / fractions_sum
 
 
+def calculate_fraction_percents() -> Iterable[float]:
+    """Calculate faction percents.
+
+    :return: Iterable with calculated percents.
+    """
+    return calculate_percents(*read_fractions())
+
+
+def calculate_fraction_percents_in_two_passes() -> Iterable[float]:
+    """Calculate faction percents reading fractions twice instead of keeping them.
+
+    The first pass calculates the sum, the second one reads fractions again from the same position
+    of seekable standard input by blocks, so used memory does not depend on amount of fractions.
+    Errors are logged by the first pass only.
+    :return: Iterable with calculated percents.
+    """
+    fractions_amount: int = read_fraction_amount()
+    start: int = sys.stdin.tell()
+    fractions_sum: float = 0
+    for number in range(1, fractions_amount + 1):
+        fractions_sum += read_fraction()
+
+    sys.stdin.seek(start)
+    for first in range(0, fractions_amount, BLOCK_SIZE):
+        block_size: int = min(BLOCK_SIZE, fractions_amount - first)
+        fractions: array = array('f', (read_fraction(log_errors=False) for _ in range(block_size)))
+        yield from calculate_percents(fractions, fractions_sum)
+
+
 def format_fraction(value: float) -> str:
     """Format fraction to string adding leading zeroes.
 
@@ -69,14 +154,146 @@ def format_fraction(value: float) -> str:
     return '{:.3f}'.format(value)
 
 
-def main() -> None:
-    """Execute program flow."""
-    for percent in calculate_fraction_percents():
-        print(format_fraction(percent))
+def write_percents(writer: BulkWriter, percents: Iterable[float], binary_format: Optional[str] = None) -> None:
+    """Write percents as formatted lines or as binary numbers.
+
+    :param writer: Output writer.
+    :param percents: Percents.
+    :param binary_format: Binary format, percents are written as text if it is not given.
+        Percents are rounded to thousandths the same way as text for int64 format.
+    """
+    if binary_format is None:
+        writer.write_lines(map(format_fraction, percents))
+    elif binary_format == 'int64':
+        writer.write_numbers((int(format_fraction(percent).replace('.', '')) for percent in percents), binary_format)
+    else:
+        writer.write_numbers(percents, binary_format)
+
+
+def parse_arguments(argv: Sequence[str]) -> argparse.Namespace:
+    """Parse command line arguments.
+
+    :param argv: Command line arguments without the program name.
+    :return: Parsed arguments.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--vectorized', action='store_true',
+                        help='read the whole input at once and calculate percents with NumPy in float64')
+    parser.add_argument('--two-pass', action='store_true',
+                        help='read seekable input twice instead of keeping fractions in memory')
+    parser.add_argument('--aggregate-errors', action='store_true',
+                        help='read the whole input at once and log counts of errors with sample line numbers '
+                             'instead of every invalid line')
+    parser.add_argument('--binary', choices=sorted(BINARY_FORMATS),
+                        help='write percents as raw numbers in native byte order, int64 ones are in thousandths')
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help='read the whole input at once and parse and format it in N worker processes')
+    parser.add_argument('--input-format', choices=['text', 'binary'], default='text',
+                        help='read text lines or binary fractions made by "python -m test_skybonds.binary", '
+                             'binary input is memory-mapped if it is a file')
+    parser.add_argument('--instrument', nargs='?', choices=MODES, const='memory',
+                        help='write time, amounts of items and peak memory of every stage to standard error as JSON, '
+                             'the time mode does not trace memory')
+    arguments: argparse.Namespace = parser.parse_args(argv)
+    if arguments.vectorized and arguments.two_pass:
+        parser.error('--vectorized and --two-pass can not be used together')
+    if arguments.workers is not None and (arguments.vectorized or arguments.two_pass or arguments.workers < 1):
+        parser.error('--workers should be positive and can not be used with --vectorized or --two-pass')
+    if arguments.aggregate_errors and (arguments.vectorized or arguments.two_pass or arguments.workers is not None):
+        parser.error('--aggregate-errors can not be used with --vectorized, --two-pass or --workers')
+    if arguments.input_format == 'binary' and (arguments.two_pass or arguments.workers is not None
+                                               or arguments.aggregate_errors):
+        parser.error('--input-format binary can not be used with --two-pass, --workers or --aggregate-errors')
+    return arguments
+
+
+def main(argv: Sequence[str] = ()) -> None:
+    """Execute program flow.
+
+    :param argv: Command line arguments without the program name.
+    """
+    arguments: argparse.Namespace = parse_arguments(argv)
+    instrumentation: Optional[Instrumentation] = Instrumentation.create(
+        'fraction_percent_calculation', arguments.instrument, loggers=[get_logger()])
+    if instrumentation is not None:
+        # Rejected lines are logged while they are read.
+        instrumentation.instrument(sys.modules[__name__], 'read_fraction_amount', 'read')
+        instrumentation.instrument(sys.modules[__name__], 'read_fraction', 'read')
+    with instrumentation or nullcontext(), BulkWriter() as writer:
+        thousandths: Optional[memoryview] = None
+        if arguments.input_format == 'binary':
+            from ..binary import read_fractions as read_binary_fractions
+            with measure(instrumentation, 'read') as stage:
+                thousandths = read_binary_fractions(sys.stdin.buffer)
+            if thousandths is None:
+                return
+            if stage is not None:
+                stage.items += len(thousandths)
+        if arguments.vectorized:
+            from . import vectorized
+            if instrumentation is not None:
+                instrumentation.count_errors(vectorized.logger)
+            with measure(instrumentation, 'read') as stage:
+                fractions = (vectorized.parse_fractions(vectorized.read_all(sys.stdin)) if thousandths is None
+                             else vectorized.from_thousandths(thousandths))
+            if stage is not None and thousandths is None:
+                stage.items += len(fractions)
+            with measure(instrumentation, 'format', len(fractions)):
+                percents = vectorized.calculate_percents(fractions)
+                if arguments.binary == 'int64':
+                    writer.write_bytes(vectorized.round_thousandths(percents).tobytes())
+                elif arguments.binary == 'float64':
+                    writer.write_bytes(percents.tobytes())
+                else:
+                    writer.write_encoded(vectorized.format_percents(percents))
+            return
+        if arguments.workers is not None:
+            from .parallel import logger as parallel_logger, write_percents_in_parallel
+            from .vectorized import read_all
+            if instrumentation is not None:
+                instrumentation.count_errors(parallel_logger)
+            with measure(instrumentation, 'read'):
+                data: bytes = read_all(sys.stdin)
+            with measure(instrumentation, 'format'):
+                write_percents_in_parallel(data, arguments.workers, writer, arguments.binary)
+            return
+        if arguments.two_pass:
+            if not sys.stdin.seekable():
+                get_logger().error('Two pass calculation requires seekable input, e.g. a file.')
+                return
+            with measure(instrumentation, 'format'):
+                write_percents(writer, calculate_fraction_percents_in_two_passes(), arguments.binary)
+            return
+        if arguments.aggregate_errors:
+            from .bulk import logger as bulk_logger, read_fractions as read_fractions_in_bulk
+            from .vectorized import read_all
+            from ..validation import ErrorReport
+            report: ErrorReport = ErrorReport()
+            if instrumentation is not None:
+                instrumentation.count_errors(bulk_logger)
+            with measure(instrumentation, 'read') as stage:
+                fractions, fractions_sum = read_fractions_in_bulk(read_all(sys.stdin), report)
+            if stage is not None:
+                stage.items += len(fractions)
+                stage.rejected += len(report)
+            report.log(get_logger())
+            with measure(instrumentation, 'format', len(fractions)):
+                write_percents(writer, calculate_percents(fractions, fractions_sum), arguments.binary)
+            return
+
+        # Fractions are added up while they are read, so the sum stage excludes reading only.
+        with measure(instrumentation, 'sum'):
+            fractions, fractions_sum = read_fractions() if thousandths is None else scale_thousandths(thousandths)
+        with measure(instrumentation, 'format', len(fractions)):
+            write_percents(writer, calculate_percents(fractions, fractions_sum), arguments.binary)
 
 
 if __name__ == '__main__':
     try:
-        main()
+        main(sys.argv[1:])
+    except EOFError as exc:
+        sys.exit(str(exc))
     except KeyboardInterrupt:
         exit(0)
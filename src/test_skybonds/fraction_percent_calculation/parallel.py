@@ -0,0 +1,214 @@
+"""Parallel fraction percent calculation.
+
+The whole input is put into shared memory and split into ranges of whole lines. Worker processes
+parse and validate their ranges the way read_fraction does and put rounded fractions into a shared
+array, every range starting at its own position, so only partial sums and numbers of rejected lines
+are sent back. Rejected lines are logged in the input order, then workers calculate and format
+percents of their ranges against the total sum, and the results are written in the input order.
+Partial sums are added in the input order, so the total differs from the sequential sum by
+rounding at range boundaries only.
+"""
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO, TextIOWrapper
+from itertools import repeat
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional, Tuple
+
+from ..output import BulkWriter
+from .fraction_percent_calculation import logger, write_percents
+
+#: Ranges are not made smaller than this amount of bytes.
+MIN_CHUNK_SIZE: int = 1 << 20
+#: Amount of ranges per worker, more ranges balance the load better.
+CHUNKS_PER_WORKER: int = 4
+#: Size of a fraction in the shared array.
+FRACTION_SIZE: int = array('d').itemsize
+
+
+@dataclass
+class Chunk:
+    """Range of whole lines of the input and results of its parsing."""
+    __slots__ = ['start', 'end', 'position', 'amount', 'fractions_sum', 'rejected']
+
+    start: int
+    end: int
+    #: Position of the first fraction of the range in the shared array.
+    position: int
+    #: Amount of valid fractions.
+    amount: int
+    fractions_sum: float
+    #: Numbers of rejected lines counted from 0 within the range.
+    rejected: List[int]
+
+
+def read_fraction_amount(data: bytes) -> Tuple[Optional[int], int]:
+    """Read fraction amount the way reading from standard input does.
+
+    :param data: Input data.
+    :return: Fraction amount or None if there is no valid one, and position of the first fraction line.
+    """
+    position: int = 0
+    while position < len(data):
+        end: int = data.find(b'\n', position) + 1 or len(data)
+        value: str = data[position:end].strip().decode(errors='replace')
+        position = end
+        if value.isdigit():
+            return int(value), position
+        logger.error('Incorrect input. Should be an integer.')
+    return None, position
+
+
+def split_chunks(data: bytes, start: int, chunk_size: int) -> Tuple[List[Chunk], int]:
+    """Split data into ranges of whole lines.
+
+    Every range gets a place for as many fractions as it may have lines.
+    :param data: Input data.
+    :param start: Position of the first line.
+    :param chunk_size: Approximate size of a range in bytes.
+    :return: Ranges and size of the array of fractions.
+    """
+    chunks: List[Chunk] = []
+    position: int = 0
+    while start < len(data):
+        end: int = data.find(b'\n', start + chunk_size - 1) + 1 or len(data)
+        chunks.append(Chunk(start, end, position, 0, 0, []))
+        # Carriage returns are line breaks for text reading as well.
+        position += data.count(b'\n', start, end) + data.count(b'\r', start, end) + 1
+        start = end
+    return chunks, position
+
+
+def parse_chunk(input_name: str, fractions_name: str, chunk: Chunk) -> Chunk:
+    """Parse fractions of a range into the shared array.
+
+    :param input_name: Name of shared memory with input data.
+    :param fractions_name: Name of shared memory with the array of fractions.
+    :param chunk: Range.
+    :return: The range with amount and sum of valid fractions and rejected lines.
+    """
+    input_memory = SharedMemory(input_name)
+    fractions_memory = SharedMemory(fractions_name)
+    try:
+        fractions: array = array('d')
+        for line_number, line in enumerate(bytes(input_memory.buf[chunk.start:chunk.end]).splitlines()):
+            try:
+                value: float = float(line)
+            except ValueError:
+                try:
+                    value = float(line.decode(errors='replace'))
+                except ValueError:
+                    value = 0
+
+            if value <= 0:
+                chunk.rejected.append(line_number)
+            else:
+                value = round(value, 3)
+                fractions.append(value)
+                chunk.fractions_sum += value
+
+        chunk.amount = len(fractions)
+        fractions_memory.buf[chunk.position * FRACTION_SIZE:(chunk.position + chunk.amount) * FRACTION_SIZE] = \
+            fractions.tobytes()
+    finally:
+        input_memory.close()
+        fractions_memory.close()
+    return chunk
+
+
+def format_chunk(fractions_name: str, chunk: Chunk, fractions_sum: float, binary_format: Optional[str]) -> bytes:
+    """Calculate and format percents of a range.
+
+    Fractions are kept in float32 as sequential calculation does.
+    :param fractions_name: Name of shared memory with the array of fractions.
+    :param chunk: Parsed range.
+    :param fractions_sum: Sum of all fractions.
+    :param binary_format: Binary format, percents are formatted as text if it is not given.
+    :return: Output of the range.
+    """
+    fractions_memory = SharedMemory(fractions_name)
+    try:
+        fractions: array = array('d')
+        fractions.frombytes(fractions_memory.buf[chunk.position * FRACTION_SIZE:
+                                                 (chunk.position + chunk.amount) * FRACTION_SIZE])
+    finally:
+        fractions_memory.close()
+
+    output = TextIOWrapper(BytesIO())
+    write_percents(BulkWriter(output), (fraction / fractions_sum for fraction in array('f', fractions)), binary_format)
+    return output.buffer.getvalue()
+
+
+def reconcile_chunks(chunks: List[Chunk], fractions_amount: int, fractions_memory: SharedMemory) -> List[Chunk]:
+    """Take chunks up to the needed amount of fractions logging their rejected lines in the input order.
+
+    :param chunks: Parsed ranges.
+    :param fractions_amount: Amount of fractions.
+    :param fractions_memory: Shared memory with the array of fractions.
+    :return: Ranges with the needed fractions, the last one is truncated.
+    """
+    needed: int = fractions_amount
+    used: List[Chunk] = []
+    for chunk in chunks:
+        if not needed:
+            break
+        for index, line_number in enumerate(chunk.rejected):
+            # Lines after the last needed fraction are not read.
+            if line_number - index >= needed:
+                break
+            logger.error('Incorrect input. Should be a rational positive number greater than 0.')
+
+        if chunk.amount > needed:
+            fractions: array = array('d')
+            fractions.frombytes(fractions_memory.buf[chunk.position * FRACTION_SIZE:
+                                                     (chunk.position + needed) * FRACTION_SIZE])
+            chunk.amount = needed
+            chunk.fractions_sum = 0
+            for fraction in fractions:
+                chunk.fractions_sum += fraction
+        needed -= chunk.amount
+        used.append(chunk)
+
+    if needed:
+        logger.error(f'Unexpected end of input. {fractions_amount} fractions should be given.')
+    return used
+
+
+def write_percents_in_parallel(data: bytes, workers: int, writer: BulkWriter,
+                               binary_format: Optional[str] = None) -> None:
+    """Calculate percents of fractions in worker processes and write them.
+
+    :param data: Input data.
+    :param workers: Amount of worker processes.
+    :param writer: Output writer.
+    :param binary_format: Binary format, percents are written as text if it is not given.
+    """
+    fractions_amount, start = read_fraction_amount(data)
+    if fractions_amount is None:
+        return
+
+    chunk_size: int = max(MIN_CHUNK_SIZE, (len(data) - start) // (workers * CHUNKS_PER_WORKER))
+    chunks, capacity = split_chunks(data, start, chunk_size)
+    input_memory = SharedMemory(create=True, size=max(len(data), 1))
+    fractions_memory = SharedMemory(create=True, size=max(capacity * FRACTION_SIZE, 1))
+    try:
+        input_memory.buf[:len(data)] = data
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = reconcile_chunks(
+                list(executor.map(parse_chunk, repeat(input_memory.name), repeat(fractions_memory.name), chunks)),
+                fractions_amount, fractions_memory)
+            fractions_sum: float = 0
+            for chunk in chunks:
+                fractions_sum += chunk.fractions_sum
+
+            for output in executor.map(format_chunk, repeat(fractions_memory.name), chunks, repeat(fractions_sum),
+                                       repeat(binary_format)):
+                if binary_format is None:
+                    writer.write_encoded(output)
+                else:
+                    writer.write_bytes(output)
+    finally:
+        for memory in (input_memory, fractions_memory):
+            memory.close()
+            memory.unlink()
@@ -1,8 +1,17 @@
-from io import StringIO
-from unittest import TestCase
+import json
+from array import array
+from io import BytesIO, StringIO, TextIOWrapper
+from unittest import TestCase, skipIf
 from unittest.mock import patch
 
-from .fraction_percent_calculation import main
+from . import fraction_percent_calculation
+from ..binary import write_fractions
+from .fraction_percent_calculation import logger, main, read_fraction
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class TestFractionPercentCalculationTestCase(TestCase):
@@ -32,3 +41,132 @@ class TestFractionPercentCalculationTestCase(TestCase):
             self.assertNotEqual(len(percents), 0, input_values)
             for actual, expected in zip(percents, expected_output):
                 self.assertEqual(actual, expected)
+
+    @skipIf(numpy is None, 'NumPy is not installed')
+    def test_vectorized_calculation(self):
+        input_values = ['a', '3', '1.5', '-1', 'b', '0.5', '1', '7']
+        with self.assertLogs(logger) as logs:
+            for argv in [(), ('--vectorized',)]:
+                out = StringIO()
+                with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', out):
+                    main(argv)
+                self.assertEqual(out.getvalue(), '0.500\n0.167\n0.333\n')
+        self.assertListEqual(logs.output[:3], logs.output[3:])
+        self.assertEqual(len(logs.output), 6)
+
+        fractions = [f'{index % 997 + 1}.{index % 1000:03}' for index in range(10000)]
+        out = StringIO()
+        with patch('sys.stdin', StringIO('\n'.join(['10000'] + fractions))), patch('sys.stdout', out):
+            main(['--vectorized'])
+        fractions_sum = sum(map(float, fractions))
+        self.assertListEqual(out.getvalue().split(), ['{:.3f}'.format(float(fraction) / fractions_sum)
+                                                      for fraction in fractions])
+
+    def test_two_pass_calculation(self):
+        input_values = ['a', '5', '1.5', '-1', '0.5', '1', '2', '3', '7']
+        results = []
+        for argv in [(), ('--two-pass',)]:
+            out = StringIO()
+            with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', out), \
+                    patch(f'{main.__module__}.BLOCK_SIZE', 2), self.assertLogs(logger) as logs:
+                main(argv)
+            results.append((out.getvalue(), logs.output))
+        self.assertEqual(results[0], results[1])
+
+        # Errors are not logged by the second pass, but the logger is not disabled for other messages meanwhile.
+        calculate_percents = fraction_percent_calculation.calculate_percents
+
+        def log_block(*args):
+            logger.info('Block')
+            return calculate_percents(*args)
+
+        with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', StringIO()), \
+                patch(f'{main.__module__}.BLOCK_SIZE', 2), patch(f'{main.__module__}.calculate_percents', log_block), \
+                self.assertLogs(logger, 'INFO') as logs:
+            main(['--two-pass'])
+        self.assertEqual(logs.output.count(f'INFO:{logger.name}:Block'), 3)
+        self.assertEqual(len(logs.output), 5)
+
+    def test_binary_output(self):
+        input_values = ['3', '1.5', '0.5', '1']
+        argvs = [(), ('--two-pass',)] + ([('--vectorized',)] if numpy is not None else [])
+        for argv in argvs:
+            for binary_format, typecode, expected in [('int64', 'q', [500, 167, 333]),
+                                                      ('float64', 'd', [0.5, 0.5 / 3, 1 / 3])]:
+                out = TextIOWrapper(BytesIO())
+                with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', out):
+                    main(argv + ('--binary', binary_format))
+                values = array(typecode, out.buffer.getvalue())
+                for actual, expected_value in zip(values, expected):
+                    self.assertAlmostEqual(actual, expected_value, places=6, msg=argv)
+                self.assertEqual(len(values), len(expected))
+
+    def test_binary_input(self):
+        fractions = [index % 997 * 1000 + index % 1000 + 1 for index in range(3000)]
+        data = BytesIO()
+        write_fractions(data, fractions)
+        text = '\n'.join(['3000'] + [f'{fraction // 1000}.{fraction % 1000:03}' for fraction in fractions])
+        argvs = [()] + ([('--vectorized',)] if numpy is not None else [])
+        for argv in argvs:
+            expected = StringIO()
+            with patch('sys.stdin', StringIO(text)), patch('sys.stdout', expected):
+                main(argv)
+            out = TextIOWrapper(BytesIO())
+            with patch('sys.stdin', TextIOWrapper(BytesIO(data.getvalue()))), patch('sys.stdout', out):
+                main(argv + ('--input-format', 'binary'))
+            self.assertEqual(out.buffer.getvalue().decode(), expected.getvalue(), argv)
+
+    def test_parallel_calculation(self):
+        input_values = ['a', '6', '1.5', '-1', '0.5', '', '1', '2', 'b', '3', '7', '-2', '8']
+        results = []
+        for argv in [(), ('--workers', '2')]:
+            out = StringIO()
+            with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', out), \
+                    patch('test_skybonds.fraction_percent_calculation.parallel.MIN_CHUNK_SIZE', 4), \
+                    self.assertLogs(logger) as logs:
+                main(argv)
+            results.append((out.getvalue(), logs.output))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(len(results[0][1]), 4)
+
+    def test_aggregated_errors(self):
+        input_values = ['a', 'b', '3', '1.5', '-1', '0.5', 'c', '-2', '0', '-3', '1', 'd']
+        results = []
+        for argv in [(), ('--aggregate-errors',)]:
+            out = StringIO()
+            with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', out), \
+                    self.assertLogs(logger) as logs:
+                main(argv)
+            results.append((out.getvalue(), logs.output))
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertEqual(len(results[0][1]), 7)
+        self.assertListEqual(results[1][1], [
+            f'ERROR:{logger.name}:Incorrect input. Should be an integer. (2 lines: 1, 2)',
+            f'ERROR:{logger.name}:Incorrect input. Should be a rational positive number greater than 0. '
+            '(5 lines: 5, 7, 8, 9, 10)',
+        ])
+
+    def test_instrumentation(self):
+        input_values = ['a', 'b', '3', '1.5', '-1', '0.5', 'c', '-2', '0', '-3', '1', 'd']
+        results = []
+        for argv, environment in [((), {}), (('--instrument',), {}), ((), {'SKYBONDS_INSTRUMENTATION': 'time'})]:
+            out = StringIO()
+            err = StringIO()
+            with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', out), \
+                    patch('sys.stderr', err), patch.dict('os.environ', environment), self.assertLogs(logger):
+                main(argv)
+            results.append((out.getvalue(), err.getvalue()))
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertEqual(results[0][0], results[2][0])
+        self.assertEqual(results[0][1], '')
+
+        for _, err in results[1:]:
+            summary = json.loads(err)
+            self.assertEqual(summary['program'], 'fraction_percent_calculation')
+            self.assertListEqual(list(summary['stages']), ['read', 'sum', 'format'])
+            self.assertEqual(summary['stages']['read']['items'], 4)
+            self.assertEqual(summary['stages']['read']['rejected'], 7)
+            self.assertEqual(summary['stages']['format']['items'], 3)
+        self.assertGreater(json.loads(results[1][1])['stages']['sum']['peak_memory'], 0)
+        self.assertIsNone(json.loads(results[2][1])['stages']['sum']['peak_memory'])
+        self.assertIs(fraction_percent_calculation.read_fraction, read_fraction)
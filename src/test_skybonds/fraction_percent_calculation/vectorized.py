@@ -0,0 +1,145 @@
+"""Vectorized fraction percent calculation.
+
+The whole input is parsed into a float64 NumPy array, the sum is calculated with pairwise
+summation of NumPy and all percents are formatted at once into a bytes buffer. It requires
+NumPy to be installed.
+"""
+from typing import List, TextIO
+
+from .fraction_percent_calculation import logger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#: Amount of decimals in the output.
+DECIMALS: int = 3
+#: Percents closer than this to a rounding boundary are formatted by Python to be rounded exactly.
+ROUNDING_TOLERANCE: float = 1e-6
+
+
+def read_all(stream: TextIO) -> bytes:
+    """Read everything from given stream.
+
+    :param stream: Text stream, its binary buffer is used if there is one.
+    :return: Read data.
+    """
+    buffer = getattr(stream, 'buffer', None)
+    if buffer is not None:
+        return buffer.read()
+    return stream.read().encode()
+
+
+def parse_fractions(data: bytes) -> 'np.ndarray':
+    """Parse fraction amount and fractions validating them the same way line by line reading does.
+
+    Invalid lines are replaced with the following ones, lines after the last needed fraction are ignored.
+    :param data: Input data.
+    :return: Fractions rounded to 3 decimals.
+    """
+    if np is None:
+        raise ImportError('To use vectorized calculation please install "numpy"')
+
+    lines: List[bytes] = data.splitlines()
+    position: int = 0
+    while position < len(lines) and not lines[position].strip().decode(errors='replace').isdigit():
+        logger.error('Incorrect input. Should be an integer.')
+        position += 1
+    if position == len(lines):
+        return np.empty(0)
+
+    fractions_amount: int = int(lines[position])
+    position += 1
+    chunks: List[np.ndarray] = []
+    needed: int = fractions_amount
+    while needed and position < len(lines):
+        values: np.ndarray = _parse_values(lines[position:position + needed])
+        position += needed
+        # NaN is accepted as it is not less than or equal to 0.
+        chunk: np.ndarray = values[~(values <= 0)]
+        for _ in range(values.size - chunk.size):
+            logger.error('Incorrect input. Should be a rational positive number greater than 0.')
+        chunks.append(chunk)
+        needed -= chunk.size
+
+    if needed:
+        logger.error(f'Unexpected end of input. {fractions_amount} fractions should be given.')
+    return np.round(np.concatenate(chunks) if chunks else np.empty(0), DECIMALS)
+
+
+def from_thousandths(thousandths: memoryview) -> 'np.ndarray':
+    """Convert fractions in thousandths without copying them into Python objects.
+
+    :param thousandths: Fractions in thousandths, a buffer of 64-bit integers.
+    :return: Fractions equal to the parsed decimal ones.
+    """
+    if np is None:
+        raise ImportError('To use vectorized calculation please install "numpy"')
+
+    return np.frombuffer(thousandths, dtype=np.int64) / 10 ** DECIMALS
+
+
+def _parse_values(lines: List[bytes]) -> 'np.ndarray':
+    """Parse lines into numbers.
+
+    :param lines: Lines.
+    :return: Numbers, lines which are not numbers are replaced with -1.
+    """
+    try:
+        return np.array(lines, dtype=bytes).astype(np.float64)
+    except ValueError:
+        pass
+
+    values: List[float] = []
+    for line in lines:
+        try:
+            values.append(float(line.strip()))
+        except ValueError:
+            values.append(-1)
+    return np.array(values, dtype=np.float64)
+
+
+def calculate_percents(fractions: 'np.ndarray') -> 'np.ndarray':
+    """Calculate percents of fractions.
+
+    NumPy sums contiguous float64 arrays pairwise, so the error grows logarithmically with amount of fractions.
+    :param fractions: Fractions.
+    :return: Percents as parts of 1.
+    """
+    return fractions / np.sum(fractions)
+
+
+def round_thousandths(percents: 'np.ndarray') -> 'np.ndarray':
+    """Round percents to thousandths as '{:.3f}' does.
+
+    :param percents: Finite percents which are parts of 1.
+    :return: Percents in thousandths as 64-bit integers.
+    """
+    scaled: np.ndarray = percents * 10 ** DECIMALS
+    thousandths: np.ndarray = np.rint(scaled).astype(np.int64)
+    # Rounding of scaled values may differ from exact rounding of percents near half of a thousandth.
+    for index in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < ROUNDING_TOLERANCE).tolist():
+        thousandths[index] = int(f'{percents[index]:.3f}'.replace('.', ''))
+    return thousandths
+
+
+def format_percents(percents: 'np.ndarray') -> bytes:
+    """Format percents with 3 decimals, one per line.
+
+    Percents are rounded to thousandths and digits are written into a buffer with vectorized
+    integer operations.
+    :param percents: Percents which are parts of 1.
+    :return: Formatted lines.
+    """
+    if not np.isfinite(percents).all():
+        return ''.join(f'{percent:.3f}\n' for percent in percents.tolist()).encode()
+
+    thousandths: np.ndarray = round_thousandths(percents)
+    buffer: np.ndarray = np.empty((thousandths.size, DECIMALS + 3), dtype=np.uint8)
+    buffer[:, 0] = ord('0') + thousandths // 10 ** DECIMALS
+    buffer[:, 1] = ord('.')
+    for digit in range(DECIMALS):
+        buffer[:, 2 + digit] = ord('0') + thousandths // 10 ** (DECIMALS - 1 - digit) % 10
+    buffer[:, -1] = ord('\n')
+    return buffer.tobytes()
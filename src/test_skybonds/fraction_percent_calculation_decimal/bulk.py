@@ -0,0 +1,88 @@
+"""Bulk fraction reading.
+
+The whole input is read at once and split into lines. Blocks of lines are converted with a single
+call and checked together, lines are validated one by one only in blocks with invalid ones.
+Errors are collected into an aggregated report instead of being logged line by line.
+"""
+from decimal import Decimal, DecimalException
+from typing import List, TextIO, Tuple
+
+from ..validation import ErrorReport
+from .fraction_percent_calculation import logger
+
+
+def read_all(stream: TextIO) -> bytes:
+    """Read everything from given stream.
+
+    :param stream: Text stream, its binary buffer is used if there is one.
+    :return: Read data.
+    """
+    buffer = getattr(stream, 'buffer', None)
+    if buffer is not None:
+        return buffer.read()
+    return stream.read().encode()
+
+
+def read_fractions(data: bytes, report: ErrorReport) -> Tuple[List[Decimal], Decimal]:
+    """Read fraction amount and fractions validating them the same way reading from standard input does.
+
+    Invalid lines are replaced with the following ones, lines after the last needed fraction are ignored.
+    :param data: Input data.
+    :param report: Report to collect errors into.
+    :return: Fractions and their sum.
+    """
+    # Line breaks are translated the way reading in text mode does.
+    lines: List[str] = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n').decode().split('\n')
+    if lines[-1] == '':
+        del lines[-1]
+    position: int = 0
+    while position < len(lines) and not lines[position].strip().isdigit():
+        report.add(position + 1, 'Incorrect input. Should be an integer.')
+        position += 1
+
+    fractions: List[Decimal] = []
+    fractions_sum: Decimal = Decimal()
+    if position == len(lines):
+        return fractions, fractions_sum
+
+    fractions_amount: int = int(lines[position])
+    position += 1
+    while len(fractions) < fractions_amount and position < len(lines):
+        block: List[str] = lines[position:position + fractions_amount - len(fractions)]
+        try:
+            values: List[Decimal] = list(map(Decimal, map(str.strip, block)))
+        except DecimalException:
+            values = []
+        if len(values) < len(block) or any(value <= 0 for value in values):
+            values = parse_values(block, position + 1, report)
+        position += len(block)
+
+        fractions += values
+        for value in values:
+            fractions_sum += value
+
+    if len(fractions) < fractions_amount:
+        logger.error(f'Unexpected end of input. {fractions_amount} fractions should be given.')
+    return fractions, fractions_sum
+
+
+def parse_values(lines: List[str], first_line_number: int, report: ErrorReport) -> List[Decimal]:
+    """Parse lines one by one.
+
+    :param lines: Lines.
+    :param first_line_number: Number of the first line in the input.
+    :param report: Report to collect errors into.
+    :return: Valid fractions.
+    """
+    values: List[Decimal] = []
+    for line_number, line in enumerate(lines, first_line_number):
+        try:
+            value: Decimal = Decimal(line.strip())
+        except DecimalException:
+            report.add(line_number, 'Incorrect input. Should be a rational positive number greater than 0.')
+            continue
+        if value <= 0:
+            report.add(line_number, 'Incorrect input. Should be a rational positive number greater than 0.')
+        else:
+            values.append(value)
+    return values
@@ -0,0 +1,187 @@
+"""Exact integer fraction percent calculation.
+
+Fractions are kept as integers scaled by a common power of ten, thousandths for inputs with
+at most three decimals. Every percent is rounded to thousandths half to even with integer
+division, so no Decimal is created per fraction and the output is identical to the Decimal
+calculation.
+"""
+import re
+import sys
+from array import array
+from decimal import Decimal, DecimalException, InvalidOperation
+from typing import List, Optional, Sequence, Tuple, Union
+
+from .fraction_percent_calculation import calculate_percents, logger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#: Decimals of fractions which are kept in 64-bit integers.
+DEFAULT_DECIMALS: int = 3
+#: Decimals of percents.
+PERCENT_DECIMALS: int = 3
+#: Fraction with at most three decimals.
+FRACTION_PATTERN = re.compile(r'(\d+)(?:\.(\d{1,3}))?')
+#: Lines of fractions with exactly three decimals which fit 64-bit integers.
+THOUSANDTHS_PATTERN = re.compile(r'(?:[0-9]{1,15}\.[0-9]{3}\n)*[0-9]{1,15}\.[0-9]{3}\n?')
+#: Approximate size of a block of lines read at once in characters.
+BLOCK_SIZE: int = 1 << 20
+#: Decimal calculation divides with 28 significant digits. While the scaled sum is less than this limit
+#: the sum is exact and rounding of the quotient to 28 digits can not reach half of a thousandth,
+#: so integer rounding gives the same result.
+EXACT_SUM_LIMIT: int = 10 ** 23
+
+
+def parse_fraction(value: str) -> Optional[Tuple[int, int]]:
+    """Parse a fraction validating it the same way reading of a Decimal fraction does.
+
+    :param value: Stripped line.
+    :return: Fraction as an integer and amount of its decimals or None if the fraction is invalid.
+    """
+    match = FRACTION_PATTERN.fullmatch(value)
+    if match is not None:
+        integral, fractional = match.groups()
+        fractional = fractional or ''
+        scaled: int = int(integral + fractional)
+        return (scaled, len(fractional)) if scaled > 0 else None
+
+    try:
+        fraction: Decimal = Decimal(value)
+    except DecimalException:
+        return None
+    if fraction.is_nan():
+        # Decimal calculation fails comparing NaN with 0.
+        raise InvalidOperation(f'Fraction {value!r} is not a number')
+    if fraction <= 0:
+        return None
+    if fraction.is_infinite():
+        # Decimal calculation fails dividing infinity by infinite sum.
+        raise InvalidOperation(f'Fraction {value!r} is infinite')
+
+    _, digits, exponent = fraction.as_tuple()
+    coefficient: int = int(''.join(map(str, digits)))
+    if exponent >= 0:
+        return coefficient * 10 ** exponent, 0
+    return coefficient, -exponent
+
+
+def read_fractions(fractions_amount: int) -> Tuple[Union[array, List[int]], int]:
+    """Read fractions from standard input.
+
+    Lines are read in blocks. If every needed line of a block has exactly three decimals the lines
+    are converted together, otherwise they are parsed one by one. Invalid fractions are logged and
+    replaced with the following ones.
+    :param fractions_amount: Amount of fractions.
+    :return: Fractions scaled by a common power of ten and amount of decimals of the scale.
+    """
+    fractions: Union[array, List[int]] = array('q')
+    decimals: int = DEFAULT_DECIMALS
+    while len(fractions) < fractions_amount:
+        lines: List[str] = sys.stdin.readlines(BLOCK_SIZE)
+        if not lines:
+            logger.error(f'Unexpected end of input. {fractions_amount} fractions should be given.')
+            break
+
+        block: str = ''.join(lines[:fractions_amount - len(fractions)])
+        if decimals == DEFAULT_DECIMALS and THOUSANDTHS_PATTERN.fullmatch(block):
+            values: array = array('q', map(int, block.replace('.', '').split()))
+            if 0 not in values:
+                fractions.extend(values)
+                continue
+
+        for line in lines:
+            if len(fractions) == fractions_amount:
+                break
+
+            parsed: Optional[Tuple[int, int]] = parse_fraction(line.strip())
+            if parsed is None:
+                logger.error('Incorrect input. Should be a rational positive number greater than 0.')
+                continue
+
+            fraction, fraction_decimals = parsed
+            if fraction_decimals > decimals:
+                # Finer fractions change the scale of all fractions read before.
+                fractions = [value * 10 ** (fraction_decimals - decimals) for value in fractions]
+                decimals = fraction_decimals
+            fraction *= 10 ** (decimals - fraction_decimals)
+            try:
+                fractions.append(fraction)
+            except OverflowError:
+                fractions = list(fractions)
+                fractions.append(fraction)
+
+    return fractions, decimals
+
+
+def round_percents(fractions: Sequence[int], fractions_sum: int) -> Sequence[int]:
+    """Calculate percents in thousandths rounded half to even.
+
+    :param fractions: Scaled fractions.
+    :param fractions_sum: Sum of fractions.
+    :return: Percents in thousandths.
+    """
+    scale: int = 10 ** PERCENT_DECIMALS
+    if np is not None and isinstance(fractions, (array, memoryview)) and 2 * scale * fractions_sum < 2 ** 63:
+        scaled: np.ndarray = np.frombuffer(fractions, dtype=np.int64) * scale
+        quotients, remainders = np.divmod(scaled, fractions_sum)
+        quotients += (2 * remainders > fractions_sum) | ((2 * remainders == fractions_sum) & (quotients % 2 == 1))
+        return quotients
+
+    percents: List[int] = []
+    for fraction in fractions:
+        quotient, remainder = divmod(fraction * scale, fractions_sum)
+        if 2 * remainder > fractions_sum or 2 * remainder == fractions_sum and quotient % 2:
+            quotient += 1
+        percents.append(quotient)
+    return percents
+
+
+def format_percents(percents: Sequence[int]) -> bytes:
+    """Format percents in thousandths, one per line.
+
+    :param percents: Percents in thousandths, no more than 1000.
+    :return: Formatted lines.
+    """
+    if np is None:
+        return ''.join('{}.{:03}\n'.format(*divmod(percent, 10 ** PERCENT_DECIMALS)) for percent in percents).encode()
+
+    thousandths: np.ndarray = np.asarray(percents, dtype=np.int64)
+    buffer: np.ndarray = np.empty((thousandths.size, PERCENT_DECIMALS + 3), dtype=np.uint8)
+    buffer[:, 0] = ord('0') + thousandths // 10 ** PERCENT_DECIMALS
+    buffer[:, 1] = ord('.')
+    for digit in range(PERCENT_DECIMALS):
+        buffer[:, 2 + digit] = ord('0') + thousandths // 10 ** (PERCENT_DECIMALS - 1 - digit) % 10
+    buffer[:, -1] = ord('\n')
+    return buffer.tobytes()
+
+
+def calculate_thousandths(fractions: Sequence[int], decimals: int) -> Sequence[int]:
+    """Calculate percents of fractions in thousandths rounded the same way as Decimal ones.
+
+    :param fractions: Fractions scaled by a common power of ten.
+    :param decimals: Amount of decimals of the scale.
+    :return: Percents in thousandths.
+    """
+    fractions_sum: int = sum(fractions)
+    if fractions_sum >= EXACT_SUM_LIMIT:
+        # The Decimal sum or quotients are rounded, so the Decimal calculation is repeated.
+        decimal_fractions: List[Decimal] = [Decimal(f'{fraction}E-{decimals}') for fraction in fractions]
+        decimal_sum: Decimal = Decimal()
+        for fraction in decimal_fractions:
+            decimal_sum += fraction
+        return [int(percent.scaleb(PERCENT_DECIMALS))
+                for percent in calculate_percents(decimal_fractions, decimal_sum)]
+
+    return round_percents(fractions, fractions_sum)
+
+
+def calculate_formatted_percents(fractions: Sequence[int], decimals: int) -> bytes:
+    """Calculate percents of fractions formatted the same way as Decimal ones.
+
+    :param fractions: Fractions scaled by a common power of ten.
+    :param decimals: Amount of decimals of the scale.
+    :return: Formatted percents, one per line.
+    """
+    return format_percents(calculate_thousandths(fractions, decimals))
@@ -1,53 +1,86 @@
 #!/usr/bin/env python3
 """The program converts fractions to their percentage values."""
-import logging
+from __future__ import annotations
+
 import sys
+from contextlib import nullcontext
 from decimal import Decimal, ROUND_HALF_EVEN, DecimalException
-from typing import Iterable, Optional
 
-logger = logging.Logger(__name__, level=logging.INFO)
-logger.addHandler(logging.StreamHandler())
+try:
+    from ..instrumentation import MODES, Instrumentation, measure
+    from ..logs import lazy_logger
+    from ..output import BINARY_FORMATS, BulkWriter
+except ImportError:
+    # The program is started as a script, so the package is imported from the source folder.
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+    from test_skybonds.instrumentation import MODES, Instrumentation, measure
+    from test_skybonds.logs import lazy_logger
+    from test_skybonds.output import BINARY_FORMATS, BulkWriter
+
+# Modules which are used for annotations only are not imported to start faster.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import argparse
+    import logging
+    from typing import Iterable, List, Optional, Sequence, Tuple
+
+get_logger, __getattr__ = lazy_logger(globals())
+logger: logging.Logger
+
+#: Amount of fractions kept in memory at once by two pass calculation.
+BLOCK_SIZE: int = 4096
 
 
 def read_fraction_amount() -> int:
     """Read fraction amount from standard input.
 
     :return: Fraction amount.
+    :raise EOFError: If the input ends before the amount.
     """
     while True:
-        value: str = sys.stdin.readline().strip()
+        line: str = sys.stdin.readline()
+        if not line:
+            raise EOFError('Unexpected end of input. Fraction amount should be given.')
+        value: str = line.strip()
         if not value.isdigit():
-            logger.error('Incorrect input. Should be an integer.')
+            get_logger().error('Incorrect input. Should be an integer.')
         else:
             break
 
     return int(value)
 
 
-def read_fraction() -> Decimal:
+def read_fraction(log_errors: bool = True) -> Decimal:
     """Read fraction value from given read stream function.
 
+    :param log_errors: Whether incorrect lines are logged, they are skipped anyway.
     :return: Fraction value.
+    :raise EOFError: If the input ends before the fraction.
     """
     value: Optional[Decimal] = None
     while True:
+        line: str = sys.stdin.readline()
+        if not line:
+            raise EOFError('Unexpected end of input. Fewer fractions are given than their amount.')
         try:
-            value = Decimal(sys.stdin.readline().strip())
+            value = Decimal(line.strip())
         except DecimalException:
             pass
 
         if value is None or value <= 0:
-            logger.error('Incorrect input. Should be a rational positive number greater than 0.')
+            if log_errors:
+                get_logger().error('Incorrect input. Should be a rational positive number greater than 0.')
         else:
             break
 
     return value
 
 
-def calculate_fraction_percents() -> Iterable[Decimal]:
-    """Calculate faction percents.
+def read_fractions() -> Tuple[List[Decimal], Decimal]:
+    """Read fraction amount and fractions from standard input.
 
-    :return: Iterable with calculated percents.
+    :return: Fractions and their sum.
     """
     fractions_amount: int = read_fraction_amount()
     fractions: list = []
@@ -56,19 +89,170 @@ def calculate_fraction_percents() -> Iterable[Decimal]:
         fraction = read_fraction()
         fractions.append(fraction)
         fractions_sum += fraction
+    return fractions, fractions_sum
+
+
+def calculate_percents(fractions: Iterable[Decimal], fractions_sum: Decimal) -> Iterable[Decimal]:
+    """Calculate percents of fractions.
+
+    :param fractions: Fractions.
+    :param fractions_sum: Sum of fractions.
+    :return: Iterable with calculated percents.
+    """
     quantize: Decimal = Decimal('1.000')
     for fraction in fractions:
         yield (fraction / fractions_sum).quantize(quantize, rounding=ROUND_HALF_EVEN)
 
 
-def main():
-    """Execute program flow."""
-    for percent in calculate_fraction_percents():
-        print(percent)
+def calculate_fraction_percents() -> Iterable[Decimal]:
+    """Calculate faction percents.
+
+    :return: Iterable with calculated percents.
+    """
+    return calculate_percents(*read_fractions())
+
+
+def calculate_fraction_percents_in_two_passes() -> Iterable[Decimal]:
+    """Calculate faction percents reading fractions twice instead of keeping them.
+
+    The first pass calculates the sum, the second one reads fractions again from the same position
+    of seekable standard input by blocks, so used memory does not depend on amount of fractions.
+    Errors are logged by the first pass only.
+    :return: Iterable with calculated percents.
+    """
+    fractions_amount: int = read_fraction_amount()
+    start: int = sys.stdin.tell()
+    fractions_sum: Decimal = Decimal()
+    for number in range(1, fractions_amount + 1):
+        fractions_sum += read_fraction()
+
+    sys.stdin.seek(start)
+    for first in range(0, fractions_amount, BLOCK_SIZE):
+        block_size: int = min(BLOCK_SIZE, fractions_amount - first)
+        yield from calculate_percents([read_fraction(log_errors=False) for _ in range(block_size)], fractions_sum)
+
+
+def write_percents(writer: BulkWriter, percents: Iterable[Decimal], binary_format: Optional[str] = None) -> None:
+    """Write percents as lines or as binary numbers.
+
+    :param writer: Output writer.
+    :param percents: Percents rounded to thousandths.
+    :param binary_format: Binary format, percents are written as text if it is not given.
+    """
+    if binary_format is None:
+        writer.write_lines(map(str, percents))
+    elif binary_format == 'int64':
+        writer.write_numbers((int(percent.scaleb(3)) for percent in percents), binary_format)
+    else:
+        writer.write_numbers(map(float, percents), binary_format)
+
+
+def parse_arguments(argv: Sequence[str]) -> argparse.Namespace:
+    """Parse command line arguments.
+
+    :param argv: Command line arguments without the program name.
+    :return: Parsed arguments.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--integer', action='store_true',
+                        help='keep fractions as scaled integers and round percents with integer division')
+    parser.add_argument('--two-pass', action='store_true',
+                        help='read seekable input twice instead of keeping fractions in memory')
+    parser.add_argument('--aggregate-errors', action='store_true',
+                        help='read the whole input at once and log counts of errors with sample line numbers '
+                             'instead of every invalid line')
+    parser.add_argument('--binary', choices=sorted(BINARY_FORMATS),
+                        help='write percents as raw numbers in native byte order, int64 ones are in thousandths')
+    parser.add_argument('--input-format', choices=['text', 'binary'], default='text',
+                        help='read text lines or binary fractions made by "python -m test_skybonds.binary", '
+                             'binary input is memory-mapped if it is a file and calculated as --integer does')
+    parser.add_argument('--instrument', nargs='?', choices=MODES, const='memory',
+                        help='write time, amounts of items and peak memory of every stage to standard error as JSON, '
+                             'the time mode does not trace memory')
+    arguments: argparse.Namespace = parser.parse_args(argv)
+    if arguments.integer and arguments.two_pass:
+        parser.error('--integer and --two-pass can not be used together')
+    if arguments.aggregate_errors and (arguments.integer or arguments.two_pass):
+        parser.error('--aggregate-errors can not be used with --integer or --two-pass')
+    if arguments.input_format == 'binary' and (arguments.two_pass or arguments.aggregate_errors):
+        parser.error('--input-format binary can not be used with --two-pass or --aggregate-errors')
+    return arguments
+
+
+def main(argv: Sequence[str] = ()) -> None:
+    """Execute program flow.
+
+    :param argv: Command line arguments without the program name.
+    """
+    arguments: argparse.Namespace = parse_arguments(argv)
+    instrumentation: Optional[Instrumentation] = Instrumentation.create(
+        'fraction_percent_calculation_decimal', arguments.instrument, loggers=[get_logger()])
+    if instrumentation is not None:
+        # Rejected lines are logged while they are read.
+        instrumentation.instrument(sys.modules[__name__], 'read_fraction_amount', 'read')
+        instrumentation.instrument(sys.modules[__name__], 'read_fraction', 'read')
+    with instrumentation or nullcontext(), BulkWriter() as writer:
+        if arguments.integer or arguments.input_format == 'binary':
+            from . import fixed_point
+            if instrumentation is not None:
+                instrumentation.count_errors(fixed_point.logger)
+            with measure(instrumentation, 'read') as stage:
+                if arguments.input_format == 'binary':
+                    from ..binary import read_fractions as read_binary_fractions
+                    thousandths: Optional[memoryview] = read_binary_fractions(sys.stdin.buffer)
+                    if thousandths is None:
+                        return
+                    scaled_fractions = thousandths, fixed_point.DEFAULT_DECIMALS
+                else:
+                    scaled_fractions = fixed_point.read_fractions(read_fraction_amount())
+            if stage is not None:
+                stage.items += len(scaled_fractions[0])
+            with measure(instrumentation, 'format', len(scaled_fractions[0])):
+                if arguments.binary == 'int64':
+                    writer.write_numbers(fixed_point.calculate_thousandths(*scaled_fractions), arguments.binary)
+                elif arguments.binary == 'float64':
+                    writer.write_numbers((thousandths / 1000
+                                          for thousandths in fixed_point.calculate_thousandths(*scaled_fractions)),
+                                         arguments.binary)
+                else:
+                    writer.write_encoded(fixed_point.calculate_formatted_percents(*scaled_fractions))
+            return
+        if arguments.two_pass:
+            if not sys.stdin.seekable():
+                get_logger().error('Two pass calculation requires seekable input, e.g. a file.')
+                return
+            with measure(instrumentation, 'format'):
+                write_percents(writer, calculate_fraction_percents_in_two_passes(), arguments.binary)
+            return
+        if arguments.aggregate_errors:
+            from .bulk import logger as bulk_logger, read_all, read_fractions as read_fractions_in_bulk
+            from ..validation import ErrorReport
+            report: ErrorReport = ErrorReport()
+            if instrumentation is not None:
+                instrumentation.count_errors(bulk_logger)
+            with measure(instrumentation, 'read') as stage:
+                fractions, fractions_sum = read_fractions_in_bulk(read_all(sys.stdin), report)
+            if stage is not None:
+                stage.items += len(fractions)
+                stage.rejected += len(report)
+            report.log(get_logger())
+            with measure(instrumentation, 'format', len(fractions)):
+                write_percents(writer, calculate_percents(fractions, fractions_sum), arguments.binary)
+            return
+
+        # Fractions are added up while they are read, so the sum stage excludes reading only.
+        with measure(instrumentation, 'sum'):
+            fractions, fractions_sum = read_fractions()
+        with measure(instrumentation, 'format', len(fractions)):
+            write_percents(writer, calculate_percents(fractions, fractions_sum), arguments.binary)
 
 
 if __name__ == '__main__':
     try:
-        main()
+        main(sys.argv[1:])
+    except EOFError as exc:
+        sys.exit(str(exc))
     except KeyboardInterrupt:
         exit(0)
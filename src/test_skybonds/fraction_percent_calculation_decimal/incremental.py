@@ -0,0 +1,291 @@
+"""Incremental fraction percent calculation.
+
+Fractions are kept as integer thousandths by identifiers and their sum is exact. Fractions can be
+added, updated and removed in batches, and every batch reports only fractions whose percent
+rounded to thousandths has changed. Percents are rounded half to even, so they are the same as the
+Decimal calculation gives while the sum is less than EXACT_SUM_LIMIT thousandths.
+
+A percent of an unchanged fraction changes only if the sum moves a rounding threshold
+(2k + 1) / 2000 of the sum across the fraction. Fractions are also kept sorted by value in blocks,
+so a batch looks up fractions lying between positions of every threshold for the old and the new
+sum instead of recalculating all percents.
+"""
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .fixed_point import PERCENT_DECIMALS
+
+#: Scale of percents.
+PERCENT_SCALE: int = 10 ** PERCENT_DECIMALS
+#: Amount of fractions in a block of the sorted index, blocks twice larger are split.
+BLOCK_SIZE: int = 1024
+
+
+def round_percent(fraction: int, fractions_sum: int) -> int:
+    """Calculate a percent in thousandths rounded half to even.
+
+    :param fraction: Fraction.
+    :param fractions_sum: Sum of fractions, it is positive.
+    :return: Percent in thousandths.
+    """
+    quotient, remainder = divmod(fraction * PERCENT_SCALE, fractions_sum)
+    if 2 * remainder > fractions_sum or 2 * remainder == fractions_sum and quotient % 2:
+        quotient += 1
+    return quotient
+
+
+class SortedFractions:
+    """Identifiers of fractions sorted by value and identifier in blocks of arrays."""
+
+    def __init__(self) -> None:
+        """Initialize an instance."""
+        self.values: List[array] = []
+        self.identifiers: List[array] = []
+        #: The last value and identifier of every block.
+        self.maxes: List[Tuple[int, int]] = []
+
+    def build(self, fractions: Sequence[int]) -> None:
+        """Replace the index with all fractions.
+
+        :param fractions: Fractions by identifiers, 0 for removed ones.
+        """
+        identifiers: array = array('q', sorted(filter(fractions.__getitem__, range(len(fractions))),
+                                               key=fractions.__getitem__))
+        self.identifiers = [identifiers[first:first + BLOCK_SIZE] for first in range(0, len(identifiers), BLOCK_SIZE)]
+        self.values = [array('q', map(fractions.__getitem__, block)) for block in self.identifiers]
+        self.maxes = [(values[-1], identifiers[-1]) for values, identifiers in zip(self.values, self.identifiers)]
+
+    def _locate(self, value: int, identifier: int) -> Tuple[int, int]:
+        """Find the position of a fraction.
+
+        :param value: Fraction value.
+        :param identifier: Fraction identifier.
+        :return: Block index and position in the block, the fraction goes there if it is not in the index.
+        """
+        block: int = min(bisect_left(self.maxes, (value, identifier)), len(self.maxes) - 1)
+        values: array = self.values[block]
+        first: int = bisect_left(values, value)
+        position: int = bisect_left(self.identifiers[block], identifier, first, bisect_right(values, value, first))
+        return block, position
+
+    def add(self, value: int, identifier: int) -> None:
+        """Add a fraction.
+
+        :param value: Fraction value.
+        :param identifier: Fraction identifier.
+        """
+        if not self.maxes:
+            self.values.append(array('q', [value]))
+            self.identifiers.append(array('q', [identifier]))
+            self.maxes.append((value, identifier))
+            return
+
+        block, position = self._locate(value, identifier)
+        values, identifiers = self.values[block], self.identifiers[block]
+        values.insert(position, value)
+        identifiers.insert(position, identifier)
+        self.maxes[block] = values[-1], identifiers[-1]
+        if len(values) >= 2 * BLOCK_SIZE:
+            self.values[block + 1:block + 1] = [values[BLOCK_SIZE:]]
+            self.identifiers[block + 1:block + 1] = [identifiers[BLOCK_SIZE:]]
+            del values[BLOCK_SIZE:], identifiers[BLOCK_SIZE:]
+            insort(self.maxes, (values[-1], identifiers[-1]))
+
+    def remove(self, value: int, identifier: int) -> None:
+        """Remove a fraction.
+
+        :param value: Fraction value.
+        :param identifier: Fraction identifier.
+        """
+        block, position = self._locate(value, identifier)
+        values, identifiers = self.values[block], self.identifiers[block]
+        del values[position], identifiers[position]
+        if values:
+            self.maxes[block] = values[-1], identifiers[-1]
+        else:
+            del self.values[block], self.identifiers[block], self.maxes[block]
+
+    def between(self, lowest: int, highest: int) -> Iterator[Tuple[int, int]]:
+        """Iterate over fractions with values in a range.
+
+        :param lowest: The lowest value.
+        :param highest: The highest value.
+        :return: Values and identifiers of fractions in order.
+        """
+        for block in range(bisect_left(self.maxes, (lowest, -1)), len(self.maxes)):
+            values, identifiers = self.values[block], self.identifiers[block]
+            first: int = bisect_left(values, lowest)
+            last: int = bisect_right(values, highest, first)
+            yield from zip(values[first:last], identifiers[first:last])
+            if last < len(values):
+                break
+
+
+class IncrementalPercents:
+    """Percents of fractions updated in batches.
+
+    Fractions are integer thousandths identified by numbers given by add(). Changes are applied
+    at once and commit() finishes a batch reporting changed percents.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an instance."""
+        #: Fractions by identifiers, removed ones are 0.
+        self.fractions: array = array('q')
+        self.sum: int = 0
+        self._sorted = SortedFractions()
+        self._free: List[int] = []
+        #: Sum before the batch and values of changed fractions before the batch, 0 for added ones.
+        self._committed_sum: int = 0
+        self._changed: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.fractions) - len(self._free)
+
+    def percent(self, identifier: int) -> int:
+        """Get the current percent of a fraction.
+
+        :param identifier: Fraction identifier.
+        :return: Percent in thousandths.
+        """
+        fraction: int = self._fraction(identifier)
+        return round_percent(fraction, self.sum)
+
+    def _fraction(self, identifier: int) -> int:
+        """Get a fraction.
+
+        :param identifier: Fraction identifier.
+        :return: Fraction in thousandths.
+        """
+        fraction: int = self.fractions[identifier] if 0 <= identifier < len(self.fractions) else 0
+        if not fraction:
+            raise KeyError(f'There is no fraction {identifier}')
+        return fraction
+
+    def _change(self, identifier: int, old_fraction: int, fraction: int) -> None:
+        """Change a fraction keeping its value before the batch.
+
+        :param identifier: Fraction identifier.
+        :param old_fraction: Current value of the fraction, 0 if it is added.
+        :param fraction: New value of the fraction, 0 if it is removed.
+        """
+        self._changed.setdefault(identifier, old_fraction)
+        if old_fraction:
+            self._sorted.remove(old_fraction, identifier)
+        if fraction:
+            self._sorted.add(fraction, identifier)
+        self.fractions[identifier] = fraction
+        self.sum += fraction - old_fraction
+
+    def add(self, fraction: int) -> int:
+        """Add a fraction.
+
+        :param fraction: Fraction in thousandths, it is positive.
+        :return: Fraction identifier.
+        """
+        if fraction <= 0:
+            raise ValueError('Fraction should be a rational positive number greater than 0')
+        if self._free:
+            identifier: int = self._free.pop()
+        else:
+            identifier = len(self.fractions)
+            self.fractions.append(0)
+        self._change(identifier, 0, fraction)
+        return identifier
+
+    def extend(self, fractions: Iterable[int]) -> range:
+        """Add many fractions, the sorted index is rebuilt at once if they are many.
+
+        :param fractions: Fractions in thousandths, they are positive.
+        :return: Identifiers of added fractions.
+        """
+        first: int = len(self.fractions)
+        self.fractions.extend(fractions)
+        added: range = range(first, len(self.fractions))
+        if any(self.fractions[identifier] <= 0 for identifier in added):
+            del self.fractions[first:]
+            raise ValueError('Fraction should be a rational positive number greater than 0')
+        if len(added) < len(self) // 16:
+            for identifier in added:
+                fraction: int = self.fractions[identifier]
+                self.fractions[identifier] = 0
+                self._change(identifier, 0, fraction)
+            return added
+
+        for identifier in added:
+            self._changed.setdefault(identifier, 0)
+            self.sum += self.fractions[identifier]
+        self._sorted.build(self.fractions)
+        return added
+
+    def update(self, identifier: int, fraction: int) -> None:
+        """Update a fraction.
+
+        :param identifier: Fraction identifier.
+        :param fraction: Fraction in thousandths, it is positive.
+        """
+        if fraction <= 0:
+            raise ValueError('Fraction should be a rational positive number greater than 0')
+        self._change(identifier, self._fraction(identifier), fraction)
+
+    def remove(self, identifier: int) -> None:
+        """Remove a fraction, its identifier can be given to a fraction added later.
+
+        :param identifier: Fraction identifier.
+        """
+        self._change(identifier, self._fraction(identifier), 0)
+        self._free.append(identifier)
+
+    def _crossed_fractions(self, old_sum: int, new_sum: int) -> Iterator[Tuple[int, int]]:
+        """Find fractions which rounding thresholds could be crossed by the change of the sum.
+
+        A fraction f has the percent rounded up from k thousandths when 2000 f > (2k + 1) sum,
+        so the percent can change only if f lies between (2k + 1) old_sum / 2000 and (2k + 1) new_sum / 2000.
+        :param old_sum: Sum before the batch.
+        :param new_sum: Sum after the batch.
+        :return: Values and identifiers of fractions, every one goes once.
+        """
+        low_sum, high_sum = min(old_sum, new_sum), max(old_sum, new_sum)
+        lowest: Optional[int] = None
+        highest: int = -1
+        for threshold in range(1, 2 * PERCENT_SCALE, 2):
+            low: int = -(-threshold * low_sum // (2 * PERCENT_SCALE))
+            high: int = threshold * high_sum // (2 * PERCENT_SCALE)
+            if low > high:
+                continue
+            if lowest is not None and low <= highest + 1:
+                highest = high
+                continue
+            if lowest is not None:
+                yield from self._sorted.between(lowest, highest)
+            lowest, highest = low, high
+        if lowest is not None:
+            yield from self._sorted.between(lowest, highest)
+
+    def commit(self) -> Dict[int, Optional[int]]:
+        """Finish a batch of changes.
+
+        :return: New percents in thousandths of fractions whose percents have changed by identifiers,
+            None for removed fractions.
+        """
+        old_sum, new_sum = self._committed_sum, self.sum
+        changes: Dict[int, Optional[int]] = {}
+        for identifier, old_fraction in self._changed.items():
+            fraction: int = self.fractions[identifier]
+            old_percent: Optional[int] = round_percent(old_fraction, old_sum) if old_fraction else None
+            percent: Optional[int] = round_percent(fraction, new_sum) if fraction else None
+            if percent != old_percent:
+                changes[identifier] = percent
+
+        if old_sum and new_sum and old_sum != new_sum:
+            for fraction, identifier in self._crossed_fractions(old_sum, new_sum):
+                if identifier in self._changed:
+                    continue
+                percent = round_percent(fraction, new_sum)
+                if percent != round_percent(fraction, old_sum):
+                    changes[identifier] = percent
+
+        self._committed_sum = new_sum
+        self._changed = {}
+        return dict(sorted(changes.items()))
@@ -1,8 +1,14 @@
-from io import StringIO
+import random
+from array import array
+from decimal import Decimal
+from io import BytesIO, StringIO, TextIOWrapper
 from unittest import TestCase
 from unittest.mock import patch
 
-from .fraction_percent_calculation import main
+from . import incremental
+from ..binary import main as binary_main
+from .fraction_percent_calculation import calculate_percents, logger, main
+from .incremental import IncrementalPercents
 
 
 class TestFractionPercentCalculationTestCase(TestCase):
@@ -32,3 +38,138 @@ class TestFractionPercentCalculationTestCase(TestCase):
             self.assertNotEqual(len(percents), 0)
             for actual, expected in zip(percents, expected_output):
                 self.assertEqual(str(actual), expected)
+
+    def test_integer_calculation(self):
+        fractions = [f'{index % 997 + 1}.{index % 1000:03}' for index in range(3000)]
+        for input_values in [['a', '4', '1.5', '-1', 'b', '0.25', '2', '0.0625', '7'],
+                             ['3000'] + fractions,
+                             ['3', '1' + '0' * 30, '1e-5', '0.5']]:
+            results = []
+            for argv in [(), ('--integer',)]:
+                out = StringIO()
+                with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', out), \
+                        patch.object(logger, 'error') as error:
+                    main(argv)
+                results.append((out.getvalue(), error.call_args_list))
+            self.assertEqual(results[0], results[1])
+
+    def test_two_pass_calculation(self):
+        input_values = ['a', '5', '1.5', '-1', '0.5', '1', '2', '3', '7']
+        results = []
+        for argv in [(), ('--two-pass',)]:
+            out = StringIO()
+            with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', out), \
+                    patch(f'{main.__module__}.BLOCK_SIZE', 2), self.assertLogs(logger) as logs:
+                main(argv)
+            results.append((out.getvalue(), logs.output))
+        self.assertEqual(results[0], results[1])
+
+        # Errors are not logged by the second pass, but the logger is not disabled for other messages meanwhile.
+        def log_block(*args):
+            logger.info('Block')
+            return calculate_percents(*args)
+
+        with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', StringIO()), \
+                patch(f'{main.__module__}.BLOCK_SIZE', 2), patch(f'{main.__module__}.calculate_percents', log_block), \
+                self.assertLogs(logger, 'INFO') as logs:
+            main(['--two-pass'])
+        self.assertEqual(logs.output.count(f'INFO:{logger.name}:Block'), 3)
+        self.assertEqual(len(logs.output), 5)
+
+    def test_binary_output(self):
+        input_values = ['3', '1.5', '0.5', '1']
+        for argv in [(), ('--integer',), ('--two-pass',)]:
+            for binary_format, typecode, expected in [('int64', 'q', [500, 167, 333]),
+                                                      ('float64', 'd', [0.5, 0.167, 0.333])]:
+                out = TextIOWrapper(BytesIO())
+                with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', out):
+                    main(argv + ('--binary', binary_format))
+                self.assertListEqual(array(typecode, out.buffer.getvalue()).tolist(), expected)
+
+    def test_binary_input(self):
+        input_values = ['a', '4', '1.5', '-1', 'b', '0.25', '2', '0.0625', '7']
+        data = TextIOWrapper(BytesIO())
+        with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', data), \
+                patch.object(logger, 'error'):
+            self.assertEqual(binary_main(['to-binary', 'fractions']), 1)
+        self.assertEqual(data.buffer.getvalue(), b'')
+
+        input_values[7] = '0.625'
+        with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', data), \
+                patch.object(logger, 'error'):
+            self.assertEqual(binary_main(['to-binary', 'fractions']), 0)
+        expected = StringIO()
+        with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', expected), \
+                patch.object(logger, 'error'):
+            main()
+        for binary_format in [(), ('--binary', 'int64')]:
+            out = TextIOWrapper(BytesIO())
+            with patch('sys.stdin', TextIOWrapper(BytesIO(data.buffer.getvalue()))), patch('sys.stdout', out):
+                main(('--input-format', 'binary') + binary_format)
+            if not binary_format:
+                self.assertEqual(out.buffer.getvalue().decode(), expected.getvalue())
+            else:
+                self.assertListEqual(array('q', out.buffer.getvalue()).tolist(), [343, 57, 457, 143])
+
+        text = TextIOWrapper(BytesIO())
+        with patch('sys.stdin', TextIOWrapper(BytesIO(data.buffer.getvalue()))), patch('sys.stdout', text):
+            self.assertEqual(binary_main(['to-text', 'fractions']), 0)
+        self.assertEqual(text.buffer.getvalue(), b'4\n1.500\n0.250\n2.000\n0.625\n')
+
+    def test_aggregated_errors(self):
+        input_values = ['a', 'b', '3', '1.5', '-1', '0.5', 'c', '-2', '0', '-3', '1', 'd']
+        results = []
+        for argv in [(), ('--aggregate-errors',)]:
+            out = StringIO()
+            with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', out), \
+                    self.assertLogs(logger) as logs:
+                main(argv)
+            results.append((out.getvalue(), logs.output))
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertEqual(len(results[0][1]), 7)
+        self.assertListEqual(results[1][1], [
+            f'ERROR:{logger.name}:Incorrect input. Should be an integer. (2 lines: 1, 2)',
+            f'ERROR:{logger.name}:Incorrect input. Should be a rational positive number greater than 0. '
+            '(5 lines: 5, 7, 8, 9, 10)',
+        ])
+
+    def test_incremental_calculation(self):
+        rand = random.Random(0)
+        calculation = IncrementalPercents()
+        fractions = dict(zip(calculation.extend([1500, 500]), [1500, 500]))
+        self.assertDictEqual(calculation.commit(), {0: 750, 1: 250})
+        calculation.update(1, 1500)
+        self.assertDictEqual(calculation.commit(), {0: 500, 1: 500})
+
+        percents = {}
+        with patch.object(incremental, 'BLOCK_SIZE', 4):
+            for _ in range(200):
+                for _ in range(rand.randint(1, 5)):
+                    operation = rand.random()
+                    if operation < 0.5 or not fractions:
+                        fraction = rand.choice([1000, rand.randint(1, 3000)])
+                        fractions[calculation.add(fraction)] = fraction
+                    elif operation < 0.8:
+                        identifier = rand.choice(list(fractions))
+                        fractions[identifier] = rand.randint(1, 3000)
+                        calculation.update(identifier, fractions[identifier])
+                    else:
+                        identifier = rand.choice(list(fractions))
+                        calculation.remove(identifier)
+                        del fractions[identifier]
+                changes = calculation.commit()
+
+                # Percents are recalculated from scratch the way the integer calculation does.
+                new_percents = {identifier: int(percent.scaleb(3)) for identifier, percent in zip(
+                    fractions, calculate_percents([Decimal(fraction).scaleb(-3) for fraction in fractions.values()],
+                                                  Decimal(sum(fractions.values())).scaleb(-3)))}
+                expected = {identifier: percent for identifier, percent in new_percents.items()
+                            if percents.get(identifier) != percent}
+                expected.update((identifier, None) for identifier in percents if identifier not in new_percents)
+                self.assertDictEqual(changes, expected)
+                percents = new_percents
+        self.assertEqual(len(calculation), len(fractions))
+        with self.assertRaises(KeyError):
+            calculation.update(len(calculation.fractions), 1)
+        with self.assertRaises(ValueError):
+            calculation.add(0)
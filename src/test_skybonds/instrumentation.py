@@ -0,0 +1,314 @@
+"""Instrumentation of program stages shared by all programs.
+
+It is switched on with the --instrument argument or the SKYBONDS_INSTRUMENTATION environment
+variable. Programs measure coarse stages with measure() and the instrumentation replaces hot
+functions and methods with counting wrappers only while it is on, so a run without it executes
+the same code as before. Every stage records wall time spent in it excluding nested stages,
+amounts of calls, processed items and rejected ones, and peak memory traced by tracemalloc while
+it runs. Tracing memory slows programs down several times, so the time mode does not trace it.
+The summary is written to standard error as a JSON line when the program finishes. Modules needed
+only while instrumentation is on are imported when they are used.
+"""
+from __future__ import annotations
+
+import os
+import sys
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from time import perf_counter
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import logging
+    from typing import (Any, Callable, ContextManager, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO,
+                        Tuple, Type, Union)
+
+#: Environment variable switching instrumentation on if it is set to anything but 0, it can set a mode.
+ENVIRONMENT_VARIABLE: str = 'SKYBONDS_INSTRUMENTATION'
+#: Modes measuring memory and time or time only.
+MODES: Tuple[str, ...] = ('memory', 'time')
+
+
+class Stage:
+    """Measurements of a program stage."""
+    __slots__ = ['calls', 'items', 'rejected', 'seconds', 'peak_memory']
+
+    calls: int
+    items: int
+    rejected: int
+    #: Wall time excluding nested stages.
+    seconds: float
+    #: Peak of traced memory in bytes, it is not measured for wrapped functions.
+    peak_memory: Optional[int]
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.items = 0
+        self.rejected = 0
+        self.seconds = 0
+        self.peak_memory = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Get measurements as a dictionary.
+
+        :return: Measurements by names.
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Instrumentation:
+    """Measurements of stages of a program run."""
+
+    def __init__(self, program: str, loggers: Sequence[logging.Logger] = (), trace_memory: bool = True) -> None:
+        """Initialize an instance and start tracing memory allocations.
+
+        :param program: Program name.
+        :param loggers: Loggers whose error records are counted as rejections of running stages.
+        :param trace_memory: Whether peak memory is measured.
+        """
+        self.program: str = program
+        self.stages: Dict[str, Stage] = {}
+        #: Stages running now, the innermost goes last.
+        self.running: List[Stage] = []
+        self.peak_memory: Optional[int] = 0 if trace_memory else None
+        self._patched: List[Tuple[Any, str, Any, bool]] = []
+        self._loggers: List[logging.Logger] = []
+        for logger in loggers:
+            self.count_errors(logger)
+        self._tracemalloc = None
+        self._tracing: bool = False
+        if trace_memory:
+            import tracemalloc
+
+            self._tracemalloc = tracemalloc
+            self._tracing = not tracemalloc.is_tracing()
+            if self._tracing:
+                tracemalloc.start()
+        self._started: float = perf_counter()
+        self._finished: Optional[float] = None
+
+    @classmethod
+    def create(cls, program: str, mode: Optional[str] = None,
+               loggers: Sequence[logging.Logger] = ()) -> Optional['Instrumentation']:
+        """Create an instance if instrumentation is switched on.
+
+        :param program: Program name.
+        :param mode: One of MODES requested by command line arguments,
+            the environment variable is used if it is not given.
+        :param loggers: Loggers whose error records are counted as rejections of running stages.
+        :return: Instrumentation or None if it is switched off.
+        """
+        if mode is None:
+            mode = os.environ.get(ENVIRONMENT_VARIABLE, '0')
+            if mode in ('', '0'):
+                return None
+        return cls(program, loggers, trace_memory=mode != 'time')
+
+    def __enter__(self) -> 'Instrumentation':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+        self.emit()
+
+    def count_errors(self, logger: logging.Logger) -> None:
+        """Count error records of a logger as rejections of running stages until closing.
+
+        Modules of a program run as the main module import its module once more with another logger,
+        so loggers of modules are given to this method as they are imported.
+        :param logger: Logger, it is ignored if its errors are counted already.
+        """
+        if any(counted is logger for counted in self._loggers):
+            return
+        logger.addFilter(self._count_error)
+        self._loggers.append(logger)
+
+    def _count_error(self, record: logging.LogRecord) -> bool:
+        """Count an error record as a rejection of the innermost running stage.
+
+        :param record: Log record.
+        :return: True, records are not filtered out.
+        """
+        import logging
+
+        if record.levelno >= logging.ERROR and self.running:
+            self.running[-1].rejected += 1
+        return True
+
+    def stage(self, name: str) -> Stage:
+        """Get measurements of a stage.
+
+        :param name: Stage name.
+        :return: Stage, it is created on the first request.
+        """
+        stage: Optional[Stage] = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage()
+        return stage
+
+    def _record_peak_memory(self) -> None:
+        """Record peak memory since the last reset into the program and memory measuring running stages."""
+        tracemalloc = self._tracemalloc
+        if tracemalloc is None or not tracemalloc.is_tracing():
+            return
+        _, peak_memory = tracemalloc.get_traced_memory()
+        self.peak_memory = max(self.peak_memory, peak_memory)
+        for stage in self.running:
+            if stage.peak_memory is not None:
+                stage.peak_memory = max(stage.peak_memory, peak_memory)
+        tracemalloc.reset_peak()
+
+    def _finish(self, stage: Stage, start: float) -> None:
+        """Account time of a finished stage.
+
+        :param stage: The innermost running stage.
+        :param start: Time the stage has started at.
+        """
+        elapsed: float = perf_counter() - start
+        self.running.pop()
+        stage.seconds += elapsed
+        if self.running:
+            self.running[-1].seconds -= elapsed
+
+    @contextmanager
+    def measure(self, name: str, items: int = 0) -> Iterator[Stage]:
+        """Measure a stage.
+
+        :param name: Stage name.
+        :param items: Amount of items the stage processes, it can be added to the stage later.
+        :return: Context manager giving the stage.
+        """
+        stage: Stage = self.stage(name)
+        stage.calls += 1
+        stage.items += items
+        if stage.peak_memory is None and self.peak_memory is not None:
+            stage.peak_memory = 0
+        self._record_peak_memory()
+        self.running.append(stage)
+        start: float = perf_counter()
+        try:
+            yield stage
+        finally:
+            self._record_peak_memory()
+            self._finish(stage, start)
+
+    @staticmethod
+    def _count_elements(stage: Stage, elements: Iterable) -> Iterator:
+        """Count elements of an iterable as items of a stage while they are iterated.
+
+        :param stage: Stage.
+        :param elements: Iterable.
+        :return: The same elements.
+        """
+        for element in elements:
+            stage.items += 1
+            yield element
+
+    def wrap(self, name: str, function: Callable,
+             rejections: Union[Type[Exception], Tuple[Type[Exception], ...]] = (), elements: bool = False) -> Callable:
+        """Wrap a function counting its calls or elements of its results as items of a stage.
+
+        Calls of the function made while the stage is running already, e.g. by another wrapped function
+        of the stage, are not counted.
+        :param name: Stage name.
+        :param function: Function.
+        :param rejections: Exceptions counted as rejected items, they are raised further.
+        :param elements: Whether elements of a returned sequence or iterator are counted instead of calls.
+        :return: Wrapped function.
+        """
+        stage: Stage = self.stage(name)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            nested: bool = stage in self.running
+            if not nested:
+                stage.calls += 1
+            self.running.append(stage)
+            start: float = perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except rejections:
+                if not nested:
+                    stage.rejected += 1
+                raise
+            finally:
+                self._finish(stage, start)
+            if nested:
+                return result
+            if not elements:
+                stage.items += 1
+            elif hasattr(result, '__len__'):
+                stage.items += len(result)
+            else:
+                return self._count_elements(stage, result)
+            return result
+
+        return wrapper
+
+    def instrument(self, owner: Any, attribute: str, name: str,
+                   rejections: Union[Type[Exception], Tuple[Type[Exception], ...]] = (),
+                   elements: bool = False) -> None:
+        """Replace a function or a method of a module, class or instance with a counting wrapper until closing.
+
+        :param owner: Module, class or instance.
+        :param attribute: Attribute name.
+        :param name: Stage name.
+        :param rejections: Exceptions counted as rejected items.
+        :param elements: Whether elements of a returned sequence or iterator are counted instead of calls.
+        """
+        attributes: Dict[str, Any] = vars(owner)
+        self._patched.append((owner, attribute, attributes.get(attribute), attribute in attributes))
+        setattr(owner, attribute, self.wrap(name, getattr(owner, attribute), rejections, elements))
+
+    def close(self) -> None:
+        """Restore instrumented functions and stop tracing memory allocations."""
+        if self._finished is not None:
+            return
+        self._finished = perf_counter()
+        self._record_peak_memory()
+        if self._tracing:
+            self._tracemalloc.stop()
+        for owner, attribute, value, owned in reversed(self._patched):
+            if owned:
+                setattr(owner, attribute, value)
+            else:
+                delattr(owner, attribute)
+        for logger in self._loggers:
+            logger.removeFilter(self._count_error)
+
+    def summary(self) -> Dict[str, Any]:
+        """Summarize measurements.
+
+        :return: Program name, total time and peak memory and measurements of stages in order they have started.
+        """
+        return {
+            'program': self.program,
+            'seconds': round((self._finished or perf_counter()) - self._started, 6),
+            'peak_memory': self.peak_memory,
+            'stages': {name: dict(stage.as_dict(), seconds=round(stage.seconds, 6))
+                       for name, stage in self.stages.items()},
+        }
+
+    def emit(self, stream: Optional[TextIO] = None) -> None:
+        """Write the summary as a JSON line.
+
+        :param stream: Output stream, standard error by default.
+        """
+        import json
+
+        stream = stream if stream is not None else sys.stderr
+        stream.write(json.dumps(self.summary()) + '\n')
+        stream.flush()
+
+
+def measure(instrumentation: Optional[Instrumentation], name: str, items: int = 0) -> ContextManager[Optional[Stage]]:
+    """Measure a stage if instrumentation is on.
+
+    :param instrumentation: Instrumentation or None if it is switched off.
+    :param name: Stage name.
+    :param items: Amount of items the stage processes.
+    :return: Context manager giving the stage or None.
+    """
+    if instrumentation is None:
+        return nullcontext()
+    return instrumentation.measure(name, items)
@@ -0,0 +1,65 @@
+"""Loggers of programs created on first use.
+
+Importing logging takes a noticeable part of startup of a short run, so a program module creates
+its logger only when something is logged or the logger is imported by another module, e.g.
+
+    get_logger, __getattr__ = lazy_logger(globals())
+"""
+from __future__ import annotations
+
+import sys
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import logging
+    from typing import Any, Callable, Dict, Tuple
+
+
+class StandardError:
+    """Stream writing to the current standard error, so records follow redirections of sys.stderr."""
+
+    @staticmethod
+    def write(text: str) -> int:
+        return sys.stderr.write(text)
+
+    @staticmethod
+    def flush() -> None:
+        sys.stderr.flush()
+
+
+def create_logger(name: str) -> logging.Logger:
+    """Create a logger writing records to standard error.
+
+    :param name: Logger name.
+    :return: Logger.
+    """
+    import logging
+
+    logger = logging.Logger(name, level=logging.INFO)
+    logger.addHandler(logging.StreamHandler(StandardError()))
+    return logger
+
+
+def lazy_logger(namespace: Dict[str, Any]) -> Tuple[Callable[[], logging.Logger], Callable[[str], Any]]:
+    """Make functions creating the logger of a module on first use.
+
+    The logger is kept in the module as the logger attribute once it is created.
+    :param namespace: Globals of the module.
+    :return: Function getting the logger and the module __getattr__ function giving the logger attribute.
+    """
+    def get_logger() -> logging.Logger:
+        """Get the logger of the module.
+
+        :return: Logger.
+        """
+        logger = namespace.get('logger')
+        if logger is None:
+            logger = namespace['logger'] = create_logger(namespace['__name__'])
+        return logger
+
+    def module_getattr(name: str) -> Any:
+        if name == 'logger':
+            return get_logger()
+        raise AttributeError(f'module {namespace["__name__"]!r} has no attribute {name!r}')
+
+    return get_logger, module_getattr
@@ -0,0 +1,186 @@
+"""Bulk input reading.
+
+The whole input is read at once and split into columns with C-level bytes operations.
+Lines are deserialized one by one only if the input turns out to have malformed lines.
+"""
+import re
+import sys
+from array import array
+from dataclasses import dataclass
+from itertools import repeat
+from typing import List, Optional, TextIO, Tuple, Union
+
+from ..validation import ErrorReport
+from .mega_trader import (InitialDataDeserializeError, Market, SlotDeserializeError, deserialize_initial_data,
+                          logger, split_lot)
+
+#: Column of price percents which all have exactly one decimal.
+PERCENTS_PATTERN = re.compile(rb'\d+\.\d(?: \d+\.\d)*')
+
+
+def read_all(stream: TextIO) -> bytes:
+    """Read everything from given stream.
+
+    :param stream: Text stream, its binary buffer is used if there is one.
+    :return: Read data.
+    """
+    buffer = getattr(stream, 'buffer', None)
+    if buffer is not None:
+        return buffer.read()
+    return stream.read().encode()
+
+
+def int64_column(values: List[int]) -> Union[array, List[int]]:
+    """Pack values into a column of 64-bit integers if they fit.
+
+    :param values: Values.
+    :return: Column or the list itself if some value does not fit 64-bit integers.
+    """
+    try:
+        return array('q', values)
+    except (TypeError, OverflowError):
+        return values
+
+
+def split_initial_data(data: bytes, report: Optional[ErrorReport] = None) -> Tuple[Optional[Tuple[int, int, int]],
+                                                                                   int, int]:
+    """Find initial data at the beginning of input data.
+
+    Lines before the first valid initial data are reported as errors.
+    :param data: Input data.
+    :param report: Report to collect errors into, errors are logged one by one if it is not given.
+    :return: Initial data or None if there is no valid one, offset of lots in the data and number of their first line.
+    """
+    offset: int = 0
+    line_number: int = 1
+    while offset < len(data):
+        end: int = data.find(b'\n', offset) + 1 or len(data)
+        try:
+            return deserialize_initial_data(data[offset:end].decode()), end, line_number + 1
+        except InitialDataDeserializeError as exc:
+            if report is None:
+                logger.error(f'Line {line_number}: {exc}')
+            else:
+                report.add(line_number, str(exc))
+        offset = end
+        line_number += 1
+
+    return None, offset, line_number
+
+
+@dataclass
+class BulkInput:
+    """Input read at once and split into columns."""
+    __slots__ = ['initial_data', 'line_numbers', 'days', 'bond_names', 'bond_price_percents', 'bonds_amounts',
+                 'errors', 'terminated']
+
+    #: Issue period in days, amount of lots per day and balance or None if there is no valid initial data.
+    initial_data: Optional[Tuple[int, int, int]]
+    #: Numbers of input lines lots were read from.
+    line_numbers: array
+    #: Columns of lots are lists if some of their values do not fit 64-bit integers.
+    days: Union[array, List[int]]
+    bond_names: List[str]
+    #: Price percents in tenths.
+    bond_price_percents: Union[array, List[int]]
+    bonds_amounts: Union[array, List[int]]
+    #: Deserialization errors as pairs of line number and message.
+    errors: List[Tuple[int, str]]
+    #: Whether lots are terminated with an empty line.
+    terminated: bool
+
+    @classmethod
+    def read(cls, stream: TextIO, report: Optional[ErrorReport] = None) -> 'BulkInput':
+        """Read the whole stream.
+
+        :param stream: Input stream.
+        :param report: Report to collect errors of initial data into, they are logged one by one if it is not given.
+        :return: Read input.
+        """
+        return cls.parse(read_all(stream), report)
+
+    @classmethod
+    def parse(cls, data: bytes, report: Optional[ErrorReport] = None) -> 'BulkInput':
+        """Parse input data.
+
+        :param data: Input data.
+        :param report: Report to collect errors of initial data into, they are logged one by one if it is not given.
+        :return: Parsed input.
+        """
+        initial_data, offset, first_line_number = split_initial_data(data, report)
+        bulk_input: BulkInput = cls.parse_lots(data[offset:].splitlines(), first_line_number)
+        bulk_input.initial_data = initial_data
+        return bulk_input
+
+    @classmethod
+    def parse_lots(cls, lines: List[bytes], first_line_number: int) -> 'BulkInput':
+        """Parse lines with lots.
+
+        Lots are read until the first empty line.
+        :param lines: Lines.
+        :param first_line_number: Number of the first line in the input.
+        :return: Parsed input without initial data.
+        """
+        bulk_input = cls(initial_data=None, line_numbers=array('q'), days=array('q'), bond_names=[],
+                         bond_price_percents=array('q'), bonds_amounts=array('q'), errors=[], terminated=False)
+        lines = list(map(bytes.strip, lines))
+        if b'' in lines:
+            del lines[lines.index(b''):]
+            bulk_input.terminated = True
+
+        bulk_input.line_numbers = array('q', range(first_line_number, first_line_number + len(lines)))
+        if list(map(bytes.count, lines, repeat(b' ', len(lines)))).count(3) == len(lines):
+            tokens: List[bytes] = b' '.join(lines).split(b' ') if lines else []
+            percents: bytes = b' '.join(tokens[2::4])
+            try:
+                if lines and not PERCENTS_PATTERN.fullmatch(percents):
+                    raise ValueError('Price percents are not of the same format')
+                bulk_input.days = array('q', map(int, tokens[0::4]))
+                bulk_input.bond_price_percents = array('q', map(int, percents.replace(b'.', b'').split(b' ')))
+                bulk_input.bonds_amounts = array('q', map(int, tokens[3::4]))
+            except (ValueError, OverflowError):
+                pass
+            else:
+                bulk_input.bond_names = list(map(sys.intern, map(bytes.decode, tokens[1::4])))
+                return bulk_input
+
+        # Some lines are malformed, so they are deserialized one by one to find them.
+        bulk_input.line_numbers = array('q')
+        days: List[int] = []
+        bond_price_percents: List[int] = []
+        bonds_amounts: List[int] = []
+        for line_number, line in enumerate(lines, first_line_number):
+            try:
+                day, bond_name, bond_price_percent, bonds_amount = split_lot(line.decode())
+            except SlotDeserializeError as exc:
+                bulk_input.errors.append((line_number, str(exc)))
+                continue
+
+            bulk_input.line_numbers.append(line_number)
+            days.append(day)
+            bulk_input.bond_names.append(sys.intern(bond_name))
+            bond_price_percents.append(bond_price_percent)
+            bonds_amounts.append(bonds_amount)
+
+        bulk_input.days = int64_column(days)
+        bulk_input.bond_price_percents = int64_column(bond_price_percents)
+        bulk_input.bonds_amounts = int64_column(bonds_amounts)
+        return bulk_input
+
+    def fill(self, market: Market, report: Optional[ErrorReport] = None) -> None:
+        """Issue read lots to given market.
+
+        Deserialization errors and lots the market does not accept are logged in order of input lines.
+        :param market: Market to issue lots to.
+        :param report: Report to collect errors into, errors are logged one by one if it is not given.
+        """
+        rejected: List[Tuple[int, Market.InapplicableSlot]] = market.extend(
+            self.days, self.bond_price_percents, self.bonds_amounts, self.bond_names)
+        errors: List[Tuple[int, str]] = self.errors + [(self.line_numbers[position], str(exc))
+                                                       for position, exc in rejected]
+
+        if report is not None:
+            report.extend(sorted(errors))
+            return
+        for line_number, message in sorted(errors):
+            logger.error(f'Line {line_number}: {message}')
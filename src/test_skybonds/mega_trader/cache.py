@@ -0,0 +1,293 @@
+"""Persistent cache of parsed markets.
+
+Input is hashed and the market parsed from it is stored in a file named by the hash: initial data,
+accepted lots ranked by income with precomputed prices, bond names and input errors. Later runs
+with the same input memory-map the file and buy lots without parsing and ranking them again,
+lot instances are created only for bought lots. Files record market constants they were made with
+and are ignored if the constants have changed. The least recently used files are removed when
+the cache grows beyond its size limit.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from operator import attrgetter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, TextIO, Tuple
+
+from ..validation import ErrorReport
+from .bulk import BulkInput, read_all
+from .mega_trader import Lot, Market, MegaTrader, logger
+
+#: Default limit of cache size in bytes.
+DEFAULT_CACHE_SIZE: int = 1 << 30
+#: Format marker of cache files.
+MAGIC: bytes = b'SKYLOTS1'
+#: Header with market constants, initial data, amounts of lots and sizes of names and errors.
+HEADER = struct.Struct('=8s10q')
+#: Lot columns in ranked order.
+COLUMNS: Tuple[str, ...] = ('orders', 'days', 'bond_price_percents', 'bonds_amounts', 'name_ids', 'prices',
+                            'bond_overpayments')
+#: Size of a column value.
+ITEM_SIZE: int = array('q').itemsize
+#: Suffix of cache files.
+SUFFIX: str = '.lots'
+
+
+class CachedMarket(Market):
+    """Market with ranked lots loaded from a cache file.
+
+    Lot instances are created only when they are requested, lots can not be added to the market.
+    """
+
+    def __init__(self, issue_period: int, lots_amount_per_day: int, columns: Sequence[memoryview],
+                 bond_names: List[str], first_order: int) -> None:
+        """Initialize an instance.
+
+        :param issue_period: Period in days when lots can be issued to the market.
+        :param lots_amount_per_day: Amount of lots per day that can be issued.
+        :param columns: Lot columns in ranked order, orders are counted from 1 within the input.
+        :param bond_names: Bond names indexed by name identifiers.
+        :param first_order: Order of the first lot of the input.
+        """
+        super().__init__(issue_period, lots_amount_per_day)
+        self.columns: Sequence[memoryview] = columns
+        self.bond_names: List[str] = bond_names
+        self._first_order: int = first_order
+
+    def __len__(self) -> int:
+        return len(self.columns[0])
+
+    @property
+    def prices(self) -> memoryview:
+        """Get prices of ranked lots in thousandths."""
+        return self.columns[COLUMNS.index('prices')]
+
+    def add(self, lot: Lot) -> None:
+        raise TypeError('Lots can not be added to a cached market')
+
+    def lot(self, position: int) -> Lot:
+        """Create lot instance.
+
+        :param position: Position of the lot in the ranking.
+        :return: Lot instance.
+        """
+        order, day, bond_price_percent, bonds_amount, name_id, price, bond_overpayment = (
+            column[position] for column in self.columns)
+        return Lot(order=self._first_order + order - 1, day=day, price=price, bond_price_percent=bond_price_percent,
+                   bond_name=self.bond_names[name_id], bonds_amount=bonds_amount, bond_overpayment=bond_overpayment)
+
+    def ranked_lots(self) -> List[Lot]:
+        """Rank lots by income, the most profitable go first.
+
+        :return: Ranked lots.
+        """
+        return [self.lot(position) for position in range(len(self))]
+
+
+class CachedMegaTrader(MegaTrader):
+    """Trader walking prices of a cached market and creating only bought lots."""
+
+    def buy_lots(self, market: Market) -> List[Lot]:
+        """Buy slots on given market.
+
+        :param market: Market where slots should be bought.
+        :return: Slots were bought.
+        """
+        if not isinstance(market, CachedMarket):
+            return super().buy_lots(market)
+
+        for position, price in enumerate(market.prices):
+            if self.balance >= price:
+                self.balance -= price
+                self.lots.append(market.lot(position))
+
+        self.lots.sort(key=attrgetter('order'))
+        return self.lots
+
+
+class MarketCache:
+    """Directory of cache files bounded by size."""
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        """Initialize an instance.
+
+        :param directory: Cache directory, it is created if it does not exist.
+        :param max_size: Limit of total size of cache files in bytes.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size: int = max_size
+
+    @staticmethod
+    def constants() -> Tuple[int, int, int]:
+        """Get market constants parsed lots depend on.
+
+        :return: Bond rating, repayment period and daily income.
+        """
+        return Market.BOND_RATING, Market.BOND_REPAYMENT_PERIOD, Market.BOND_DAILY_INCOME
+
+    def path(self, data: bytes) -> Path:
+        """Get path of the cache file of input data.
+
+        :param data: Input data.
+        :return: Path.
+        """
+        return self.directory / (hashlib.sha256(data).hexdigest() + SUFFIX)
+
+    def load(self, data: bytes) -> Optional[Tuple[CachedMarket, int, List[Tuple[int, str]]]]:
+        """Load the market of input data.
+
+        :param data: Input data.
+        :return: Market, balance in thousandths and errors as pairs of line number and message
+            or None if there is no valid cache file.
+        """
+        path: Path = self.path(data)
+        try:
+            with open(path, 'rb') as file:
+                memory = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            (magic, bond_rating, repayment_period, daily_income, issue_period, lots_amount_per_day, balance,
+             parsed_amount, lots_amount, names_size, errors_size) = HEADER.unpack_from(memory)
+            columns_size: int = len(COLUMNS) * lots_amount * ITEM_SIZE
+            if magic != MAGIC or len(memory) != HEADER.size + columns_size + names_size + errors_size:
+                raise ValueError('Malformed cache file')
+            if (bond_rating, repayment_period, daily_income) != self.constants():
+                raise ValueError('Prices and incomes were calculated with other market constants')
+            offset: int = HEADER.size + columns_size
+            bond_names: List[str] = list(map(sys.intern, memory[offset:offset + names_size].decode().split('\n')))
+            errors: List[Tuple[int, str]] = [(line_number, message) for line_number, message
+                                             in json.loads(memory[offset + names_size:])]
+        except (struct.error, TypeError, ValueError):
+            memory.close()
+            path.unlink(missing_ok=True)
+            return None
+
+        view: memoryview = memoryview(memory)
+        columns: List[memoryview] = [
+            view[HEADER.size + index * lots_amount * ITEM_SIZE:HEADER.size + (index + 1) * lots_amount * ITEM_SIZE]
+            .cast('q') for index in range(len(COLUMNS))]
+        os.utime(path)
+
+        market = CachedMarket(issue_period, lots_amount_per_day, columns, bond_names,
+                              Lot.reserve_orders(parsed_amount).start)
+        return market, balance, errors
+
+    def store(self, data: bytes, market: Market, balance: int, first_order: int, parsed_amount: int,
+              errors: List[Tuple[int, str]]) -> bool:
+        """Store the market parsed from input data and remove the least recently used files beyond the size limit.
+
+        Markets with numbers which do not fit 64-bit integers or with percents not in integer tenths are not stored.
+        :param data: Input data.
+        :param market: Market with issued lots.
+        :param balance: Balance in thousandths.
+        :param first_order: Order of the first parsed lot.
+        :param parsed_amount: Amount of parsed lots, accepted or not.
+        :param errors: Errors as pairs of line number and message.
+        :return: Whether the market is stored.
+        """
+        ranked_lots: List[Lot] = list(market.ranked_lots())
+        name_ids: Dict[str, int] = {}
+        try:
+            columns: List[array] = [
+                array('q', [lot.order - first_order + 1 for lot in ranked_lots]),
+                array('q', [lot.day for lot in ranked_lots]),
+                array('q', [lot.bond_price_percent for lot in ranked_lots]),
+                array('q', [lot.bonds_amount for lot in ranked_lots]),
+                array('q', [name_ids.setdefault(lot.bond_name, len(name_ids)) for lot in ranked_lots]),
+                array('q', [lot.price for lot in ranked_lots]),
+                array('q', [lot.bond_overpayment for lot in ranked_lots]),
+            ]
+            names: bytes = '\n'.join(name_ids).encode()
+            errors_data: bytes = json.dumps(errors).encode()
+            header: bytes = HEADER.pack(MAGIC, *self.constants(), market._trading_period, market._lots_amount_per_day,
+                                        balance, parsed_amount, len(ranked_lots), len(names), len(errors_data))
+        except (TypeError, OverflowError, struct.error):
+            return False
+
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False) as file:
+            file.write(header)
+            for column in columns:
+                column.tofile(file)
+            file.write(names)
+            file.write(errors_data)
+        os.replace(file.name, self.path(data))
+        self.evict()
+        return True
+
+    def evict(self) -> None:
+        """Remove the least recently used files while total size exceeds the limit."""
+        entries: List[Tuple[float, int, Path]] = []
+        for path in self.directory.glob('*' + SUFFIX):
+            try:
+                stat: os.stat_result = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total: int = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def report_errors(errors: List[Tuple[int, str]], report: Optional[ErrorReport] = None) -> None:
+    """Report errors the way bulk reading does.
+
+    :param errors: Errors as pairs of line number and message in order of lines.
+    :param report: Report to collect errors into, errors are logged one by one if it is not given.
+    """
+    if report is not None:
+        report.extend(errors)
+        return
+    for line_number, message in errors:
+        logger.error(f'Line {line_number}: {message}')
+
+
+def read_cached(stream: TextIO, directory: str, max_size: int = DEFAULT_CACHE_SIZE,
+                report: Optional[ErrorReport] = None) -> Optional[Tuple[Market, int]]:
+    """Read the whole input into a market using the cache.
+
+    :param stream: Input stream.
+    :param directory: Cache directory.
+    :param max_size: Limit of cache size in bytes.
+    :param report: Report to collect errors into, errors are logged one by one if it is not given.
+    :return: Market and balance in thousandths or None if there is no valid initial data.
+    """
+    data: bytes = read_all(stream)
+    cache = MarketCache(directory, max_size)
+    cached: Optional[Tuple[CachedMarket, int, List[Tuple[int, str]]]] = cache.load(data)
+    if cached is not None:
+        market, balance, errors = cached
+        report_errors(errors, report)
+        return market, balance
+
+    # Every error is kept to be reported again by later runs.
+    collected = ErrorReport(sample_size=sys.maxsize)
+    bulk_input: BulkInput = BulkInput.parse(data, collected)
+    first_order: int = Lot.reserve_orders(0).start
+    if bulk_input.initial_data is not None:
+        days, lots_per_day, balance = bulk_input.initial_data
+        market = Market(days, lots_per_day)
+        bulk_input.fill(market, collected)
+    errors: List[Tuple[int, str]] = sorted((line_number, message) for message, line_numbers in collected.samples.items()
+                                           for line_number in line_numbers)
+    report_errors(errors, report)
+    if bulk_input.initial_data is None:
+        return None
+
+    if cache.store(data, market, balance, first_order, len(bulk_input.days), errors):
+        # The stored market is ranked already, so it is used instead of ranking lots again.
+        cached = cache.load(data)
+        if cached is not None:
+            return cached[0], balance
+    return market, balance
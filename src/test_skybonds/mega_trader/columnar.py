@@ -0,0 +1,247 @@
+"""Columnar market.
+
+Lots are kept in typed columns so that income of all of them is evaluated
+with a single vectorized NumPy call instead of one computation per lot.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+from .lot_store import LotStore, int64_values
+from .mega_trader import MONEY_SCALE, PERCENT_SCALE, Lot, Market, MegaTrader
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def select_greedy(prices: 'np.ndarray', balance: int) -> 'np.ndarray':
+    """Select lots the same way the greedy trader does but in vectorized steps.
+
+    Lots are walked in the given order and every lot that still fits the balance is bought.
+    Each step buys the longest affordable prefix at once, skips the first lot that does not fit
+    and drops the lots which became too expensive.
+    :param prices: Ranked lot prices.
+    :param balance: Balance in the same units as prices.
+    :return: Boolean mask of bought lots.
+    """
+    chosen: np.ndarray = np.zeros(prices.size, dtype=bool)
+    int64_max: int = np.iinfo(np.int64).max
+    balance = min(balance, int64_max)
+    candidates: np.ndarray = np.flatnonzero(prices <= balance)
+    while candidates.size:
+        # Every candidate price does not exceed the balance, so a window of this size can not overflow.
+        window: np.ndarray = candidates[:max(1, int64_max // max(balance, 1))]
+        spent: np.ndarray = np.cumsum(prices[window])
+        affordable: int = int(np.searchsorted(spent, balance, side='right'))
+        chosen[window[:affordable]] = True
+        if affordable:
+            balance -= int(spent[affordable - 1])
+        candidates = candidates[affordable + (affordable < window.size):]
+        candidates = candidates[prices[candidates] <= balance]
+
+    return chosen
+
+
+class ColumnarMarket(Market):
+    """Market keeping lots in columns of a lot store.
+
+    Lot instances are created only when they are requested. It requires NumPy to be installed.
+    If some lot does not fit 64-bit integer columns, the market keeps lot instances the way the plain
+    market does, the store is dropped then.
+    """
+
+    def __init__(self, issue_period: int, lots_amount_per_day: int) -> None:
+        """Initialize an instance.
+
+        :param issue_period: Period in days when lots can be issued to the market.
+        :param lots_amount_per_day: Amount of lots per day that can be issued.
+        """
+        if np is None:
+            raise ImportError('To use columnar market please install "numpy"')
+
+        # The lot store is created by the lots setter called from the base initializer.
+        self.store: Optional[LotStore]
+        #: Lot instances, they are kept only if the store is dropped.
+        self._lots: List[Lot]
+        super().__init__(issue_period, lots_amount_per_day)
+
+    @property
+    def lots(self) -> List[Lot]:
+        """Get all lots in order they were issued.
+
+        Lot instances are created on every call unless the store is dropped.
+        """
+        if self.store is None:
+            return self._lots
+        return [self.store.lot(index, self.BOND_RATING) for index in range(len(self.store))]
+
+    @lots.setter
+    def lots(self, lots: List[Lot]) -> None:
+        self.store = LotStore()
+        self._lots = []
+        for lot in lots:
+            self.add(lot)
+
+    def _keep_instances(self) -> None:
+        """Move stored lots to instances and drop the store."""
+        if self.store is not None:
+            self._lots = self.lots
+            self.store = None
+
+    def add(self, lot: Lot) -> None:
+        """Issue a lot to the market for trading.
+
+        :param lot: Lot for trading.
+        """
+        if not (1 <= lot.day <= self._trading_period):
+            raise self.DayOutOfRange(1, self._trading_period)
+
+        if self._daily_amounts[lot.day] >= self._lots_amount_per_day:
+            raise self.BondsExceeded(self._lots_amount_per_day)
+
+        if self.store is not None:
+            try:
+                self.store.append(lot)
+            except OverflowError:
+                self._keep_instances()
+        if self.store is None:
+            self._lots.append(lot)
+        self._daily_amounts[lot.day] += 1
+
+    def extend(self, days: Sequence[int], bond_price_percents: Sequence[int], bonds_amounts: Sequence[int],
+               bond_names: Sequence[str], orders: Optional[Sequence[int]] = None
+               ) -> List[Tuple[int, Market.InapplicableSlot]]:
+        """Issue lots given column-wise to the market.
+
+        Lots are checked in vectorized way without creating lot instances
+        unless some value does not fit 64-bit integers.
+        :param days: Start days when lots are issued to the market.
+        :param bond_price_percents: Price percents of one bond in tenths.
+        :param bonds_amounts: Amounts of bonds in lots.
+        :param bond_names: Bond names.
+        :param orders: Orders of lots, new ones are assigned to accepted lots if they are not given.
+        :return: Positions of lots the market has not accepted with the reasons.
+        """
+        columns: List[Optional[np.ndarray]] = [int64_values(column) for column in (
+            days, bond_price_percents, bonds_amounts, () if orders is None else orders)]
+        if self.store is None or any(column is None for column in columns):
+            self._keep_instances()
+            return super().extend(days, bond_price_percents, bonds_amounts, bond_names, orders)
+
+        days_column, bond_price_percents_column, bonds_amounts_column, orders_column = columns
+        in_period: np.ndarray = (days_column >= 1) & (days_column <= self._trading_period)
+
+        # Every lot gets its number among lots issued the same day, numbers continue already stored amounts.
+        positions: np.ndarray = np.flatnonzero(in_period)
+        by_day: np.ndarray = positions[np.argsort(days_column[positions], kind='stable')]
+        sorted_days: np.ndarray = days_column[by_day]
+        day_starts: np.ndarray = np.flatnonzero(np.diff(sorted_days, prepend=-1))
+        numbers: np.ndarray = np.arange(by_day.size) - np.repeat(day_starts, np.diff(day_starts, append=by_day.size))
+        daily_amounts: np.ndarray = np.frombuffer(self._daily_amounts, dtype=np.int64)
+        accepted: np.ndarray = np.zeros(days_column.size, dtype=bool)
+        accepted[by_day] = daily_amounts[sorted_days] + numbers < self._lots_amount_per_day
+
+        accepted_positions: np.ndarray = np.flatnonzero(accepted)
+        self.store.extend(Lot.reserve_orders(accepted_positions.size) if orders is None
+                          else orders_column[accepted_positions],
+                          days_column[accepted_positions],
+                          bond_price_percents_column[accepted_positions],
+                          bonds_amounts_column[accepted_positions],
+                          [bond_names[position] for position in accepted_positions])
+        np.add.at(daily_amounts, days_column[accepted_positions], 1)
+
+        return [(position, self.BondsExceeded(self._lots_amount_per_day) if in_period[position]
+                 else self.DayOutOfRange(1, self._trading_period))
+                for position in np.flatnonzero(~accepted)]
+
+    def _max_abs(self, name: str) -> int:
+        """Get the largest absolute value of a column.
+
+        :param name: Column name.
+        :return: Value, zero if there are no lots.
+        """
+        column: np.ndarray = self.store.column(name)
+        return max(-int(column.min()), int(column.max())) if column.size else 0
+
+    def fits_int64(self) -> bool:
+        """Check whether prices and incomes of all lots can be evaluated in 64-bit integers.
+
+        Bounds of intermediate values are evaluated with Python integers from the largest absolute values of columns.
+        :return: Whether the evaluation can not overflow.
+        """
+        bond_price_percent: int = self._max_abs('bond_price_percents')
+        bonds_amount: int = self._max_abs('bonds_amounts')
+        bond_price: int = bond_price_percent * self.BOND_RATING * MONEY_SCALE // (100 * PERCENT_SCALE) + 1
+        bond_income: int = self.BOND_DAILY_INCOME * self._total_trading_period * MONEY_SCALE
+        bounds: List[int] = [bond_price_percent * self.BOND_RATING * MONEY_SCALE,
+                             (bond_income + bond_price + self.BOND_RATING * MONEY_SCALE) * bonds_amount]
+        return max(bounds) <= np.iinfo(np.int64).max
+
+    def _columns(self, *names: str) -> List['np.ndarray']:
+        """Get columns of the store for evaluation.
+
+        :param names: Column names.
+        :return: Arrays of 64-bit integers or of Python integers if the evaluation can overflow 64-bit integers.
+        """
+        dtype: type = np.int64 if self.fits_int64() else object
+        return [self.store.column(name).astype(dtype, copy=False) for name in names]
+
+    def evaluate_prices(self) -> 'np.ndarray':
+        """Evaluate prices of all lots.
+
+        :return: Prices in thousandths, in order lots were issued.
+        """
+        bond_price_percents, bonds_amounts = self._columns('bond_price_percents', 'bonds_amounts')
+        bond_prices: np.ndarray = bond_price_percents * self.BOND_RATING * MONEY_SCALE // (100 * PERCENT_SCALE)
+        return bond_prices * bonds_amounts
+
+    def evaluate_incomes(self) -> 'np.ndarray':
+        """Evaluate income of all lots on the end of trading period.
+
+        :return: Incomes in thousandths, in order lots were issued.
+        """
+        days, bond_price_percents, bonds_amounts = self._columns('days', 'bond_price_percents', 'bonds_amounts')
+        lot_trading_days: np.ndarray = self._total_trading_period - days
+        bond_income: np.ndarray = self.BOND_DAILY_INCOME * lot_trading_days * MONEY_SCALE
+        bond_overpayment: np.ndarray = bond_price_percents * self.BOND_RATING * MONEY_SCALE \
+            // (100 * PERCENT_SCALE) - self.BOND_RATING * MONEY_SCALE
+        return (bond_income - bond_overpayment) * bonds_amounts
+
+    def ranking(self) -> 'np.ndarray':
+        """Rank lots by income, the most profitable go first.
+
+        Lots with equal income keep the order they were issued in.
+        :return: Indices of lots.
+        """
+        return np.argsort(-self.evaluate_incomes(), kind='stable')
+
+    def ranked_lots(self) -> List[Lot]:
+        """Rank lots by income, the most profitable go first.
+
+        :return: Ranked lots.
+        """
+        if self.store is None:
+            return super().ranked_lots()
+        return [self.store.lot(index, self.BOND_RATING) for index in self.ranking()]
+
+
+class ColumnarMegaTrader(MegaTrader):
+    """Trader buying lots on a columnar market with vectorized greedy pass."""
+
+    def buy_lots(self, market: ColumnarMarket) -> List[Lot]:
+        """Buy slots on given market.
+
+        :param market: Market where slots should be bought.
+        :return: Slots were bought.
+        """
+        if market.store is None or not market.fits_int64():
+            return super().buy_lots(market)
+
+        ranking: np.ndarray = market.ranking()
+        chosen: np.ndarray = np.sort(ranking[select_greedy(market.evaluate_prices()[ranking], self.balance)])
+        for index in chosen:
+            lot: Lot = market.store.lot(index, market.BOND_RATING)
+            self.balance -= lot.price
+            self.lots.append(lot)
+
+        return self.lots
@@ -0,0 +1,250 @@
+"""External memory market.
+
+Lots are not kept in memory: issued lots are buffered as fixed-width records until the buffer
+reaches the memory budget, then the buffer is sorted by rank and written to a temporary file as
+a run. The greedy trader walks lots merged from all runs in rank order, bought lots are sorted by
+order the same way, so memory depends on the budget, the amount of runs and distinct bond names
+rather than on amount of lots.
+"""
+import heapq
+import struct
+import sys
+import tempfile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from .mega_trader import Lot, Market, MegaTrader
+
+#: Default memory budget of buffered records in bytes.
+DEFAULT_MEMORY_BUDGET: int = 256 << 20
+#: Ranked lot: negated income, order, day, bond price percent, bonds amount, bond name id, price, overpayment.
+RANKED_RECORD = struct.Struct('=8q')
+#: Bought lot: order, day, bond price percent, bonds amount, bond name id, price, overpayment.
+BOUGHT_RECORD = struct.Struct('=7q')
+#: Smallest amount of records read from a run at once.
+MIN_READ_RECORDS: int = 256
+
+
+class ExternalSorter:
+    """Records sorted in runs written to a temporary file and merged on iteration.
+
+    Records are tuples of integers compared as tuples, so the leading fields are the sort key.
+    Records with values beyond 64-bit integers are rare, they are kept in memory instead of runs.
+    """
+
+    def __init__(self, record: struct.Struct, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 directory: Optional[str] = None) -> None:
+        """Initialize an instance.
+
+        :param record: Format of records.
+        :param memory_budget: Approximate limit of memory taken by buffered records in bytes.
+        :param directory: Directory of the temporary file, the default temporary directory is used if it is not given.
+        """
+        self.record: struct.Struct = record
+        self.memory_budget: int = memory_budget
+        self.directory: Optional[str] = directory
+        fields: int = len(record.unpack(bytes(record.size)))
+        # A buffered record is a tuple of integers referenced from the buffer list.
+        self.capacity: int = max(1, memory_budget // (sys.getsizeof((0,) * fields) + fields * 32 + 8))
+        self.buffer: List[Tuple[int, ...]] = []
+        #: Offsets of runs in the file and amounts of their records.
+        self.runs: List[Tuple[int, int]] = []
+        #: Records not fitting the format of runs.
+        self.oversized: List[Tuple[int, ...]] = []
+        self._file: Optional[BinaryIO] = None
+        self._length: int = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def add(self, record: Tuple[int, ...]) -> None:
+        """Add a record writing the buffer as a run when it is full.
+
+        :param record: Record.
+        """
+        self.buffer.append(record)
+        self._length += 1
+        if len(self.buffer) >= self.capacity:
+            self._spill()
+
+    def _spill(self) -> None:
+        """Sort buffered records and write them as a run."""
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(dir=self.directory)
+        self.buffer.sort()
+        self._file.seek(0, 2)
+        offset: int = self._file.tell()
+        amount: int = 0
+        pack = self.record.pack
+        for first in range(0, len(self.buffer), MIN_READ_RECORDS):
+            records: List[Tuple[int, ...]] = self.buffer[first:first + MIN_READ_RECORDS]
+            try:
+                packed: List[bytes] = [pack(*record) for record in records]
+            except struct.error:
+                packed = []
+                for record in records:
+                    try:
+                        packed.append(pack(*record))
+                    except struct.error:
+                        self.oversized.append(record)
+            self._file.write(b''.join(packed))
+            amount += len(packed)
+        self.runs.append((offset, amount))
+        self.buffer = []
+
+    def _read(self, offset: int, amount: int, block_size: int) -> Iterator[Tuple[int, ...]]:
+        """Read records of a run.
+
+        :param offset: Offset of the run.
+        :param amount: Amount of records of the run.
+        :param block_size: Amount of records read at once.
+        :return: Records in order.
+        """
+        end: int = offset + amount * self.record.size
+        while offset < end:
+            self._file.seek(offset)
+            data: bytes = self._file.read(min(block_size * self.record.size, end - offset))
+            offset += len(data)
+            yield from self.record.iter_unpack(data)
+
+    def __iter__(self) -> Iterator[Tuple[int, ...]]:
+        if not self.runs:
+            self.buffer.sort()
+            return iter(self.buffer)
+
+        if self.buffer:
+            self._spill()
+        self.oversized.sort()
+        # Every run reads a share of the budget at once.
+        block_size: int = max(MIN_READ_RECORDS, self.memory_budget // (self.record.size * len(self.runs)))
+        return heapq.merge(iter(self.oversized),
+                           *(self._read(offset, amount, block_size) for offset, amount in self.runs))
+
+    def close(self) -> None:
+        """Remove the temporary file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.runs = []
+        self.oversized = []
+        self.buffer = []
+        self._length = 0
+
+
+class ExternalMarket(Market):
+    """Market keeping issued lots in sorted runs on disk.
+
+    Lots whose values or incomes do not fit 64-bit integers are kept in memory.
+    """
+
+    def __init__(self, issue_period: int, lots_amount_per_day: int, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 directory: Optional[str] = None) -> None:
+        """Initialize an instance.
+
+        :param issue_period: Period in days when lots can be issued to the market.
+        :param lots_amount_per_day: Amount of lots per day that can be issued.
+        :param memory_budget: Approximate limit of memory taken by buffered lots in bytes.
+        :param directory: Directory of temporary files, the default temporary directory is used if it is not given.
+        """
+        super().__init__(issue_period, lots_amount_per_day)
+        self.memory_budget: int = memory_budget
+        self.directory: Optional[str] = directory
+        self.sorter = ExternalSorter(RANKED_RECORD, memory_budget, directory)
+        self.bond_names: List[str] = []
+        self._bond_name_ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.sorter)
+
+    def add(self, lot: Lot) -> None:
+        """Issue a lot to the market for trading.
+
+        :param lot: Lot for trading.
+        """
+        if not (1 <= lot.day <= self._trading_period):
+            raise self.DayOutOfRange(1, self._trading_period)
+
+        if self._daily_amounts[lot.day] >= self._lots_amount_per_day:
+            raise self.BondsExceeded(self._lots_amount_per_day)
+
+        name_id: Optional[int] = self._bond_name_ids.get(lot.bond_name)
+        if name_id is None:
+            name_id = self._bond_name_ids[lot.bond_name] = len(self.bond_names)
+            self.bond_names.append(lot.bond_name)
+        self._daily_amounts[lot.day] += 1
+        self.sorter.add((-self.evaluate_income(lot), lot.order, lot.day, lot.bond_price_percent, lot.bonds_amount,
+                         name_id, lot.price, lot.bond_overpayment))
+
+    def lot(self, order: int, day: int, bond_price_percent: int, bonds_amount: int, name_id: int, price: int,
+            bond_overpayment: int) -> Lot:
+        """Create a lot instance from fields of a record.
+
+        :param order: Lot order.
+        :param day: Start day when the lot is issued.
+        :param bond_price_percent: Price percent of one bond in tenths.
+        :param bonds_amount: Amount of bonds in the lot.
+        :param name_id: Bond name identifier.
+        :param price: Price of the lot in thousandths.
+        :param bond_overpayment: Overpayment in thousandths.
+        :return: Lot instance.
+        """
+        return Lot(order=order, day=day, price=price, bond_price_percent=bond_price_percent,
+                   bond_name=self.bond_names[name_id], bonds_amount=bonds_amount, bond_overpayment=bond_overpayment)
+
+    def ranked_records(self) -> Iterator[Tuple[int, ...]]:
+        """Rank records of lots by income merging sorted runs, the most profitable go first.
+
+        :return: Ranked records.
+        """
+        return iter(self.sorter)
+
+    def ranked_lots(self) -> Iterator[Lot]:
+        """Rank lots by income merging sorted runs, the most profitable go first.
+
+        Lots with equal income keep the order they were issued in.
+        :return: Ranked lots.
+        """
+        for record in self.sorter:
+            yield self.lot(*record[1:])
+
+
+class ExternalLots:
+    """Bought lots sorted by order on disk, they are read again on every iteration."""
+
+    def __init__(self, market: ExternalMarket) -> None:
+        """Initialize an instance.
+
+        :param market: Market the lots are bought on.
+        """
+        self.market: ExternalMarket = market
+        self.sorter = ExternalSorter(BOUGHT_RECORD, market.memory_budget, market.directory)
+
+    def __len__(self) -> int:
+        return len(self.sorter)
+
+    def __iter__(self) -> Iterator[Lot]:
+        for record in self.sorter:
+            yield self.market.lot(*record)
+
+
+class ExternalMegaTrader(MegaTrader):
+    """Trader buying lots of an external memory market and keeping bought lots on disk."""
+
+    def buy_lots(self, market: Market) -> ExternalLots:
+        """Buy slots on given market.
+
+        :param market: Market where slots should be bought.
+        :return: Slots were bought.
+        """
+        if not isinstance(market, ExternalMarket):
+            return super().buy_lots(market)
+
+        self.lots = ExternalLots(market)
+        balance: int = self.balance
+        add = self.lots.sorter.add
+        records: Iterator[Tuple[int, ...]] = market.ranked_records()
+        for _, order, day, bond_price_percent, bonds_amount, name_id, price, bond_overpayment in records:
+            if balance >= price:
+                balance -= price
+                add((order, day, bond_price_percent, bonds_amount, name_id, price, bond_overpayment))
+        self.balance = balance
+        return self.lots
@@ -0,0 +1,276 @@
+"""Exact lot selection.
+
+Buying lots with maximum income is 0/1 knapsack problem: lot prices are weights, incomes are
+values and the trader's balance is capacity. The solver picks an algorithm depending on
+amount of lots and the balance and falls back to the greedy trader when the problem is too large.
+"""
+from bisect import bisect_right
+from decimal import Decimal
+from fractions import Fraction
+from functools import reduce
+from itertools import accumulate
+from math import floor, gcd
+from operator import attrgetter
+from typing import List, Optional, Sequence, Tuple, Union
+
+from .mega_trader import Lot, Market, MegaTrader, format_money, logger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#: Meet-in-the-middle is used for up to this amount of lots.
+MEET_IN_THE_MIDDLE_MAX_ITEMS: int = 32
+#: Dynamic programming is used while amount of lots multiplied by capacity does not exceed the value.
+DP_MAX_CELLS: int = 10 ** 9 if np is not None else 2 * 10 ** 7
+#: Amount of rows of capacity + 1 values dynamic programming keeps at once: both halves and temporary ones.
+DP_ROWS: int = 4
+#: Size of a value in bytes, values of lists are pointers to integer objects.
+DP_CELL_SIZE: int = 8 if np is not None else 40
+#: Dynamic programming is used while its rows take no more than this amount of bytes.
+DP_MAX_BYTES: int = 256 * 2 ** 20
+#: Branch-and-bound gives up after visiting this amount of nodes.
+BRANCH_AND_BOUND_MAX_NODES: int = 2 * 10 ** 6
+
+
+def _subsets(weights: Sequence[int], values: Sequence[int], capacity: int) -> List[Tuple[int, int, int]]:
+    """Enumerate all subsets of items fitting the capacity.
+
+    :return: List of subsets as tuples of weight, value and bit mask of items.
+    """
+    subsets: List[Tuple[int, int, int]] = [(0, 0, 0)]
+    for index, (weight, value) in enumerate(zip(weights, values)):
+        subsets += [(subset_weight + weight, subset_value + value, mask | 1 << index)
+                    for subset_weight, subset_value, mask in subsets if subset_weight + weight <= capacity]
+    return subsets
+
+
+def _meet_in_the_middle(weights: Sequence[int], values: Sequence[int], capacity: int) -> List[int]:
+    """Solve the problem combining all subsets of two halves of items.
+
+    :return: Indices of chosen items.
+    """
+    half: int = len(weights) // 2
+    left: List[Tuple[int, int, int]] = _subsets(weights[:half], values[:half], capacity)
+    right: List[Tuple[int, int, int]] = sorted(_subsets(weights[half:], values[half:], capacity))
+
+    # Keep only subsets of the right half that are more valuable than every lighter one.
+    frontier_weights: List[int] = []
+    frontier: List[Tuple[int, int]] = []
+    for weight, value, mask in right:
+        if not frontier or value > frontier[-1][0]:
+            frontier_weights.append(weight)
+            frontier.append((value, mask))
+
+    best: Tuple[int, int, int] = (0, 0, 0)
+    for weight, value, mask in left:
+        position: int = bisect_right(frontier_weights, capacity - weight) - 1
+        if value + frontier[position][0] > best[0]:
+            best = (value + frontier[position][0], mask, frontier[position][1])
+
+    _, left_mask, right_mask = best
+    return [index for index in range(half) if left_mask >> index & 1] + \
+           [half + index for index in range(len(weights) - half) if right_mask >> index & 1]
+
+
+def _dp_values(weights: Sequence[int], values: Sequence[int], capacity: int) -> Sequence[int]:
+    """Calculate the best value for every capacity from 0 to given one.
+
+    :return: Best values indexed by capacity.
+    """
+    if np is not None:
+        best_values = np.zeros(capacity + 1, dtype=np.int64)
+        for weight, value in zip(weights, values):
+            if weight <= capacity:
+                np.maximum(best_values[weight:], best_values[:capacity + 1 - weight] + value,
+                           out=best_values[weight:])
+        return best_values
+
+    best_values = [0] * (capacity + 1)
+    for weight, value in zip(weights, values):
+        best_values[weight:] = [max(without, with_item + value)
+                                for without, with_item in zip(best_values[weight:], best_values)]
+    return best_values
+
+
+def _dynamic_programming(weights: Sequence[int], values: Sequence[int], capacity: int) -> List[int]:
+    """Solve the problem with dynamic programming over capacity.
+
+    Only one row of the table is kept. Chosen items are reconstructed by splitting items into halves,
+    finding how the capacity is shared between them and solving both halves recursively.
+    :return: Indices of chosen items.
+    """
+    if len(weights) <= MEET_IN_THE_MIDDLE_MAX_ITEMS // 2:
+        return _meet_in_the_middle(weights, values, capacity)
+
+    half: int = len(weights) // 2
+    left: Sequence[int] = _dp_values(weights[:half], values[:half], capacity)
+    right: Sequence[int] = _dp_values(weights[half:], values[half:], capacity)
+    if np is not None:
+        left_capacity: int = int(np.argmax(left + right[::-1]))
+    else:
+        left_capacity = max(range(capacity + 1), key=lambda part: left[part] + right[capacity - part])
+    return _dynamic_programming(weights[:half], values[:half], left_capacity) + \
+        [half + index for index in _dynamic_programming(weights[half:], values[half:], capacity - left_capacity)]
+
+
+def _fractional_bound(weights: Sequence[int], values: Sequence[int], capacity: int) -> int:
+    """Evaluate upper bound of the value as if items could be taken partially.
+
+    :param weights: Weights sorted by value density in descending order.
+    :param values: Values in the same order.
+    :param capacity: Capacity.
+    :return: Upper bound.
+    """
+    bound: int = 0
+    for weight, value in zip(weights, values):
+        if weight > capacity:
+            return bound + capacity * value // weight
+        capacity -= weight
+        bound += value
+    return bound
+
+
+def _branch_and_bound(weights: Sequence[int], values: Sequence[int], capacity: int) -> Optional[List[int]]:
+    """Solve the problem with depth-first branch-and-bound.
+
+    Items are explored in order of value density and branches are cut using fractional bound.
+    :return: Indices of chosen items or None if the search has exceeded the nodes limit.
+    """
+    order: List[int] = sorted(range(len(weights)), key=lambda index: Fraction(values[index], weights[index]),
+                              reverse=True)
+    weights = [weights[index] for index in order]
+    values = [values[index] for index in order]
+    weight_sums: List[int] = list(accumulate(weights, initial=0))
+    value_sums: List[int] = list(accumulate(values, initial=0))
+
+    best_value: int = 0
+    best_chain: Optional[tuple] = None
+    stack: List[Tuple[int, int, int, Optional[tuple]]] = [(0, capacity, 0, None)]
+    for _ in range(BRANCH_AND_BOUND_MAX_NODES):
+        if not stack:
+            break
+
+        position, free, value, chain = stack.pop()
+        if value > best_value:
+            best_value, best_chain = value, chain
+        if position == len(weights):
+            continue
+
+        # All items fitting the capacity are taken in full, the next one is taken partially.
+        last: int = bisect_right(weight_sums, weight_sums[position] + free, lo=position) - 1
+        bound: int = value + value_sums[last] - value_sums[position]
+        if last < len(weights):
+            bound += (free - weight_sums[last] + weight_sums[position]) * values[last] // weights[last]
+        if bound <= best_value:
+            continue
+
+        stack.append((position + 1, free, value, chain))
+        if weights[position] <= free:
+            stack.append((position + 1, free - weights[position], value + values[position], (position, chain)))
+    else:
+        if stack:
+            return None
+
+    chosen: List[int] = []
+    while best_chain is not None:
+        position, best_chain = best_chain
+        chosen.append(order[position])
+    return chosen
+
+
+def _scale_to_integers(numbers: Sequence[Union[int, Decimal]], limit: int) -> Tuple[List[int], int]:
+    """Multiply numbers and a limit by the common denominator of the numbers.
+
+    :param numbers: Integer or decimal numbers.
+    :param limit: Limit, it is rounded down after multiplication.
+    :return: Integer numbers and the limit.
+    """
+    fractions: List[Fraction] = [Fraction(number) for number in numbers]
+    denominator: int = reduce(lambda left, right: left * right // gcd(left, right),
+                              (fraction.denominator for fraction in fractions), 1)
+    return [int(fraction * denominator) for fraction in fractions], floor(limit * denominator)
+
+
+def solve(weights: Sequence[Union[int, Decimal]], values: Sequence[Union[int, Decimal]],
+          capacity: int) -> Optional[List[int]]:
+    """Solve 0/1 knapsack problem.
+
+    Decimal weights and values are scaled to integers, it does not change the choice.
+    :param weights: Positive weights of items.
+    :param values: Values of items.
+    :param capacity: Capacity.
+    :return: Indices of chosen items or None if the problem is too large to be solved exactly.
+    """
+    if any(type(number) is not int for number in weights) or any(type(number) is not int for number in values):
+        weights, capacity = _scale_to_integers(weights, capacity)
+        values, _ = _scale_to_integers(values, 0)
+
+    # Items which do not fit or do not increase the value are never chosen.
+    candidates: List[int] = [index for index, (weight, value) in enumerate(zip(weights, values))
+                             if weight <= capacity and value > 0]
+    weights = [weights[index] for index in candidates]
+    values = [values[index] for index in candidates]
+    if sum(weights) <= capacity:
+        return candidates
+
+    divisor: int = reduce(gcd, weights)
+    weights = [weight // divisor for weight in weights]
+    capacity //= divisor
+
+    if len(weights) <= MEET_IN_THE_MIDDLE_MAX_ITEMS:
+        chosen: Optional[List[int]] = _meet_in_the_middle(weights, values, capacity)
+    elif len(weights) * (capacity + 1) <= DP_MAX_CELLS and DP_ROWS * DP_CELL_SIZE * (capacity + 1) <= DP_MAX_BYTES:
+        chosen = _dynamic_programming(weights, values, capacity)
+    else:
+        chosen = _branch_and_bound(weights, values, capacity)
+
+    if chosen is None:
+        return None
+    return sorted(candidates[index] for index in chosen)
+
+
+class ExactMegaTrader(MegaTrader):
+    """Trader buying lots with the maximum possible income."""
+
+    def buy_lots(self, market: Market) -> List[Lot]:
+        """Buy slots on given market.
+
+        If the problem is too large to be solved exactly slots are bought greedily.
+        :param market: Market where slots should be bought.
+        :return: Slots were bought.
+        """
+        lots: List[Lot] = sorted(market.ranked_lots(), key=attrgetter('order'))
+        weights: List[int] = [lot.price for lot in lots]
+        values: List[int] = [market.evaluate_income(lot) for lot in lots]
+
+        chosen: Optional[List[int]] = solve(weights, values, self.balance)
+        if chosen is None:
+            capacity: int = self.balance
+            greedy_lots: List[Lot] = super().buy_lots(market)
+            self._log_quality_bound(sum(market.evaluate_income(lot) for lot in greedy_lots), weights, values, capacity)
+            return greedy_lots
+
+        for index in chosen:
+            self.balance -= lots[index].price
+            self.lots.append(lots[index])
+
+        return self.lots
+
+    @staticmethod
+    def _log_quality_bound(income: int, weights: Sequence[int], values: Sequence[int], capacity: int) -> None:
+        """Log how far the greedy income can be from the optimal one.
+
+        :param income: Income of greedily bought lots.
+        :param weights: Prices of lots.
+        :param values: Incomes of lots.
+        :param capacity: Balance.
+        """
+        items: List[Tuple[int, int]] = sorted(
+            ((weight, value) for weight, value in zip(weights, values) if value > 0 and weight <= capacity),
+            key=lambda item: Fraction(item[1]) / Fraction(item[0]), reverse=True)
+        bound: int = _fractional_bound([weight for weight, _ in items], [value for _, value in items], capacity)
+        logger.warning(f'Too many lots to find the maximum income exactly, lots are bought greedily. '
+                       f'Income {format_money(income)} is no less than the maximum minus '
+                       f'{format_money(bound - income)} (upper bound {format_money(bound)})')
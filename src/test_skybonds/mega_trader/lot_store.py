@@ -0,0 +1,140 @@
+"""Compact lot storage.
+
+Lots are kept in parallel typed columns instead of separate objects, bond names are
+interned into integer identifiers. Lot objects are created only on demand.
+"""
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+from .mega_trader import Lot
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#: NumPy types matching typecodes of columns.
+DTYPES: Dict[str, str] = {'i': 'int32', 'q': 'int64'}
+#: The least and the greatest values of columns by typecodes.
+LIMITS: Dict[str, range] = {'i': range(-1 << 31, 1 << 31), 'q': range(-1 << 63, 1 << 63)}
+
+
+def fits(column: array, value: int) -> bool:
+    """Check whether a value can be stored in a column.
+
+    :param column: Column.
+    :param value: Value.
+    :return: Whether the value is an integer in the range of the column type.
+    """
+    return type(value) is int and value in LIMITS[column.typecode]
+
+
+def int64_values(values: Sequence[int]) -> Optional['np.ndarray']:
+    """Convert values into a NumPy array of 64-bit integers if all of them fit.
+
+    :param values: Values, 64-bit integer buffers are not copied.
+    :return: Array or None if some value is not a 64-bit integer.
+    """
+    if isinstance(values, np.ndarray) and values.dtype == np.int64 \
+            or isinstance(values, array) and values.typecode == 'q' \
+            or isinstance(values, memoryview) and values.format == 'q':
+        return np.asarray(values)
+    if all(type(value) is int and value in LIMITS['q'] for value in values):
+        return np.array(values, dtype=np.int64)
+    return None
+
+
+def _extend(column: array, values: Sequence[int]) -> None:
+    """Append values to a column.
+
+    :param column: Column.
+    :param values: Values, copied at once if NumPy is installed.
+    """
+    if np is not None:
+        column.frombytes(np.asarray(values, dtype=DTYPES[column.typecode]).tobytes())
+    else:
+        column.extend(values)
+
+
+class LotStore:
+    """Lots kept in parallel columns."""
+
+    def __init__(self) -> None:
+        """Initialize an instance."""
+        super().__init__()
+        self.orders: array = array('q')
+        self.days: array = array('i')
+        #: Price percents of one bond in tenths.
+        self.bond_price_percents: array = array('q')
+        self.bonds_amounts: array = array('q')
+        self.bond_name_ids: array = array('i')
+        self._bond_names: List[str] = []
+        self._bond_name_ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def intern(self, bond_name: str) -> int:
+        """Get identifier of a bond name adding it to the symbol table if needed.
+
+        :param bond_name: Bond name.
+        :return: Identifier.
+        """
+        bond_name_id: int = self._bond_name_ids.setdefault(bond_name, len(self._bond_name_ids))
+        if bond_name_id == len(self._bond_names):
+            self._bond_names.append(bond_name)
+        return bond_name_id
+
+    def append(self, lot: Lot) -> None:
+        """Store a lot.
+
+        :param lot: Lot.
+        :raise OverflowError: If some value of the lot does not fit its column, nothing is stored then.
+        """
+        columns: List[array] = [self.orders, self.days, self.bond_price_percents, self.bonds_amounts]
+        values: List[int] = [lot.order, lot.day, lot.bond_price_percent, lot.bonds_amount]
+        if not all(map(fits, columns, values)):
+            raise OverflowError('Values of the lot do not fit columns of the store')
+
+        for column, value in zip(columns, values):
+            column.append(value)
+        self.bond_name_ids.append(self.intern(lot.bond_name))
+
+    def extend(self, orders: Sequence[int], days: Sequence[int], bond_price_percents: Sequence[int],
+               bonds_amounts: Sequence[int], bond_names: Sequence[str]) -> None:
+        """Store lots given column-wise.
+
+        Values should fit columns, e.g. be converted by int64_values() first.
+        :param orders: Orders of lots.
+        :param days: Start days when lots are issued to the market.
+        :param bond_price_percents: Price percents of one bond in tenths.
+        :param bonds_amounts: Amounts of bonds in lots.
+        :param bond_names: Bond names.
+        """
+        _extend(self.orders, orders)
+        _extend(self.days, days)
+        _extend(self.bond_price_percents, bond_price_percents)
+        _extend(self.bonds_amounts, bonds_amounts)
+        _extend(self.bond_name_ids, [self.intern(bond_name) for bond_name in bond_names])
+
+    def lot(self, index: int, bond_rating: int) -> Lot:
+        """Create lot instance for a stored lot.
+
+        :param index: Index of the lot.
+        :param bond_rating: Bond rating.
+        :return: Lot instance.
+        """
+        return Lot.create(day=self.days[index], bond_price_percent=self.bond_price_percents[index],
+                          bond_name=self._bond_names[self.bond_name_ids[index]],
+                          bonds_amount=self.bonds_amounts[index], bond_rating=bond_rating,
+                          order=self.orders[index])
+
+    def column(self, name: str) -> 'np.ndarray':
+        """Get a column as NumPy array sharing memory with the store.
+
+        The array is valid until the store is changed.
+        :param name: Column name, e.g. "days".
+        :return: Array of 64-bit integers.
+        """
+        column: array = getattr(self, name)
+        return np.frombuffer(column, dtype=DTYPES[column.typecode]).astype(np.int64, copy=False)
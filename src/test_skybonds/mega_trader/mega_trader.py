@@ -1,18 +1,46 @@
 #!/usr/bin/env python3
 """The program calculates maximum income for given lots within trade period."""
-import logging
+from __future__ import annotations
+
+import heapq
 import sys
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
-from dataclasses import dataclass
-from decimal import Decimal, DecimalException, ROUND_HALF_EVEN
+from contextlib import nullcontext
+from itertools import chain, islice
 from operator import attrgetter
-from typing import Tuple, Optional, List, Dict, TextIO
 
-logger = logging.Logger(__name__, level=logging.INFO)
-logger.addHandler(logging.StreamHandler())
+try:
+    from ..instrumentation import MODES, Instrumentation, measure
+    from ..logs import lazy_logger
+    from ..output import BulkWriter
+except ImportError:
+    # The program is started as a script, so the package is imported from the source folder.
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+    from test_skybonds.instrumentation import MODES, Instrumentation, measure
+    from test_skybonds.logs import lazy_logger
+    from test_skybonds.output import BulkWriter
+
+# Modules which are used for annotations only are not imported to start faster.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import argparse
+    import logging
+    from decimal import Decimal
+    from typing import Tuple, Optional, List, Dict, TextIO, Iterable, Iterator, Sequence, Union
+
+get_logger, __getattr__ = lazy_logger(globals())
+logger: logging.Logger
+
+#: Money is kept in integer thousandths of a currency unit.
+MONEY_SCALE: int = 1000
+#: Price percents are kept in tenths of a percent.
+PERCENT_DECIMALS: int = 1
+PERCENT_SCALE: int = 10 ** PERCENT_DECIMALS
 
 
-@dataclass
 class Lot:
     """Trading lot."""
     __slots__ = ['order', 'day', 'price', 'bond_price_percent', 'bond_name', 'bonds_amount', 'bond_overpayment']
@@ -22,37 +50,76 @@ class Lot:
 
     #: Start day when lot is issued to the market.
     day: int
-    #: Price of a lot.
-    price: Decimal
-    bond_price_percent: Decimal
+    #: Price of a lot in thousandths, decimal only if it is fractional.
+    price: Union[int, Decimal]
+    #: Price percent of one bond in tenths, decimal if it is given with other precision.
+    bond_price_percent: Union[int, Decimal]
     bond_name: str
     bonds_amount: int
-    #: Overpayment considering the price percent.
-    bond_overpayment: Decimal
+    #: Overpayment considering the price percent in thousandths.
+    bond_overpayment: Union[int, Decimal]
+
+    def __init__(self, order: int, day: int, price: Union[int, Decimal], bond_price_percent: Union[int, Decimal],
+                 bond_name: str, bonds_amount: int, bond_overpayment: Union[int, Decimal]) -> None:
+        self.order = order
+        self.day = day
+        self.price = price
+        self.bond_price_percent = bond_price_percent
+        self.bond_name = bond_name
+        self.bonds_amount = bonds_amount
+        self.bond_overpayment = bond_overpayment
+
+    def __repr__(self) -> str:
+        return f'{type(self).__qualname__}({", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)})'
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return attrgetter(*self.__slots__)(self) == attrgetter(*self.__slots__)(other)
 
     @classmethod
-    def create(cls, day: int, bond_price_percent: Decimal, bond_name: str,
-               bonds_amount: int, bond_rating: int) -> 'Lot':
+    def create(cls, day: int, bond_price_percent: Union[int, Decimal], bond_name: str,
+               bonds_amount: int, bond_rating: int, order: Optional[int] = None) -> 'Lot':
         """Create lot instance.
 
         This is factory method. It is better to use it instead explicit creation.
 
         :param day: Start day when lot is issued to the market.
-        :param bond_price_percent: Price percent of one bond.
+        :param bond_price_percent: Price percent of one bond in tenths.
         :param bond_name: Bond name.
         :param bonds_amount: Amount of bonds in the lot.
         :param bond_rating: Bond rating.
+        :param order: Order of a lot created before, a new one is assigned if it is not given.
         :return: Created lot instance.
         """
-        bond_price: Decimal = bond_price_percent / 100 * bond_rating
-        lot_price: Decimal = bonds_amount * bond_price
-        bond_overpayment: Decimal = bond_price_percent * bond_rating / 100 - bond_rating
+        # Scales are chosen so that the division is exact for any integer rating and percent in integer tenths.
+        if type(bond_price_percent) is int:
+            bond_price: Union[int, Decimal] = bond_price_percent * bond_rating * MONEY_SCALE // (100 * PERCENT_SCALE)
+        else:
+            bond_price = bond_price_percent * bond_rating * MONEY_SCALE / (100 * PERCENT_SCALE)
+            if bond_price == bond_price.to_integral_value():
+                bond_price = int(bond_price)
+        lot_price: Union[int, Decimal] = bonds_amount * bond_price
+        bond_overpayment: Union[int, Decimal] = bond_price - bond_rating * MONEY_SCALE
 
-        cls._order_counter += 1
+        if order is None:
+            cls._order_counter += 1
+            order = cls._order_counter
 
-        return Lot(order=cls._order_counter, day=day, price=lot_price, bond_price_percent=bond_price_percent,
+        return Lot(order=order, day=day, price=lot_price, bond_price_percent=bond_price_percent,
                    bond_name=bond_name, bonds_amount=bonds_amount, bond_overpayment=bond_overpayment)
 
+    @classmethod
+    def reserve_orders(cls, amount: int) -> range:
+        """Reserve orders for lots which are stored without creating instances.
+
+        :param amount: Amount of orders.
+        :return: Reserved orders.
+        """
+        first: int = cls._order_counter + 1
+        cls._order_counter += amount
+        return range(first, first + amount)
+
 
 class MegaTrader:
     """Trader.
@@ -60,13 +127,13 @@ class MegaTrader:
     The class represents a trader that can buy lots on a market.
     """
 
-    def __init__(self, balance: Decimal) -> None:
+    def __init__(self, balance: int) -> None:
         """Initialize an instance.
 
-        :param balance: Start balance of a trader.
+        :param balance: Start balance of a trader in thousandths.
         """
         super().__init__()
-        self.balance: Decimal = balance
+        self.balance = balance
         self.lots: List[Lot] = []
 
     def buy_lots(self, market: 'Market') -> List[Lot]:
@@ -75,8 +142,7 @@ class MegaTrader:
         :param market: Market where slots should be bought.
         :return: Slots were bought.
         """
-        lots: List[Lot] = sorted(market.lots, key=market.evaluate_income, reverse=True)
-        for lot in lots:
+        for lot in market.ranked_lots():
             if self.balance >= lot.price:
                 self.balance -= lot.price
                 self.lots.append(lot)
@@ -112,10 +178,11 @@ class Market:
         :param issue_period: Period in days when lots can be issued to the market.
         :param lots_amount_per_day: Amount of lots per day that can be issued.
         """
-        self._trading_period: int = issue_period
+        self._trading_period = issue_period
         self._total_trading_period: int = self._trading_period + self.BOND_REPAYMENT_PERIOD
-        self._lots_amount_per_day: int = lots_amount_per_day
-        self._daily_lots: Dict[int, list] = defaultdict(list)
+        self._lots_amount_per_day = lots_amount_per_day
+        #: Amount of lots indexed by day.
+        self._daily_amounts: array = array('q', [0]) * (issue_period + 1)
         self.lots: List[Lot] = []
 
     def add(self, lot: Lot) -> None:
@@ -126,41 +193,228 @@ class Market:
         if not (1 <= lot.day <= self._trading_period):
             raise self.DayOutOfRange(1, self._trading_period)
 
-        if len(self._daily_lots[lot.day]) >= self._lots_amount_per_day:
+        if self._daily_amounts[lot.day] >= self._lots_amount_per_day:
             raise self.BondsExceeded(self._lots_amount_per_day)
 
-        self._daily_lots[lot.day].append(lot)
+        self._daily_amounts[lot.day] += 1
         self.lots.append(lot)
 
-    def evaluate_income(self, lot: Lot) -> Decimal:
+    def evaluate_income(self, lot: Lot) -> int:
         """Evaluate income of given on the end of trading period.
 
         :param lot: Lot to evaluate.
-        :return: Income.
+        :return: Income in thousandths.
         """
         lot_trading_days: int = self._total_trading_period - lot.day
-        bond_income: int = self.BOND_DAILY_INCOME * lot_trading_days
+        bond_income: int = self.BOND_DAILY_INCOME * lot_trading_days * MONEY_SCALE
         return (bond_income - lot.bond_overpayment) * lot.bonds_amount
 
+    def extend(self, days: Sequence[int], bond_price_percents: Sequence[int], bonds_amounts: Sequence[int],
+               bond_names: Sequence[str], orders: Optional[Sequence[int]] = None
+               ) -> List[Tuple[int, 'Market.InapplicableSlot']]:
+        """Issue lots given column-wise to the market.
+
+        :param days: Start days when lots are issued to the market.
+        :param bond_price_percents: Price percents of one bond in tenths.
+        :param bonds_amounts: Amounts of bonds in lots.
+        :param bond_names: Bond names.
+        :param orders: Orders of lots, new ones are assigned if they are not given.
+        :return: Positions of lots the market has not accepted with the reasons.
+        """
+        rejected: List[Tuple[int, Market.InapplicableSlot]] = []
+        for position, (day, bond_price_percent, bonds_amount, bond_name) in enumerate(
+                zip(days, bond_price_percents, bonds_amounts, bond_names)):
+            try:
+                self.add(Lot.create(day=day, bond_name=bond_name, bond_price_percent=bond_price_percent,
+                                    bonds_amount=bonds_amount, bond_rating=self.BOND_RATING,
+                                    order=None if orders is None else orders[position]))
+            except self.InapplicableSlot as exc:
+                rejected.append((position, exc))
+
+        return rejected
+
+    def ranked_lots(self) -> Iterable[Lot]:
+        """Rank lots by income, the most profitable go first.
+
+        Lots with equal income keep the order they were issued in.
+        :return: Ranked lots.
+        """
+        return sorted(self.lots, key=self.evaluate_income, reverse=True)
+
+    def day_index(self) -> 'DayIndex':
+        """Index lots by the day they are issued.
+
+        The index is not updated by lots issued later.
+        :return: Index of ranked lots.
+        """
+        return DayIndex(self)
+
+
+class DayIndex:
+    """Ranked lots of a market indexed by the day they are issued.
+
+    Every day keeps positions of its lots in the ranking in ascending order, so merging positions
+    of a range of days gives lots of the range ranked the same way the whole market ranks them.
+    """
+
+    def __init__(self, market: Market) -> None:
+        """Initialize an instance.
+
+        :param market: Market with issued lots.
+        """
+        self.lots: List[Lot] = list(market.ranked_lots())
+        self.incomes: List[int] = [market.evaluate_income(lot) for lot in self.lots]
+        daily_positions: Dict[int, array] = defaultdict(lambda: array('q'))
+        for position, lot in enumerate(self.lots):
+            daily_positions[lot.day].append(position)
+
+        #: Days with issued lots in ascending order.
+        self.days: List[int] = sorted(daily_positions)
+        #: Positions of lots in the ranking for every day of days.
+        self.positions: List[array] = [daily_positions[day] for day in self.days]
+        #: Total incomes of lots issued before every day of days and of all lots at the end.
+        self.income_sums: List[int] = [0]
+        for positions in self.positions:
+            self.income_sums.append(self.income_sums[-1] + sum(self.incomes[position] for position in positions))
+
+    def ranked_positions(self, first_day: int, last_day: int) -> Iterator[int]:
+        """Merge positions of lots issued within a range of days.
+
+        :param first_day: First day of the range.
+        :param last_day: Last day of the range.
+        :return: Positions of lots in the ranking in ascending order.
+        """
+        start: int = bisect_left(self.days, first_day)
+        end: int = bisect_right(self.days, last_day)
+        return heapq.merge(*self.positions[start:end])
+
+    def best_lots(self, first_day: int, last_day: int, amount: int) -> List[Lot]:
+        """Get the most profitable lots issued within a range of days.
+
+        :param first_day: First day of the range.
+        :param last_day: Last day of the range.
+        :param amount: Amount of lots.
+        :return: Ranked lots.
+        """
+        return [self.lots[position] for position in islice(self.ranked_positions(first_day, last_day), amount)]
+
+    def income_until(self, day: int, balance: Optional[int] = None) -> int:
+        """Evaluate income of lots issued no later than given day.
 
-def read_initial_data(stream: TextIO) -> Tuple:
+        :param day: Last day when lots are bought.
+        :param balance: Balance in thousandths, lots are bought the way the greedy trader does if it is given.
+        :return: Income in thousandths of all lots or of bought ones.
+        """
+        if balance is None:
+            return self.income_sums[bisect_right(self.days, day)]
+
+        income: int = 0
+        for position in self.ranked_positions(1, day):
+            lot: Lot = self.lots[position]
+            if balance >= lot.price:
+                balance -= lot.price
+                income += self.incomes[position]
+        return income
+
+
+class InitialDataDeserializeError(Exception):
+    """Error happens if initial data has incorrect format."""
+    ...
+
+
+def deserialize_initial_data(data: str) -> Tuple[int, int, int]:
+    """Deserialize initial data.
+
+    Lot prices are whole thousandths, so the balance is rounded down to thousandths.
+    :param data: String to deserialize.
+    :return: Issue period in days, amount of lots per day and balance in thousandths.
+    """
+    from decimal import Decimal, DecimalException, ROUND_FLOOR
+
+    try:
+        days, lots_per_day, balance = data.split(' ')
+        days: int = int(days)
+        lots_per_day: int = int(lots_per_day)
+        balance: int = int((Decimal(balance) * MONEY_SCALE).to_integral_value(rounding=ROUND_FLOOR))
+    except (TypeError, ValueError, OverflowError, DecimalException):
+        raise InitialDataDeserializeError('Incorrect input. Should be of 3 values, e.g. "2 2 8000"')
+
+    return days, lots_per_day, balance
+
+
+def read_initial_data(stream: TextIO) -> Tuple[int, int, int]:
     """Read initial data.
 
     :param stream: Stream to read data from.
+    :raise EOFError: If the stream ends before initial data.
     """
     while True:
-        value: str = stream.readline()
+        line: str = stream.readline()
+        if not line:
+            raise EOFError('Unexpected end of input. Initial data should be given, e.g. "2 2 8000"')
         try:
-            days, lots_per_day, balance = value.split(' ')
-            days: int = int(days)
-            lots_per_day: int = int(lots_per_day)
-            balance: Decimal = Decimal(balance)
-        except (TypeError, ValueError, DecimalException):
-            logger.error('Incorrect input. Should be of 3 values, e.g. "2 2 8000"')
-        else:
-            break
+            return deserialize_initial_data(line)
+        except InitialDataDeserializeError as exc:
+            get_logger().error(str(exc))
+
+
+def format_money(value: int) -> Decimal:
+    """Convert money in thousandths into whole currency units.
+
+    :param value: Money in thousandths.
+    :return: Money rounded half to even.
+    """
+    from decimal import Decimal, ROUND_HALF_EVEN
+
+    return (Decimal(value) / MONEY_SCALE).quantize(Decimal('1'), rounding=ROUND_HALF_EVEN)
 
-    return days, lots_per_day, balance
+
+def shift_decimal(value: Decimal, places: int) -> Decimal:
+    """Multiply a decimal by a power of ten exactly keeping its digits.
+
+    :param value: Decimal.
+    :param places: Power of ten.
+    :return: Shifted decimal.
+    """
+    from decimal import Decimal
+
+    sign, digits, exponent = value.as_tuple()
+    return Decimal((sign, digits, exponent + places))
+
+
+def parse_percent(value: str) -> Union[int, Decimal]:
+    """Parse price percent.
+
+    Percents with one decimal are kept as integer tenths. Other ones are kept as decimal tenths with
+    the digits they are given with, so they are formatted back the same way.
+    :param value: String to parse.
+    :return: Price percent in tenths.
+    :raise ValueError: If the value is not a non-negative finite decimal with integral part within decimal precision.
+    """
+    integral, point, fractional = value.partition('.')
+    if point and len(fractional) == 1 and integral.isdecimal() and fractional.isdecimal():
+        return int(integral) * PERCENT_SCALE + int(fractional)
+
+    from decimal import Decimal, DecimalException, getcontext
+
+    try:
+        percent: Decimal = Decimal(value)
+    except DecimalException:
+        raise ValueError(f'Incorrect price percent {value!r}')
+    if not percent.is_finite() or percent.is_signed() or percent.adjusted() >= getcontext().prec:
+        raise ValueError(f'Incorrect price percent {value!r}')
+    return shift_decimal(percent, PERCENT_DECIMALS)
+
+
+def format_percent(value: Union[int, Decimal]) -> str:
+    """Format price percent in tenths the way it is given.
+
+    :param value: Price percent in tenths.
+    :return: String representation.
+    """
+    if type(value) is int:
+        return '{}.{}'.format(*divmod(value, PERCENT_SCALE))
+    return str(shift_decimal(value, -PERCENT_DECIMALS))
 
 
 def serialize_lot(lot: Lot) -> str:
@@ -170,7 +424,7 @@ def serialize_lot(lot: Lot) -> str:
     :return: String representation.
     """
     return ' '.join((str(lot.day), lot.bond_name,
-                     str(lot.bond_price_percent),
+                     format_percent(lot.bond_price_percent),
                      str(lot.bonds_amount)))
 
 
@@ -179,20 +433,30 @@ class SlotDeserializeError(Exception):
     ...
 
 
-def deserialize_lot(data: str) -> Lot:
-    """Deserialize input data into a lot instance.
+def split_lot(data: str) -> Tuple[int, str, Union[int, Decimal], int]:
+    """Split input data into lot fields.
 
-    :param data: String to deserialize.
-    :return: Lot instance.
+    :param data: String to split.
+    :return: Day, bond name, bond price percent in tenths and bonds amount.
     """
     try:
         day, bond_name, bond_price_percent, bonds_amount = data.split(' ')
         day: int = int(day)
-        bond_price_percent: Decimal = Decimal(bond_price_percent)
+        bond_price_percent: Union[int, Decimal] = parse_percent(bond_price_percent)
         bonds_amount: int = int(bonds_amount)
-    except (TypeError, ValueError, DecimalException):
+    except (TypeError, ValueError):
         raise SlotDeserializeError('Incorrect input. Should be of 4 values, e.g. "1 alfa-05 100.2 2"')
 
+    return day, bond_name, bond_price_percent, bonds_amount
+
+
+def deserialize_lot(data: str) -> Lot:
+    """Deserialize input data into a lot instance.
+
+    :param data: String to deserialize.
+    :return: Lot instance.
+    """
+    day, bond_name, bond_price_percent, bonds_amount = split_lot(data)
     return Lot.create(day=day, bond_name=bond_name, bond_price_percent=bond_price_percent, bonds_amount=bonds_amount,
                       bond_rating=Market.BOND_RATING)
 
@@ -213,40 +477,210 @@ def read_lot(stream: TextIO) -> Optional[Lot]:
         try:
             return deserialize_lot(value)
         except SlotDeserializeError as exc:
-            logger.error(str(exc))
+            get_logger().error(str(exc))
 
     return None
 
 
-def main() -> None:
-    """Execute main program flow.
+def issue_lots(market: Market, stream: TextIO) -> None:
+    """Read lots from given stream and issue them to the market.
 
-    The function consumes standard input, performs calculation and produces
-    results into standard output.
+    Lots the market does not accept are skipped.
+    :param market: Market to issue lots to.
+    :param stream: Input stream.
     """
-    days, lots_per_day, balance = read_initial_data(sys.stdin)
-    market: Market = Market(days, lots_per_day)
-    trader: MegaTrader = MegaTrader(balance)
     while True:
-        lot = read_lot(sys.stdin)
+        lot = read_lot(stream)
         if lot is None:
             break
 
         try:
             market.add(lot)
-        except Market.InapplicableSlot as exc:
-            logger.error(str(exc))
+        except market.InapplicableSlot as exc:
+            get_logger().error(str(exc))
+
 
-    trader.buy_lots(market)
-    income: Decimal = sum(market.evaluate_income(lot) for lot in trader.lots)
-    income = income.quantize(Decimal('1'), rounding=ROUND_HALF_EVEN)
-    print(income)
-    for lot in trader.lots:
-        print(serialize_lot(lot))
+def parse_arguments(argv: Sequence[str]) -> argparse.Namespace:
+    """Parse command line arguments.
+
+    :param argv: Command line arguments without the program name.
+    :return: Parsed arguments.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--columnar', action='store_true',
+                        help='keep lots in NumPy columns and rank them in one vectorized pass')
+    parser.add_argument('--bulk', action='store_true',
+                        help='read the whole input at once and parse it column-wise')
+    parser.add_argument('--solver', choices=['greedy', 'exact'], default='greedy',
+                        help='buy the most profitable lots first or find the maximum income exactly')
+    parser.add_argument('--streaming', action='store_true',
+                        help='keep only lots which still can be bought while reading input')
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help='parse and rank lots in N worker processes, the whole input is read at once')
+    parser.add_argument('--aggregate-errors', action='store_true',
+                        help='read the whole input at once and log counts of errors with sample line numbers '
+                             'instead of every invalid line')
+    parser.add_argument('--cache', metavar='DIR',
+                        help='keep parsed lots in DIR and load them instead of parsing the same input again')
+    parser.add_argument('--cache-size', type=int, metavar='BYTES', default=1 << 30,
+                        help='remove the least recently used cache files beyond this total size')
+    parser.add_argument('--memory-budget', type=int, metavar='BYTES',
+                        help='keep lots in sorted runs on disk buffering no more than about BYTES in memory')
+    parser.add_argument('--spill-dir', metavar='DIR',
+                        help='directory of temporary files of --memory-budget, the system one by default')
+    parser.add_argument('--input-format', choices=['text', 'binary'], default='text',
+                        help='read text lines or binary columns made by "python -m test_skybonds.binary", '
+                             'binary input is memory-mapped if it is a file')
+    parser.add_argument('--instrument', nargs='?', choices=MODES, const='memory',
+                        help='write time, amounts of items and peak memory of every stage to standard error as JSON, '
+                             'the time mode does not trace memory')
+    arguments: argparse.Namespace = parser.parse_args(argv)
+    if arguments.streaming and (arguments.columnar or arguments.solver != 'greedy'):
+        parser.error('--streaming can be used only with the default market and the greedy solver')
+    if arguments.workers is not None and (arguments.columnar or arguments.streaming or arguments.workers < 1):
+        parser.error('--workers should be positive and can not be used with --columnar or --streaming')
+    if arguments.cache is not None and (arguments.columnar or arguments.streaming or arguments.workers is not None):
+        parser.error('--cache can not be used with --columnar, --streaming or --workers')
+    if arguments.memory_budget is not None and (
+            arguments.columnar or arguments.streaming or arguments.workers is not None or arguments.cache is not None
+            or arguments.solver != 'greedy' or arguments.memory_budget < 1):
+        parser.error('--memory-budget should be positive and can be used only with the default market and '
+                     'the greedy solver')
+    if arguments.input_format == 'binary' and (arguments.bulk or arguments.workers is not None
+                                               or arguments.cache is not None):
+        parser.error('--input-format binary can not be used with --bulk, --workers or --cache')
+    return arguments
+
+
+def main(argv: Sequence[str] = ()) -> None:
+    """Execute main program flow.
+
+    The function consumes standard input, performs calculation and produces
+    results into standard output.
+    :param argv: Command line arguments without the program name.
+    """
+    arguments: argparse.Namespace = parse_arguments(argv)
+    instrumentation: Optional[Instrumentation] = Instrumentation.create('mega_trader', arguments.instrument)
+    with instrumentation or nullcontext():
+        trade(arguments, instrumentation)
+
+
+def trade(arguments: argparse.Namespace, instrumentation: Optional[Instrumentation] = None) -> None:
+    """Read lots, buy the most profitable ones and write them.
+
+    :param arguments: Parsed command line arguments.
+    :param instrumentation: Instrumentation measuring stages or None if it is switched off.
+    """
+    report: Optional['ErrorReport'] = None
+    if arguments.aggregate_errors:
+        from ..validation import ErrorReport
+        report = ErrorReport()
+    if arguments.cache is not None:
+        from .cache import CachedMegaTrader, read_cached
+        with measure(instrumentation, 'parse'):
+            cached = read_cached(sys.stdin, arguments.cache, arguments.cache_size, report)
+        if cached is None:
+            if report is not None:
+                report.log(get_logger())
+            return
+        market, balance = cached
+        trader: MegaTrader = CachedMegaTrader(balance)
+    elif arguments.workers is not None:
+        from .bulk import read_all
+        from .parallel import read_sharded
+        with measure(instrumentation, 'parse'):
+            sharded = read_sharded(read_all(sys.stdin), arguments.workers, report)
+        if sharded is None:
+            if report is not None:
+                report.log(get_logger())
+            return
+        market, balance = sharded
+        trader = MegaTrader(balance)
+    else:
+        if arguments.input_format == 'binary':
+            from ..binary import read_lots
+            with measure(instrumentation, 'read') as stage:
+                bulk_input = read_lots(sys.stdin.buffer)
+            if bulk_input is None:
+                if report is not None:
+                    report.log(get_logger())
+                return
+            if stage is not None:
+                stage.items += len(bulk_input.days)
+            days, lots_per_day, balance = bulk_input.initial_data
+        elif arguments.bulk or report is not None:
+            from .bulk import BulkInput
+            with measure(instrumentation, 'parse') as stage:
+                bulk_input: BulkInput = BulkInput.read(sys.stdin, report)
+            if stage is not None:
+                stage.items += len(bulk_input.days)
+                stage.rejected += len(bulk_input.errors)
+            if bulk_input.initial_data is None:
+                if report is not None:
+                    report.log(get_logger())
+                return
+            days, lots_per_day, balance = bulk_input.initial_data
+        else:
+            with measure(instrumentation, 'read'):
+                days, lots_per_day, balance = read_initial_data(sys.stdin)
+        if arguments.columnar:
+            from .columnar import ColumnarMarket, ColumnarMegaTrader
+            market: Market = ColumnarMarket(days, lots_per_day)
+            trader = ColumnarMegaTrader(balance)
+        elif arguments.streaming:
+            from .streaming import StreamingMarket
+            market = StreamingMarket(days, lots_per_day, balance)
+            trader = MegaTrader(balance)
+        elif arguments.memory_budget is not None:
+            from .external import ExternalMarket, ExternalMegaTrader
+            market = ExternalMarket(days, lots_per_day, arguments.memory_budget, arguments.spill_dir)
+            trader = ExternalMegaTrader(balance)
+        else:
+            market = Market(days, lots_per_day)
+            trader = MegaTrader(balance)
+        if instrumentation is not None:
+            # Lots which are not in the issue period or exceed the daily amount are rejected by the market.
+            instrumentation.instrument(market, 'add', 'add', Market.InapplicableSlot)
+            instrumentation.instrument(sys.modules[__name__], 'deserialize_lot', 'parse', SlotDeserializeError)
+            # The external memory market evaluates incomes while lots are added.
+            instrumentation.instrument(market, 'evaluate_income', 'evaluate_income')
+        if arguments.bulk or report is not None or arguments.input_format == 'binary':
+            bulk_input.fill(market, report)
+        else:
+            with measure(instrumentation, 'read'):
+                issue_lots(market, sys.stdin)
+    if report is not None:
+        report.log(get_logger())
+    if arguments.solver == 'exact':
+        from .knapsack import ExactMegaTrader
+        trader = ExactMegaTrader(balance)
+
+    if instrumentation is not None:
+        if arguments.cache is not None or arguments.workers is not None:
+            instrumentation.instrument(market, 'evaluate_income', 'evaluate_income')
+        instrumentation.instrument(market, 'ranked_lots', 'sort', elements=True)
+        if hasattr(market, 'ranking'):
+            # The columnar trader ranks lots and evaluates their incomes in vectorized calls.
+            instrumentation.instrument(market, 'evaluate_incomes', 'evaluate_income', elements=True)
+            instrumentation.instrument(market, 'ranking', 'sort', elements=True)
+        if hasattr(market, 'ranked_records'):
+            # The external memory trader merges ranked records without creating lots.
+            instrumentation.instrument(market, 'ranked_records', 'sort', elements=True)
+    with measure(instrumentation, 'purchase') as stage:
+        trader.buy_lots(market)
+    if stage is not None:
+        stage.items += len(trader.lots)
+    income: int = sum(market.evaluate_income(lot) for lot in trader.lots)
+    with measure(instrumentation, 'output', len(trader.lots) + 1), BulkWriter() as writer:
+        writer.write_lines(chain([str(format_money(income))], map(serialize_lot, trader.lots)))
 
 
 if __name__ == '__main__':
     try:
-        main()
+        main(sys.argv[1:])
+    except EOFError as exc:
+        sys.exit(str(exc))
     except KeyboardInterrupt:
         exit(0)
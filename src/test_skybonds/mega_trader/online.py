@@ -0,0 +1,162 @@
+"""Online market.
+
+The market keeps lots ranked while they are issued, so the purchase plan is updated after
+every new lot instead of ranking all lots again. Ranked lots are split into blocks with
+aggregated prices and incomes; the greedy trader skips blocks it can not afford and buys
+blocks it can afford entirely without walking their lots, and it revisits only blocks
+starting from the first one changed since the previous update.
+"""
+from bisect import bisect_left, insort
+from operator import attrgetter
+from typing import Iterator, List, Tuple
+
+from .mega_trader import Lot, Market, MegaTrader
+
+
+class Block:
+    """Consecutive ranked lots with aggregated values."""
+    __slots__ = ['keys', 'lots', 'prices_sum', 'incomes_sum', 'min_price']
+
+    def __init__(self, keys: List[Tuple[int, int]], lots: List[Lot]) -> None:
+        """Initialize an instance.
+
+        :param keys: Ranking keys of lots as pairs of negated income and order.
+        :param lots: Lots in the same order.
+        """
+        self.keys: List[Tuple[int, int]] = keys
+        self.lots: List[Lot] = lots
+        self.prices_sum: int = sum(lot.price for lot in lots)
+        self.incomes_sum: int = -sum(key[0] for key in keys)
+        self.min_price: int = min((lot.price for lot in lots), default=0)
+
+    def insert(self, key: Tuple[int, int], lot: Lot) -> None:
+        """Insert a lot keeping the block sorted.
+
+        :param key: Ranking key of the lot.
+        :param lot: Lot.
+        """
+        position: int = bisect_left(self.keys, key)
+        self.keys.insert(position, key)
+        self.lots.insert(position, lot)
+        self.min_price = min(self.min_price, lot.price) if len(self.lots) > 1 else lot.price
+        self.prices_sum += lot.price
+        self.incomes_sum -= key[0]
+
+
+class OnlineMarket(Market):
+    """Market keeping lots ranked by income as they are issued.
+
+    Lots with equal income are ranked by order.
+    """
+
+    #: Blocks are split in halves when they grow twice larger than this amount of lots.
+    BLOCK_SIZE: int = 256
+
+    def __init__(self, issue_period: int, lots_amount_per_day: int) -> None:
+        """Initialize an instance.
+
+        :param issue_period: Period in days when lots can be issued to the market.
+        :param lots_amount_per_day: Amount of lots per day that can be issued.
+        """
+        super().__init__(issue_period, lots_amount_per_day)
+        self.blocks: List[Block] = [Block([], [])]
+        #: The greatest ranking key of every block but the last one.
+        self._bounds: List[Tuple[int, int]] = []
+        #: Indices of blocks changed by every issued lot.
+        self.changes: List[int] = []
+
+    def add(self, lot: Lot) -> None:
+        """Issue a lot to the market for trading.
+
+        :param lot: Lot for trading.
+        """
+        super().add(lot)
+        key: Tuple[int, int] = (-self.evaluate_income(lot), lot.order)
+        index: int = bisect_left(self._bounds, key)
+        block: Block = self.blocks[index]
+        block.insert(key, lot)
+        self.changes.append(index)
+
+        if len(block.lots) > 2 * self.BLOCK_SIZE:
+            half: int = len(block.lots) // 2
+            self.blocks[index:index + 1] = [Block(block.keys[:half], block.lots[:half]),
+                                            Block(block.keys[half:], block.lots[half:])]
+            insort(self._bounds, block.keys[half - 1])
+
+    def ranked_lots(self) -> Iterator[Lot]:
+        """Rank lots by income, the most profitable go first.
+
+        :return: Ranked lots.
+        """
+        for block in self.blocks:
+            yield from block.lots
+
+
+class OnlineMegaTrader(MegaTrader):
+    """Trader following an online market and updating the greedy purchase plan incrementally.
+
+    The trader remembers the balance and income before every block of the market, so an update
+    walks blocks only from the first block changed since the previous update.
+    """
+
+    def __init__(self, balance: int) -> None:
+        """Initialize an instance.
+
+        :param balance: Start balance of a trader in thousandths.
+        """
+        super().__init__(balance)
+        self._start_balance: int = balance
+        #: Income of bought lots in thousandths.
+        self.income: int = 0
+        #: Balance, income and amount of bought ranges before every walked block.
+        self._checkpoints: List[Tuple[int, int, int]] = []
+        #: Bought lots as ranges of blocks.
+        self._ranges: List[Tuple[Block, int, int]] = []
+        #: Amount of market changes the plan takes into account.
+        self._changes_seen: int = 0
+
+    def update(self, market: OnlineMarket) -> None:
+        """Update the purchase plan to lots currently issued to the market.
+
+        :param market: Market where slots should be bought.
+        """
+        changes: List[int] = market.changes[self._changes_seen:]
+        self._changes_seen = len(market.changes)
+        if not changes:
+            return
+
+        # The state before the first changed block is still valid.
+        del self._checkpoints[min(changes) + 1:]
+        if self._checkpoints:
+            self.balance, self.income, ranges_amount = self._checkpoints.pop()
+            del self._ranges[ranges_amount:]
+        else:
+            self.balance, self.income = self._start_balance, 0
+            self._ranges.clear()
+
+        for block in market.blocks[len(self._checkpoints):]:
+            self._checkpoints.append((self.balance, self.income, len(self._ranges)))
+            if block.min_price > self.balance:
+                continue
+            if block.prices_sum <= self.balance:
+                self.balance -= block.prices_sum
+                self.income += block.incomes_sum
+                self._ranges.append((block, 0, len(block.lots)))
+                continue
+
+            for position, (key, lot) in enumerate(zip(block.keys, block.lots)):
+                if self.balance >= lot.price:
+                    self.balance -= lot.price
+                    self.income -= key[0]
+                    self._ranges.append((block, position, position + 1))
+
+    def buy_lots(self, market: OnlineMarket) -> List[Lot]:
+        """Buy slots on given market.
+
+        :param market: Market where slots should be bought.
+        :return: Slots were bought.
+        """
+        self.update(market)
+        self.lots = sorted((lot for block, start, end in self._ranges for lot in block.lots[start:end]),
+                           key=attrgetter('order'))
+        return self.lots
@@ -0,0 +1,222 @@
+"""Sharded market.
+
+The input is split into chunks of whole lines which are parsed, validated and ranked by
+worker processes. Every worker returns a run of lots sorted by income, and the runs are merged
+lazily, so the greedy trader sees lots in the same order as if they were read sequentially.
+Limit of lots per day and lot orders are reconciled across chunks the way sequential reading does.
+"""
+import heapq
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..validation import ErrorReport
+from .bulk import BulkInput, split_initial_data
+from .mega_trader import Lot, Market, logger
+
+#: Chunks are not made smaller than this amount of bytes.
+MIN_CHUNK_SIZE: int = 1 << 20
+#: Amount of chunks per worker, more chunks balance the load better.
+CHUNKS_PER_WORKER: int = 4
+
+
+def split_chunks(data: bytes, chunk_size: int) -> List[bytes]:
+    """Split data into chunks of whole lines.
+
+    :param data: Data to split.
+    :param chunk_size: Approximate size of a chunk in bytes.
+    :return: Chunks, every one but the last ends with a line feed.
+    """
+    chunks: List[bytes] = []
+    start: int = 0
+    while start < len(data):
+        end: int = data.find(b'\n', start + chunk_size - 1) + 1 or len(data)
+        chunks.append(data[start:end])
+        start = end
+    return chunks
+
+
+@dataclass
+class Shard:
+    """Lots of a chunk parsed and ranked by a worker.
+
+    Line numbers are counted from 0 within the chunk, positions are indices among all parsed lots of the chunk.
+    Ranked columns hold only lots the worker has accepted, the most profitable go first.
+    """
+    __slots__ = ['lines_amount', 'parsed_amount', 'terminated', 'errors', 'daily_amounts', 'positions',
+                 'line_numbers', 'day_numbers', 'incomes', 'lots']
+
+    lines_amount: int
+    parsed_amount: int
+    #: Whether lots are terminated with an empty line within the chunk.
+    terminated: bool
+    #: Errors as pairs of line number and message.
+    errors: List[Tuple[int, str]]
+    #: Amount of accepted lots indexed by day.
+    daily_amounts: array
+    positions: array
+    line_numbers: array
+    #: Numbers of lots among lots of the chunk issued the same day.
+    day_numbers: array
+    #: Incomes in thousandths.
+    incomes: List[int]
+    #: Lots as tuples of day, bond name, price percent in tenths and bonds amount.
+    lots: List[Tuple[int, str, int, int]]
+
+
+def load_shard(chunk: bytes, issue_period: int, lots_amount_per_day: int) -> Shard:
+    """Parse lots of a chunk, validate them against a local market and rank them.
+
+    :param chunk: Chunk of whole lines.
+    :param issue_period: Period in days when lots can be issued to the market.
+    :param lots_amount_per_day: Amount of lots per day that can be issued.
+    :return: Shard.
+    """
+    lines: List[bytes] = chunk.splitlines()
+    bulk_input: BulkInput = BulkInput.parse_lots(lines, 0)
+    market = Market(issue_period, lots_amount_per_day)
+    rejected: List[Tuple[int, Market.InapplicableSlot]] = market.extend(
+        bulk_input.days, bulk_input.bond_price_percents, bulk_input.bonds_amounts, bulk_input.bond_names,
+        orders=range(len(bulk_input.days)))
+
+    daily_amounts: array = array('q', [0]) * (issue_period + 1)
+    day_numbers: Dict[int, int] = {}
+    for lot in market.lots:
+        day_numbers[lot.order] = daily_amounts[lot.day]
+        daily_amounts[lot.day] += 1
+
+    ranked_lots: List[Lot] = list(market.ranked_lots())
+    return Shard(lines_amount=len(lines), parsed_amount=len(bulk_input.days), terminated=bulk_input.terminated,
+                 errors=bulk_input.errors + [(bulk_input.line_numbers[position], str(exc))
+                                             for position, exc in rejected],
+                 daily_amounts=daily_amounts,
+                 positions=array('q', (lot.order for lot in ranked_lots)),
+                 line_numbers=array('q', (bulk_input.line_numbers[lot.order] for lot in ranked_lots)),
+                 day_numbers=array('q', (day_numbers[lot.order] for lot in ranked_lots)),
+                 incomes=[market.evaluate_income(lot) for lot in ranked_lots],
+                 lots=[(lot.day, lot.bond_name, lot.bond_price_percent, lot.bonds_amount) for lot in ranked_lots])
+
+
+class ShardedMarket(Market):
+    """Market loading lots with a pool of worker processes.
+
+    Loaded lots are kept in ranked runs, one per chunk, and lot instances are created while runs are merged.
+    """
+
+    def __init__(self, issue_period: int, lots_amount_per_day: int) -> None:
+        """Initialize an instance.
+
+        :param issue_period: Period in days when lots can be issued to the market.
+        :param lots_amount_per_day: Amount of lots per day that can be issued.
+        """
+        super().__init__(issue_period, lots_amount_per_day)
+        #: Ranked runs of loaded lots as tuples of negated income, order and lot fields.
+        self._runs: List[List[Tuple[int, int, Tuple[int, str, int, int]]]] = []
+
+    def load(self, data: bytes, first_line_number: int, workers: Optional[int] = None,
+             report: Optional[ErrorReport] = None) -> None:
+        """Issue lots from input data to the market.
+
+        Deserialization errors and lots the market does not accept are logged in order of input lines.
+        :param data: Input data with lots only.
+        :param first_line_number: Number of the first line in the input.
+        :param workers: Amount of worker processes, amount of processors by default.
+        :param report: Report to collect errors into, errors are logged one by one if it is not given.
+        """
+        workers = workers or os.cpu_count() or 1
+        chunk_size: int = max(MIN_CHUNK_SIZE, len(data) // (workers * CHUNKS_PER_WORKER))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shards: Iterable[Shard] = executor.map(load_shard, split_chunks(data, chunk_size),
+                                                   repeat(self._trading_period), repeat(self._lots_amount_per_day))
+            self._merge_shards(shards, first_line_number, report)
+
+    def _merge_shards(self, shards: Iterable[Shard], first_line_number: int,
+                      report: Optional[ErrorReport] = None) -> None:
+        """Reconcile shards of consecutive chunks as if their lots were issued one by one.
+
+        :param shards: Shards in order of chunks.
+        :param first_line_number: Number of the first line in the input.
+        :param report: Report to collect errors into, errors are logged one by one if it is not given.
+        """
+        errors: List[Tuple[int, str]] = []
+        daily_amounts: array = self._daily_amounts
+        line_number: int = first_line_number
+        shards = list(shards)
+        first_order: int = Lot.reserve_orders(sum(shard.parsed_amount for shard in shards)).start
+        for shard in shards:
+            errors += [(line_number + number, message) for number, message in shard.errors]
+            run: List[Tuple[int, int, Tuple[int, str, int, int]]] = []
+            for position, number, day_number, income, lot in zip(
+                    shard.positions, shard.line_numbers, shard.day_numbers, shard.incomes, shard.lots):
+                if daily_amounts[lot[0]] + day_number < self._lots_amount_per_day:
+                    run.append((-income, first_order + position, lot))
+                else:
+                    errors.append((line_number + number, str(self.BondsExceeded(self._lots_amount_per_day))))
+            self._runs.append(run)
+
+            for day, amount in enumerate(shard.daily_amounts):
+                daily_amounts[day] = min(daily_amounts[day] + amount, self._lots_amount_per_day)
+            line_number += shard.lines_amount
+            first_order += shard.parsed_amount
+            if shard.terminated:
+                # Lots after the first empty line are not read.
+                break
+
+        if report is not None:
+            report.extend(sorted(errors))
+            return
+        for number, message in sorted(errors):
+            logger.error(f'Line {number}: {message}')
+
+    def _ranked_entries(self) -> Iterator[Tuple[int, int, Tuple[int, str, int, int]]]:
+        """Merge ranked runs together with lots added one by one.
+
+        :return: Ranked tuples of negated income, order and lot fields.
+        """
+        added: List[Tuple[int, int, Tuple[int, str, int, int]]] = sorted(
+            (-self.evaluate_income(lot), lot.order, (lot.day, lot.bond_name, lot.bond_price_percent,
+                                                     lot.bonds_amount))
+            for lot in self.lots)
+        return heapq.merge(*self._runs, added)
+
+    def _create_lot(self, order: int, fields: Tuple[int, str, int, int]) -> Lot:
+        """Create lot instance for a ranked entry.
+
+        :param order: Order of the lot.
+        :param fields: Day, bond name, price percent in tenths and bonds amount.
+        :return: Lot instance.
+        """
+        day, bond_name, bond_price_percent, bonds_amount = fields
+        return Lot.create(day=day, bond_name=bond_name, bond_price_percent=bond_price_percent,
+                          bonds_amount=bonds_amount, bond_rating=self.BOND_RATING, order=order)
+
+    def ranked_lots(self) -> Iterator[Lot]:
+        """Rank lots by income, the most profitable go first.
+
+        Lots with equal income keep the order they were issued in. Lot instances are created lazily.
+        :return: Ranked lots.
+        """
+        for _, order, fields in self._ranked_entries():
+            yield self._create_lot(order, fields)
+
+
+def read_sharded(data: bytes, workers: Optional[int] = None,
+                 report: Optional[ErrorReport] = None) -> Optional[Tuple[ShardedMarket, int]]:
+    """Load the whole input into a sharded market.
+
+    :param data: Input data.
+    :param workers: Amount of worker processes, amount of processors by default.
+    :param report: Report to collect errors into, errors are logged one by one if it is not given.
+    :return: Market and balance in thousandths or None if there is no valid initial data.
+    """
+    initial_data, offset, first_line_number = split_initial_data(data, report)
+    if initial_data is None:
+        return None
+
+    days, lots_per_day, balance = initial_data
+    market = ShardedMarket(days, lots_per_day)
+    market.load(data[offset:], first_line_number, workers, report)
+    return market, balance
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""The program calculates maximum income for many scenarios over the same lots.
+
+Lots are read from standard input in the format of the main program, its initial data is ignored.
+Every scenario is a line of initial data, "2 2 8000" for instance. Lots are parsed once and ranked
+once per issue period and amount of lots per day, then every balance is answered with binary
+searches over prefix sums of ranked prices and a segment tree of their minimums. Results of
+scenarios are printed in the format of the main program and separated with empty lines.
+"""
+from __future__ import annotations
+
+import sys
+from bisect import bisect_right
+from collections import defaultdict
+from itertools import accumulate, repeat
+from operator import itemgetter
+
+from ..output import BulkWriter
+
+from .mega_trader import (InitialDataDeserializeError, Lot, Market, deserialize_initial_data, format_money,
+                          get_logger, serialize_lot)
+
+# Modules which are used for annotations only are not imported to start faster.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import argparse
+    from typing import Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+    from .bulk import BulkInput
+
+    #: Lots as columns of days, bond names, price percents in tenths and bonds amounts.
+    Columns = Tuple[Sequence[int], Sequence[str], Sequence[int], Sequence[int]]
+
+
+def build_min_tree(values: Sequence[int]) -> List[float]:
+    """Build segment tree of minimums.
+
+    :param values: Values.
+    :return: Tree as a list, leaves are the second half padded with infinity.
+    """
+    size: int = 1 << max(len(values) - 1, 0).bit_length()
+    tree: List[float] = [float('inf')] * (2 * size)
+    tree[size:size + len(values)] = values
+    for index in range(size - 1, 0, -1):
+        tree[index] = min(tree[2 * index], tree[2 * index + 1])
+    return tree
+
+
+def find_not_greater(tree: Sequence[float], position: int, limit: int) -> int:
+    """Find the first value not greater than the limit starting from given position.
+
+    :param tree: Segment tree of minimums.
+    :param position: Start position.
+    :param limit: Limit.
+    :return: Position of the value, it is beyond the values if there is no such one.
+    """
+    size: int = len(tree) // 2
+    if position >= size:
+        return size
+
+    index: int = position + size
+    while tree[index] > limit:
+        # Move to the next subtree on the right.
+        while index & 1:
+            index >>= 1
+        if not index:
+            return size
+        index += 1
+
+    while index < size:
+        index = 2 * index if tree[2 * index] <= limit else 2 * index + 1
+    return index - size
+
+
+def select_greedy(prefix_sums: Sequence[int], min_prices: Sequence[float], balance: int) -> List[int]:
+    """Select ranked lots the same way the greedy trader does.
+
+    Every step jumps to the next affordable lot, buys the longest run of lots fitting the balance
+    found by binary search over prefix sums and skips the lot which does not fit.
+    So every step buys at least one lot.
+    :param prefix_sums: Prefix sums of ranked lot prices starting with zero.
+    :param min_prices: Segment tree of minimum ranked lot prices.
+    :param balance: Balance in thousandths.
+    :return: Positions of bought lots in the ranking.
+    """
+    chosen: List[int] = []
+    lots_amount: int = len(prefix_sums) - 1
+    position: int = find_not_greater(min_prices, 0, balance)
+    while position < lots_amount:
+        end: int = bisect_right(prefix_sums, prefix_sums[position] + balance, lo=position) - 1
+        chosen.extend(range(position, end))
+        balance -= prefix_sums[end] - prefix_sums[position]
+        position = find_not_greater(min_prices, end + 1, balance)
+
+    return chosen
+
+
+def evaluate_scenarios(columns: Columns, issue_period: int, lots_amount_per_day: int,
+                       balances: Sequence[int]) -> List[List[str]]:
+    """Evaluate scenarios sharing the issue period and amount of lots per day.
+
+    :param columns: Parsed lots.
+    :param issue_period: Period in days when lots can be issued to the market.
+    :param lots_amount_per_day: Amount of lots per day that can be issued.
+    :param balances: Balances of scenarios in thousandths.
+    :return: Output lines of every scenario.
+    """
+    days, bond_names, bond_price_percents, bonds_amounts = columns
+    market = Market(issue_period, lots_amount_per_day)
+    market.extend(days, bond_price_percents, bonds_amounts, bond_names, orders=range(len(days)))
+    ranked_lots: List[Lot] = list(market.ranked_lots())
+    incomes: List[int] = [market.evaluate_income(lot) for lot in ranked_lots]
+    prefix_sums: List[int] = list(accumulate((lot.price for lot in ranked_lots), initial=0))
+    min_prices: List[float] = build_min_tree([lot.price for lot in ranked_lots])
+
+    outputs: List[List[str]] = []
+    for balance in balances:
+        chosen: List[int] = sorted(select_greedy(prefix_sums, min_prices, balance),
+                                   key=lambda position: ranked_lots[position].order)
+        outputs.append([str(format_money(sum(incomes[position] for position in chosen)))] +
+                       [serialize_lot(ranked_lots[position]) for position in chosen])
+
+    return outputs
+
+
+def read_scenarios(stream: TextIO) -> List[Tuple[int, int, int]]:
+    """Read scenarios, malformed lines are logged and skipped.
+
+    :param stream: Stream to read scenarios from.
+    :return: Issue periods, amounts of lots per day and balances in thousandths.
+    """
+    scenarios: List[Tuple[int, int, int]] = []
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            scenarios.append(deserialize_initial_data(line.strip()))
+        except InitialDataDeserializeError as exc:
+            get_logger().error(f'Scenario line {line_number}: {exc}')
+
+    return scenarios
+
+
+def evaluate_all(columns: Columns, scenarios: Sequence[Tuple[int, int, int]],
+                 workers: Optional[int] = None) -> List[List[str]]:
+    """Evaluate scenarios ranking lots once for every issue period and amount of lots per day.
+
+    :param columns: Parsed lots.
+    :param scenarios: Issue periods, amounts of lots per day and balances in thousandths.
+    :param workers: Amount of worker processes, scenarios are evaluated in this process if it is not given.
+    :return: Output lines of every scenario in the same order.
+    """
+    groups: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    for index, (issue_period, lots_amount_per_day, _) in enumerate(scenarios):
+        groups[issue_period, lots_amount_per_day].append(index)
+
+    arguments: Tuple[Iterable, ...] = (repeat(columns), map(itemgetter(0), groups), map(itemgetter(1), groups),
+                                       ([scenarios[index][2] for index in indices] for indices in groups.values()))
+    if workers is None:
+        results: Iterable[List[List[str]]] = map(evaluate_scenarios, *arguments)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(evaluate_scenarios, *arguments))
+
+    outputs: List[List[str]] = [[] for _ in scenarios]
+    for indices, group_outputs in zip(groups.values(), results):
+        for index, output in zip(indices, group_outputs):
+            outputs[index] = output
+    return outputs
+
+
+def join_outputs(outputs: Iterable[List[str]]) -> Iterator[str]:
+    """Join output lines of scenarios separating them with empty lines.
+
+    :param outputs: Output lines of every scenario.
+    :return: Lines.
+    """
+    for index, output in enumerate(outputs):
+        if index:
+            yield ''
+        yield from output
+
+
+def parse_arguments(argv: Sequence[str]) -> argparse.Namespace:
+    """Parse command line arguments.
+
+    :param argv: Command line arguments without the program name.
+    :return: Parsed arguments.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', type=argparse.FileType(),
+                        help='file with a scenario per line, e.g. "2 2 8000"')
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help='evaluate groups of scenarios in N worker processes')
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] = ()) -> None:
+    """Execute main program flow.
+
+    :param argv: Command line arguments without the program name.
+    """
+    from .bulk import BulkInput
+
+    arguments: argparse.Namespace = parse_arguments(argv)
+    with arguments.scenarios:
+        scenarios: List[Tuple[int, int, int]] = read_scenarios(arguments.scenarios)
+
+    bulk_input: BulkInput = BulkInput.read(sys.stdin)
+    for line_number, message in bulk_input.errors:
+        get_logger().error(f'Line {line_number}: {message}')
+
+    columns: Columns = (bulk_input.days, bulk_input.bond_names, bulk_input.bond_price_percents,
+                        bulk_input.bonds_amounts)
+    with BulkWriter() as writer:
+        writer.write_lines(join_outputs(evaluate_all(columns, scenarios, arguments.workers)))
+
+
+if __name__ == '__main__':
+    try:
+        main(sys.argv[1:])
+    except KeyboardInterrupt:
+        exit(0)
@@ -0,0 +1,90 @@
+"""Streaming market.
+
+The market keeps only lots the greedy trader still can buy, so memory depends on amount of
+affordable lots rather than on input size.
+"""
+from bisect import bisect_right
+from typing import List, Set, Tuple
+
+from .mega_trader import Lot, Market
+
+
+class StreamingMarket(Market):
+    """Market evicting lots which can not be bought with given balance.
+
+    The greedy trader buys a lot only if all more profitable lots that are not more expensive
+    are bought too and there is enough balance left for it. Issuing more lots never changes that,
+    so a lot can be evicted as soon as its price together with prices of such lots exceeds the balance.
+    """
+
+    #: Amount of lots kept before the first eviction.
+    DEFAULT_CAPACITY: int = 4096
+
+    def __init__(self, issue_period: int, lots_amount_per_day: int, balance: int) -> None:
+        """Initialize an instance.
+
+        :param issue_period: Period in days when lots can be issued to the market.
+        :param lots_amount_per_day: Amount of lots per day that can be issued.
+        :param balance: Balance of the trader who buys lots in thousandths.
+        """
+        super().__init__(issue_period, lots_amount_per_day)
+        self._balance: int = balance
+        self._capacity: int = self.DEFAULT_CAPACITY
+
+    def add(self, lot: Lot) -> None:
+        """Issue a lot to the market for trading.
+
+        :param lot: Lot for trading.
+        """
+        if not (1 <= lot.day <= self._trading_period):
+            raise self.DayOutOfRange(1, self._trading_period)
+
+        if self._daily_amounts[lot.day] >= self._lots_amount_per_day:
+            raise self.BondsExceeded(self._lots_amount_per_day)
+
+        self._daily_amounts[lot.day] += 1
+        if lot.price > self._balance:
+            return
+
+        self.lots.append(lot)
+        if len(self.lots) > self._capacity:
+            self._evict()
+            self._capacity = max(self._capacity, 2 * len(self.lots))
+
+    def _rank_key(self, lot: Lot) -> Tuple[int, int]:
+        """Get key ranking lots the same way the greedy trader does.
+
+        :param lot: Lot.
+        :return: Key, the most profitable lots have the least keys.
+        """
+        return -self.evaluate_income(lot), lot.order
+
+    def _evict(self) -> None:
+        """Evict lots which can not be bought anymore.
+
+        Lots are walked from the most profitable ones. Prices of walked lots are accumulated in
+        Fenwick tree indexed by price, so the sum of more profitable lots that are not more expensive
+        is found in logarithmic time.
+        """
+        prices: List[int] = sorted({lot.price for lot in self.lots})
+        size: int = len(prices)
+        sums: List[int] = [0] * (size + 1)
+        balance: int = self._balance
+        evicted: Set[int] = set()
+        for lot in sorted(self.lots, key=self._rank_key):
+            price: int = lot.price
+            position: int = bisect_right(prices, price)
+            cheaper_lots_price: int = price
+            index: int = position
+            while index:
+                cheaper_lots_price += sums[index]
+                index &= index - 1
+            if cheaper_lots_price > balance:
+                evicted.add(lot.order)
+
+            index = position
+            while index <= size:
+                sums[index] += price
+                index += index & -index
+
+        self.lots = [lot for lot in self.lots if lot.order not in evicted]
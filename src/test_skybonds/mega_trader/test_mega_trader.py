@@ -1,22 +1,61 @@
-from io import StringIO
-from unittest import TestCase
+import json
+import random
+import tempfile
+from io import BytesIO, StringIO, TextIOWrapper
+from pathlib import Path
+from typing import List
+from unittest import TestCase, skipIf
 from unittest.mock import patch
 
-from test_skybonds.mega_trader.mega_trader import main
+from test_skybonds.__main__ import main as entry_point_main
+from test_skybonds.benchmarks import measure_import
+from test_skybonds.binary import logger as binary_logger, main as binary_main
+from test_skybonds.mega_trader import mega_trader
+from test_skybonds.mega_trader.mega_trader import Market, MegaTrader, deserialize_lot, logger, main
+from test_skybonds.mega_trader.online import OnlineMarket, OnlineMegaTrader
+from test_skybonds.mega_trader.scenarios import main as scenarios_main
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def run_main(input_values: List[str], *argv: str) -> List[str]:
+    out = StringIO()
+    with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', out):
+        main(argv)
+
+    out.seek(0)
+    return [line.strip() for line in out]
+
+
+def generate_input_values(data_amount: int, days: int, lots_per_day: int, balance: int) -> List[str]:
+    rand = random.Random(data_amount)
+    return [f'{days} {lots_per_day} {balance}'] + [
+        f'{rand.randint(1, days + 1)} name-{rand.randint(1, 3)} {rand.randint(900, 1100) / 10} {rand.randint(1, 5)}'
+        for _ in range(data_amount)
+    ]
 
 
 class MegaTraderTestCase(TestCase):
+    input_values = [
+        '2 2 8000',
+        '1 alfa-05 100.2 2',
+        '2 gazprom-17 100.0 2',
+        '2 alfa-05 101.5 5',
+        '2 gazprom-17 102.0 1',  # Must be skipped due to bonds per day exceeded.
+        '3 gazprom-17 103.0 1',  # Must be skipped due to day out of range.
+        '1 gazprom-17 96.0 100',  # Must be skipped because trader can not afford it.
+    ]
+    expected_output = [
+        '135',
+        '2 gazprom-17 100.0 2',
+        '2 alfa-05 101.5 5',
+    ]
+
     def test_buying_profitable_slots(self):
         """Test buying the most profitable slots and total trader's income."""
-        input_values = [
-            '2 2 8000',
-            '1 alfa-05 100.2 2',
-            '2 gazprom-17 100.0 2',
-            '2 alfa-05 101.5 5',
-            '2 gazprom-17 102.0 1',  # Must be skipped due to bonds per day exceeded.
-            '3 gazprom-17 103.0 1',  # Must be skipped due to day out of range.
-            '1 gazprom-17 96.0 100',  # Must be skipped because trader can not afford it.
-        ]
         expected_income = '135'
         expected_lots = [
             '2 gazprom-17 100.0 2',
@@ -24,7 +63,7 @@ class MegaTraderTestCase(TestCase):
         ]
         out = StringIO()
 
-        with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', out):
+        with patch('sys.stdin', StringIO('\n'.join(self.input_values))), patch('sys.stdout', out):
             main()
 
         out.seek(0)
@@ -32,3 +71,312 @@ class MegaTraderTestCase(TestCase):
         actual_lots = [line.strip() for line in out]
         self.assertEqual(actual_income, expected_income)
         self.assertListEqual(actual_lots, expected_lots)
+
+    @skipIf(numpy is None, 'numpy is not installed')
+    def test_columnar_market(self):
+        """Test columnar market buys the same lots as the default one."""
+        self.assertListEqual(run_main(self.input_values, '--columnar'), self.expected_output)
+        input_values = generate_input_values(2000, 50, 30, 300000)
+        self.assertListEqual(run_main(input_values, '--columnar'), run_main(input_values))
+        self.assertListEqual(run_main(input_values, '--columnar', '--bulk'), run_main(input_values))
+
+    @skipIf(numpy is None, 'numpy is not installed')
+    def test_columnar_market_huge_amounts(self):
+        """Test columnar market does not overflow when lot prices or amounts do not fit 64-bit integers."""
+        for bonds_amount in ['10000000000000', '100000000000000000000']:
+            input_values = ['2 2 8000', '2 gazprom-17 99.0 5', f'1 alfa-05 100.0 {bonds_amount}']
+            for argv in [('--columnar',), ('--columnar', '--bulk')]:
+                self.assertListEqual(run_main(input_values, *argv), ['200', '2 gazprom-17 99.0 5'], argv)
+
+    def test_exact_solver(self):
+        """Test exact solver finds the maximum income where greedy buying does not."""
+        input_values = [
+            '1 3 10000',
+            '1 alfa-05 99.0 6',
+            '1 gazprom-17 99.5 5',
+            '1 alfa-05 99.5 5',
+        ]
+        self.assertListEqual(run_main(input_values), ['240', '1 alfa-05 99.0 6'])
+        self.assertListEqual(run_main(input_values, '--solver', 'exact'),
+                             ['350', '1 gazprom-17 99.5 5', '1 alfa-05 99.5 5'])
+
+        input_values = generate_input_values(300, 50, 30, 300000)
+        for limit in ['DP_MAX_CELLS', 'DP_MAX_BYTES']:
+            with patch('test_skybonds.mega_trader.knapsack.BRANCH_AND_BOUND_MAX_NODES', 10), \
+                    patch(f'test_skybonds.mega_trader.knapsack.{limit}', 10):
+                self.assertListEqual(run_main(input_values, '--solver', 'exact'), run_main(input_values), limit)
+
+    def test_bulk_input(self):
+        """Test bulk input gives the same result and reports errors with line numbers."""
+        input_values = self.input_values[:2] + ['1 alfa-05 100.2'] + self.input_values[2:]
+        with self.assertLogs(logger) as logs:
+            self.assertListEqual(run_main(input_values, '--bulk'), self.expected_output)
+        self.assertListEqual(logs.output, [
+            'ERROR:test_skybonds.mega_trader.mega_trader:Line 3: '
+            'Incorrect input. Should be of 4 values, e.g. "1 alfa-05 100.2 2"',
+            'ERROR:test_skybonds.mega_trader.mega_trader:Line 6: '
+            'Bonds amount per day exceeded. Should be no more than 2',
+            'ERROR:test_skybonds.mega_trader.mega_trader:Line 7: Day out of range. Should be [1-2]',
+        ])
+
+        input_values = generate_input_values(2000, 50, 30, 300000)
+        self.assertListEqual(run_main(input_values, '--bulk'), run_main(input_values))
+
+    def test_huge_numbers(self):
+        """Test lots with numbers beyond 64-bit integers are read by all parsers the same way."""
+        input_values = ['2 2 8000', '1 alfa-05 100.0 100000000000000000000', f'{1 << 64} alfa-05 100.0 1',
+                        '2 gazprom-17 99.0 5']
+        with self.assertLogs(logger):
+            expected_output = run_main(input_values)
+        self.assertListEqual(expected_output, ['200', '2 gazprom-17 99.0 5'])
+        with tempfile.TemporaryDirectory() as directory:
+            for argv in [('--bulk',), ('--aggregate-errors',), ('--workers', '2'), ('--cache', directory)]:
+                with self.assertLogs(logger):
+                    self.assertListEqual(run_main(input_values, *argv), expected_output, argv)
+
+        data = TextIOWrapper(BytesIO())
+        with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', data), \
+                self.assertLogs(logger) as logs:
+            self.assertEqual(binary_main(['to-binary', 'mega-trader']), 1)
+        self.assertEqual(len(logs.output), 2)
+        out = StringIO()
+        with patch('sys.stdin', TextIOWrapper(BytesIO(data.buffer.getvalue()))), patch('sys.stdout', out):
+            main(['--input-format', 'binary'])
+        self.assertListEqual(out.getvalue().splitlines(), expected_output)
+
+    def test_aggregated_errors(self):
+        """Test errors are reported with counts and sample line numbers instead of line by line."""
+        input_values = (['2 2'] + self.input_values[:2] + ['1 alfa-05 100.2'] * 7 + self.input_values[2:])
+        for argv in [('--aggregate-errors',), ('--aggregate-errors', '--workers', '2')]:
+            with self.assertLogs(logger) as logs:
+                self.assertListEqual(run_main(input_values, *argv), self.expected_output)
+            self.assertListEqual(logs.output, [
+                'ERROR:test_skybonds.mega_trader.mega_trader:'
+                'Incorrect input. Should be of 3 values, e.g. "2 2 8000" (1 line: 1)',
+                'ERROR:test_skybonds.mega_trader.mega_trader:'
+                'Incorrect input. Should be of 4 values, e.g. "1 alfa-05 100.2 2" (7 lines: 4, 5, 6, 7, 8, ...)',
+                'ERROR:test_skybonds.mega_trader.mega_trader:'
+                'Bonds amount per day exceeded. Should be no more than 2 (1 line: 13)',
+                'ERROR:test_skybonds.mega_trader.mega_trader:Day out of range. Should be [1-2] (1 line: 14)',
+            ])
+
+    def test_instrumentation(self):
+        """Test instrumentation counts items of every stage and does not change the output."""
+        input_values = self.input_values[:5] + ['bad lot'] + self.input_values[5:]
+        argvs = [('--instrument',), ('--instrument', 'time', '--bulk'), ('--instrument', '--memory-budget', '1')]
+        for argv in argvs + ([('--instrument', '--columnar')] if numpy is not None else []):
+            err = StringIO()
+            with patch('sys.stderr', err), self.assertLogs(logger):
+                self.assertListEqual(run_main(input_values, *argv), self.expected_output)
+            summary = json.loads(err.getvalue())
+            self.assertEqual(summary['program'], 'mega_trader')
+            stages = {name: (stage['items'], stage['rejected']) for name, stage in summary['stages'].items()}
+            self.assertEqual(stages['parse'], (6, 1))
+            self.assertEqual(stages['add'], (4, 2))
+            self.assertEqual(stages['sort'], (4, 0), argv)
+            self.assertEqual(stages['purchase'], (2, 0))
+            self.assertEqual(stages['output'], (3, 0))
+            self.assertEqual(stages['evaluate_income'][0], 6, argv)
+            self.assertEqual(summary['stages']['purchase']['peak_memory'] is None, 'time' in argv)
+        self.assertIs(mega_trader.deserialize_lot, deserialize_lot)
+
+    def test_entry_point(self):
+        """Test the common entry point runs the trader, which imports only modules needed at startup."""
+        out = StringIO()
+        with patch('sys.stdin', StringIO('\n'.join(self.input_values))), patch('sys.stdout', out), \
+                self.assertLogs(logger):
+            self.assertEqual(entry_point_main(['mega-trader']), 0)
+        self.assertListEqual(out.getvalue().splitlines(), self.expected_output)
+        with patch('sys.stderr', StringIO()):
+            self.assertEqual(entry_point_main(['unknown']), 2)
+        self.assertListEqual(measure_import(main.__module__, repeat=1)[1], [])
+
+    def test_market_cache(self):
+        """Test cached markets give the same result and errors, are invalidated and evicted."""
+        input_values = self.input_values[:2] + ['1 alfa-05 100.2'] + self.input_values[2:]
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertLogs(logger) as bulk_logs:
+                run_main(input_values, '--bulk')
+            for _ in range(2):
+                with self.assertLogs(logger) as logs:
+                    self.assertListEqual(run_main(input_values, '--cache', directory), self.expected_output)
+                self.assertListEqual(logs.output, bulk_logs.output)
+
+            with patch.object(Market, 'BOND_RATING', 2000), self.assertLogs(logger):
+                self.assertListEqual(run_main(input_values, '--cache', directory), run_main(input_values))
+
+            # Inputs differing only in balance have cache files of the same size.
+            for balance in [300000, 400000]:
+                input_values = generate_input_values(2000, 50, 30, balance)
+                with self.assertLogs(logger):
+                    self.assertListEqual(run_main(input_values, '--cache', directory), run_main(input_values))
+            size = max(path.stat().st_size for path in Path(directory).iterdir())
+            with self.assertLogs(logger):
+                run_main(generate_input_values(2000, 50, 30, 500000), '--cache', directory, '--cache-size', str(size))
+            self.assertEqual(len(list(Path(directory).iterdir())), 1)
+
+    def test_streaming_market(self):
+        """Test streaming market evicting lots buys the same lots as the default one."""
+        self.assertListEqual(run_main(self.input_values, '--streaming'), self.expected_output)
+        with patch('test_skybonds.mega_trader.streaming.StreamingMarket.DEFAULT_CAPACITY', 8):
+            for balance in [1000, 30000, 3000000]:
+                input_values = generate_input_values(2000, 50, 30, balance)
+                self.assertListEqual(run_main(input_values, '--streaming'), run_main(input_values))
+
+    def test_external_market(self):
+        """Test external memory market spilling lots into many runs buys the same lots as the default one."""
+        self.assertListEqual(run_main(self.input_values, '--memory-budget', '1000000'), self.expected_output)
+        with tempfile.TemporaryDirectory() as directory:
+            for balance in [1000, 30000, 3000000]:
+                input_values = generate_input_values(2000, 50, 30, balance)
+                self.assertListEqual(run_main(input_values, '--memory-budget', '5000', '--spill-dir', directory),
+                                     run_main(input_values))
+
+        input_values = ['2 2 8000', '2 gazprom-17 99.0 5', '1 alfa-05 100.0 10000000000000',
+                        '1 alfa-05 100.0 100000000000000000000', '2 gazprom-17 99.0 1']
+        for memory_budget in ['1', '1000000']:
+            self.assertListEqual(run_main(input_values, '--memory-budget', memory_budget), run_main(input_values))
+
+    def test_binary_input(self):
+        """Test binary input converted from text gives the same lots, errors are logged with lot numbers."""
+        input_values = self.input_values[:2] + ['1 alfa-05 100.2'] + self.input_values[2:]
+        data = TextIOWrapper(BytesIO())
+        with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', data), \
+                self.assertLogs(logger) as conversion_logs:
+            self.assertEqual(binary_main(['to-binary', 'mega-trader']), 0)
+        self.assertEqual(len(conversion_logs.output), 1)
+
+        argvs = [(), ('--memory-budget', '1000'), ('--streaming',)] + ([('--columnar',)] if numpy is not None else [])
+        for argv in argvs:
+            out = StringIO()
+            with patch('sys.stdin', TextIOWrapper(BytesIO(data.buffer.getvalue()))), patch('sys.stdout', out), \
+                    self.assertLogs(binary_logger) as logs:
+                main(argv + ('--input-format', 'binary'))
+            self.assertListEqual(out.getvalue().splitlines(), self.expected_output, argv)
+            self.assertListEqual(logs.output, [
+                f'ERROR:{binary_logger.name}:Lot 4: Bonds amount per day exceeded. Should be no more than 2',
+                f'ERROR:{binary_logger.name}:Lot 5: Day out of range. Should be [1-2]',
+            ])
+
+        text = TextIOWrapper(BytesIO())
+        with patch('sys.stdin', TextIOWrapper(BytesIO(data.buffer.getvalue()))), patch('sys.stdout', text):
+            self.assertEqual(binary_main(['to-text', 'mega-trader']), 0)
+        self.assertListEqual(text.buffer.getvalue().decode().splitlines(), input_values[:2] + input_values[3:])
+
+        # Whole percents are converted into tenths, percents with digits below tenths can not be converted.
+        input_values = ['2 2 8000', '1 alfa-05 100.2 2', '2 gazprom-17 101.5 2', '2 alfa-05 98 2']
+        data = TextIOWrapper(BytesIO())
+        with patch('sys.stdin', StringIO('\n'.join(input_values))), patch('sys.stdout', data):
+            self.assertEqual(binary_main(['to-binary', 'mega-trader']), 0)
+        out = StringIO()
+        with patch('sys.stdin', TextIOWrapper(BytesIO(data.buffer.getvalue()))), patch('sys.stdout', out):
+            main(['--input-format', 'binary'])
+        self.assertListEqual(out.getvalue().splitlines(), ['188'] + input_values[1:3] + ['2 alfa-05 98.0 2'])
+
+        with patch('sys.stdin', StringIO('\n'.join(input_values + ['1 alfa-05 100.25 1']))), \
+                patch('sys.stdout', TextIOWrapper(BytesIO())), self.assertLogs(logger) as conversion_logs:
+            self.assertEqual(binary_main(['to-binary', 'mega-trader']), 1)
+        self.assertEqual(len(conversion_logs.output), 1)
+
+        with patch('sys.stdin', TextIOWrapper(BytesIO(data.buffer.getvalue()[:-1]))), patch('sys.stdout', StringIO()), \
+                self.assertLogs(binary_logger) as logs:
+            main(['--input-format', 'binary'])
+        self.assertEqual(len(logs.output), 1)
+
+    def test_day_index(self):
+        """Test queries of lots issued within ranges of days match filtering of ranked lots."""
+        market = Market(50, 30)
+        for value in generate_input_values(2000, 50, 30, 0)[1:]:
+            try:
+                market.add(deserialize_lot(value))
+            except Market.InapplicableSlot:
+                pass
+        ranked_lots = list(market.ranked_lots())
+        index = market.day_index()
+
+        self.assertListEqual(index.best_lots(10, 20, 15), [lot for lot in ranked_lots if 10 <= lot.day <= 20][:15])
+        self.assertListEqual(index.best_lots(51, 60, 5), [])
+        for day in [0, 1, 25, 50]:
+            lots = [lot for lot in ranked_lots if lot.day <= day]
+            self.assertEqual(index.income_until(day), sum(map(market.evaluate_income, lots)))
+            trader_market = Market(50, 30)
+            trader_market.lots = lots
+            trader = MegaTrader(300000)
+            trader.buy_lots(trader_market)
+            self.assertEqual(index.income_until(day, 300000), sum(map(market.evaluate_income, trader.lots)))
+
+    def test_fixed_point_prices(self):
+        """Test prices are exact and percents of any precision are read and written the way the Decimal version did."""
+        input_values = [
+            '3 2 2004.999',
+            '1 alfa-05 100.2 2',  # Costs 2004 exactly.
+            '3 gazprom-17 100.3 1',  # Must be skipped because trader can not afford it.
+        ]
+        self.assertListEqual(run_main(input_values), ['60', '1 alfa-05 100.2 2'])
+
+        input_values = [
+            '3 3 6010',
+            '1 alfa-05 100.2 2',
+            '1 alfa-05 100.25 1',
+            '2 gazprom-17 100 1',
+            '2 gazprom-17 1E+2 1',
+            '3 gazprom-17 99.1234 1',
+            '3 alfa-05 100.30 1',  # Must be skipped because trader can not afford it.
+        ]
+        expected_output = ['190'] + input_values[1:6]
+        argvs = [(), ('--bulk',), ('--streaming',), ('--memory-budget', '1'), ('--workers', '2'), ('--solver', 'exact')]
+        for argv in argvs + ([('--columnar',)] if numpy is not None else []):
+            self.assertListEqual(run_main(input_values, *argv), expected_output, argv)
+        with self.assertLogs(logger) as logs:
+            self.assertListEqual(run_main(['1 1 1000', '1 alfa-05 -1.0 1', '1 alfa-05 NaN 1']), ['0'])
+        self.assertEqual(len(logs.output), 2)
+
+    def test_sharded_market(self):
+        """Test parsing lots in worker processes gives the same result and errors as sequential reading."""
+        input_values = self.input_values[:2] + ['1 alfa-05 100.2'] + self.input_values[2:]
+        with patch('test_skybonds.mega_trader.parallel.MIN_CHUNK_SIZE', 20), self.assertLogs(logger) as logs:
+            self.assertListEqual(run_main(input_values, '--workers', '2'), self.expected_output)
+        with self.assertLogs(logger) as bulk_logs:
+            run_main(input_values, '--bulk')
+        self.assertListEqual(logs.output, bulk_logs.output)
+
+        input_values = generate_input_values(2000, 50, 30, 300000)
+        with patch('test_skybonds.mega_trader.parallel.MIN_CHUNK_SIZE', 1000):
+            self.assertListEqual(run_main(input_values, '--workers', '2'), run_main(input_values))
+
+    def test_online_market(self):
+        """Test the online trader keeps the same plan as the greedy one after every issued lot."""
+        days, lots_per_day, balance = 50, 30, 300000000
+        market, online_market = Market(days, lots_per_day), OnlineMarket(days, lots_per_day)
+        online_trader = OnlineMegaTrader(balance)
+        with patch('test_skybonds.mega_trader.online.OnlineMarket.BLOCK_SIZE', 4):
+            for line in generate_input_values(500, days, lots_per_day, balance)[1:]:
+                lot = deserialize_lot(line)
+                try:
+                    market.add(lot)
+                except Market.InapplicableSlot:
+                    continue
+                online_market.add(lot)
+                expected_lots = MegaTrader(balance).buy_lots(market)
+                self.assertListEqual(online_trader.buy_lots(online_market), expected_lots)
+                self.assertEqual(online_trader.income, sum(map(market.evaluate_income, expected_lots)))
+
+    def test_scenarios(self):
+        """Test every scenario gives the same result as the main program with the same initial data."""
+        lots = generate_input_values(500, 50, 30, 0)[1:]
+        scenarios = ['50 30 300000', '10 2 1000.5', '50 30 0', '60 1 5000', '10 2 40000']
+        with tempfile.NamedTemporaryFile('w') as scenarios_file:
+            scenarios_file.write('\n'.join(scenarios))
+            scenarios_file.flush()
+            out = StringIO()
+            with patch('sys.stdin', StringIO('\n'.join(['1 1 1'] + lots))), patch('sys.stdout', out):
+                scenarios_main([scenarios_file.name, '--workers', '2'])
+            entry_point_out = StringIO()
+            with patch('sys.stdin', StringIO('\n'.join(['1 1 1'] + lots))), patch('sys.stdout', entry_point_out):
+                self.assertEqual(entry_point_main(['scenarios', scenarios_file.name]), 0)
+
+        with self.assertLogs(logger):
+            expected_output = [run_main([scenario] + lots) for scenario in scenarios]
+        self.assertEqual(out.getvalue(), '\n\n'.join('\n'.join(output) for output in expected_output) + '\n')
+        self.assertEqual(entry_point_out.getvalue(), out.getvalue())
+        self.assertListEqual(measure_import(scenarios_main.__module__, repeat=1)[1], [])
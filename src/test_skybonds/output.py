@@ -0,0 +1,112 @@
+"""Buffered output shared by all programs.
+
+Lines are joined into large chunks and written to the binary buffer of standard output as bytes,
+so there is no write call and no flush check per line. Numbers can be written as raw binary values
+in native byte order instead of text.
+"""
+from __future__ import annotations
+
+import sys
+from array import array
+from itertools import islice
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import BinaryIO, Iterable, Iterator, Optional, TextIO, Union
+
+#: Amount of lines or numbers joined into one chunk.
+CHUNK_SIZE: int = 1 << 14
+#: Binary formats of numbers and their array typecodes.
+BINARY_FORMATS = {'float64': 'd', 'int64': 'q'}
+
+
+def chunks(values: Iterable, size: int = CHUNK_SIZE) -> Iterator[list]:
+    """Split values into chunks.
+
+    :param values: Values.
+    :param size: Amount of values in a chunk.
+    :return: Lists of values.
+    """
+    iterator: Iterator = iter(values)
+    while True:
+        chunk: list = list(islice(iterator, size))
+        if not chunk:
+            break
+        yield chunk
+
+
+class BulkWriter:
+    """Writer of standard output batching lines into large chunks.
+
+    It writes bytes to the binary buffer of the stream if there is one, otherwise text is written
+    to the stream itself.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None) -> None:
+        """Initialize an instance.
+
+        :param stream: Text stream, standard output by default.
+        """
+        self.stream: TextIO = stream if stream is not None else sys.stdout
+        self.buffer: Optional[BinaryIO] = getattr(self.stream, 'buffer', None)
+        if self.buffer is not None:
+            # Text written before should not go after bytes.
+            self.stream.flush()
+
+    def __enter__(self) -> 'BulkWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
+
+    def write_bytes(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        """Write bytes, it requires the stream to have a binary buffer.
+
+        :param data: Data.
+        """
+        if self.buffer is None:
+            raise ValueError('Binary output requires a stream with a binary buffer')
+        self.buffer.write(data)
+
+    def write_text(self, text: str) -> None:
+        """Write text.
+
+        :param text: Text.
+        """
+        if self.buffer is not None:
+            self.buffer.write(text.encode())
+        else:
+            self.stream.write(text)
+
+    def write_encoded(self, data: bytes) -> None:
+        """Write encoded text, it is decoded only if the stream has no binary buffer.
+
+        :param data: UTF-8 encoded text.
+        """
+        if self.buffer is not None:
+            self.buffer.write(data)
+        else:
+            self.stream.write(data.decode())
+
+    def write_lines(self, lines: Iterable[str]) -> None:
+        """Write lines joining them into chunks.
+
+        :param lines: Lines without line feeds.
+        """
+        for chunk in chunks(lines):
+            chunk.append('')
+            self.write_text('\n'.join(chunk))
+
+    def write_numbers(self, numbers: Iterable[Union[int, float]], binary_format: str) -> None:
+        """Write numbers as raw binary values.
+
+        :param numbers: Numbers.
+        :param binary_format: Format, one of BINARY_FORMATS.
+        """
+        typecode: str = BINARY_FORMATS[binary_format]
+        for chunk in chunks(numbers):
+            self.write_bytes(array(typecode, chunk).tobytes())
+
+    def flush(self) -> None:
+        """Flush the stream."""
+        (self.buffer if self.buffer is not None else self.stream).flush()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""Long-running service running programs for many clients.
+
+Starting an interpreter per job costs more than small jobs themselves, so the service keeps
+worker processes with all programs imported and runs jobs sent over a Unix socket or TCP, e.g.
+
+    python -m test_skybonds.service serve --socket /tmp/skybonds.sock --workers 4
+    python -m test_skybonds.service client --socket /tmp/skybonds.sock mega-trader --bulk < input.txt
+
+A job is a frame with a header of two unsigned 32-bit big-endian integers, sizes of command line
+arguments and input, followed by arguments joined with NUL characters (the first one is a program
+command of python -m test_skybonds) and input bytes. A response is a frame with a header of a signed
+32-bit exit code, unsigned 32-bit sizes of output and standard error and an unsigned 64-bit job
+latency in microseconds, followed by output and standard error. Output is exactly what the program
+prints when it is started from the command line. The stats command gives latency metrics of jobs
+by programs as JSON.
+
+Jobs of a connection are run one by one in order, every connection waits for a free worker when
+the limit of running jobs is reached and the service does not read further frames meanwhile.
+Clients may pass only options which do not touch the file system of the service or start processes,
+e.g. --cache, --memory-budget (it spills lots into temporary files), --spill-dir and --workers are rejected.
+Connections sending arguments larger than 64 KiB or input larger than the limit of the service are closed.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import struct
+import sys
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from importlib import import_module
+from time import perf_counter
+from typing import Deque, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from .__main__ import COMMANDS
+
+#: Header of a job: sizes of arguments and input.
+REQUEST_HEADER = struct.Struct('!II')
+#: Header of a response: exit code, sizes of output and standard error, latency in microseconds.
+RESPONSE_HEADER = struct.Struct('!iIIQ')
+#: Commands of programs the service runs.
+PROGRAMS: Tuple[str, ...] = ('mega-trader', 'fractions', 'fractions-decimal')
+#: Options of programs clients may pass.
+ALLOWED_OPTIONS: Dict[str, FrozenSet[str]] = {
+    'mega-trader': frozenset({'-h', '--help', '--columnar', '--bulk', '--solver', '--streaming', '--aggregate-errors',
+                              '--input-format', '--instrument'}),
+    'fractions': frozenset({'-h', '--help', '--vectorized', '--two-pass', '--aggregate-errors', '--binary',
+                            '--input-format', '--instrument'}),
+    'fractions-decimal': frozenset({'-h', '--help', '--integer', '--two-pass', '--aggregate-errors', '--binary',
+                                    '--input-format', '--instrument'}),
+}
+#: Command giving metrics of jobs.
+STATS_COMMAND: str = 'stats'
+#: Limit of job arguments size in bytes.
+MAX_ARGUMENTS_SIZE: int = 1 << 16
+#: Default limit of job input size in bytes.
+DEFAULT_MAX_INPUT_SIZE: int = 1 << 30
+#: Amount of latest job latencies of a program kept for percentiles.
+LATENCY_WINDOW: int = 10000
+
+
+def warm_up() -> None:
+    """Import modules of all programs, so the first jobs of a worker do not pay for imports."""
+    for command in PROGRAMS:
+        import_module(COMMANDS[command])
+
+
+def check_arguments(argv: Sequence[str]) -> Optional[str]:
+    """Check that a job passes only allowed options to its program.
+
+    Abbreviated options are not allowed either, so arguments starting with a dash should be allowed options exactly.
+    :param argv: Program command and its arguments.
+    :return: Error message or None if the arguments are allowed.
+    """
+    command, *arguments = argv
+    for argument in arguments:
+        option: str = argument.split('=', 1)[0]
+        if option.startswith('-') and option not in ALLOWED_OPTIONS[command]:
+            return f'Option {option} is not allowed, it should be one of {", ".join(sorted(ALLOWED_OPTIONS[command]))}'
+    return None
+
+
+def run_job(argv: Sequence[str], data: bytes) -> Tuple[int, bytes, bytes]:
+    """Run a program with given input the way it runs from the command line.
+
+    Standard streams are replaced while the program runs, so jobs are run one by one in a process.
+    :param argv: Program command and its arguments.
+    :param data: Input.
+    :return: Exit code, output and standard error.
+    """
+    command, *arguments = argv
+    stdin = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8')
+    stdout = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+    stderr = io.StringIO()
+    streams = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+    try:
+        code: int = import_module(COMMANDS[command]).main(arguments) or 0
+    except EOFError as exc:
+        print(exc, file=sys.stderr)
+        code = 1
+    except SystemExit as exit_request:
+        if exit_request.code is None or isinstance(exit_request.code, int):
+            code = exit_request.code or 0
+        else:
+            print(exit_request.code, file=sys.stderr)
+            code = 1
+    except Exception:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = streams
+    stdout.flush()
+    return code, stdout.buffer.getvalue(), stderr.getvalue().encode()
+
+
+class Metrics:
+    """Latencies of jobs by programs."""
+
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        """Initialize an instance.
+
+        :param window: Amount of latest latencies of a program kept for percentiles.
+        """
+        self.window: int = window
+        self.jobs: Dict[str, int] = {}
+        self.failed: Dict[str, int] = {}
+        self.latencies: Dict[str, Deque[float]] = {}
+        #: Jobs waiting for a free worker and running ones.
+        self.waiting: int = 0
+        self.running: int = 0
+
+    def record(self, command: str, seconds: float, code: int) -> None:
+        """Record a finished job.
+
+        :param command: Program command.
+        :param seconds: Latency from receiving the job to having its result.
+        :param code: Exit code.
+        """
+        self.jobs[command] = self.jobs.get(command, 0) + 1
+        if code:
+            self.failed[command] = self.failed.get(command, 0) + 1
+        self.latencies.setdefault(command, deque(maxlen=self.window)).append(seconds)
+
+    def summary(self) -> Dict[str, object]:
+        """Summarize metrics.
+
+        :return: Amounts of waiting and running jobs and amounts of jobs, failed ones and latency percentiles
+            in milliseconds by programs.
+        """
+        programs: Dict[str, Dict[str, float]] = {}
+        for command, latencies in self.latencies.items():
+            ordered: List[float] = sorted(latencies)
+            programs[command] = {
+                'jobs': self.jobs[command], 'failed': self.failed.get(command, 0),
+                'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+                **{f'p{percent}_ms': round(ordered[min(len(ordered) - 1, len(ordered) * percent // 100)] * 1000, 3)
+                   for percent in (50, 95, 99)},
+                'max_ms': round(ordered[-1] * 1000, 3),
+            }
+        return {'waiting': self.waiting, 'running': self.running, 'programs': programs}
+
+
+class Service:
+    """Service running jobs of clients in a pool of worker processes."""
+
+    def __init__(self, workers: Optional[int] = None, max_jobs: Optional[int] = None,
+                 max_input_size: int = DEFAULT_MAX_INPUT_SIZE) -> None:
+        """Initialize an instance.
+
+        :param workers: Amount of worker processes, amount of CPUs by default, jobs are run in the service process
+            blocking other clients if it is 0.
+        :param max_jobs: Limit of jobs given to workers at once, twice the amount of workers by default,
+            so a worker gets its next job without waiting for the service.
+        :param max_input_size: Limit of job input size in bytes, connections sending larger jobs are closed.
+        """
+        workers = (os.cpu_count() or 1) if workers is None else workers
+        self.executor: Optional[ProcessPoolExecutor] = (
+            ProcessPoolExecutor(max_workers=workers, initializer=warm_up) if workers else None)
+        self.slots = asyncio.Semaphore(max_jobs or 2 * max(workers, 1))
+        self.max_input_size: int = max_input_size
+        self.metrics = Metrics()
+        if self.executor is None:
+            warm_up()
+
+    async def run(self, argv: Sequence[str], data: bytes) -> Tuple[int, bytes, bytes]:
+        """Run a job.
+
+        :param argv: Program command and its arguments.
+        :param data: Input.
+        :return: Exit code, output and standard error.
+        """
+        if not argv or argv[0] not in PROGRAMS + (STATS_COMMAND,):
+            return 2, b'', f'Unknown command, should be one of {", ".join(PROGRAMS + (STATS_COMMAND,))}\n'.encode()
+        if argv[0] == STATS_COMMAND:
+            return 0, (json.dumps(self.metrics.summary()) + '\n').encode(), b''
+        error: Optional[str] = check_arguments(argv)
+        if error is not None:
+            return 2, b'', f'{error}\n'.encode()
+
+        self.metrics.waiting += 1
+        async with self.slots:
+            self.metrics.waiting -= 1
+            self.metrics.running += 1
+            try:
+                if self.executor is None:
+                    return run_job(argv, data)
+                return await asyncio.get_running_loop().run_in_executor(self.executor, run_job, list(argv), data)
+            finally:
+                self.metrics.running -= 1
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Run jobs of a connection until the client closes it.
+
+        :param reader: Connection reader.
+        :param writer: Connection writer.
+        """
+        try:
+            while True:
+                try:
+                    header: bytes = await reader.readexactly(REQUEST_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                arguments_size, input_size = REQUEST_HEADER.unpack(header)
+                if arguments_size > MAX_ARGUMENTS_SIZE or input_size > self.max_input_size:
+                    break
+                argv: List[str] = (await reader.readexactly(arguments_size)).decode().split('\0')
+                data: bytes = await reader.readexactly(input_size)
+
+                start: float = perf_counter()
+                code, output, errors = await self.run(argv, data)
+                latency: float = perf_counter() - start
+                if argv[0] in PROGRAMS:
+                    self.metrics.record(argv[0], latency, code)
+                writer.write(RESPONSE_HEADER.pack(code, len(output), len(errors), round(latency * 1e6)))
+                writer.write(output)
+                writer.write(errors)
+                # The client should read responses before the service reads its further jobs.
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, UnicodeDecodeError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, path: Optional[str] = None, host: Optional[str] = None,
+                    port: int = 0) -> asyncio.AbstractServer:
+        """Start accepting connections.
+
+        :param path: Path of a Unix socket, TCP is used if it is not given.
+        :param host: TCP host, all interfaces by default.
+        :param port: TCP port, a free one is taken by default.
+        :return: Server.
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self) -> None:
+        """Stop worker processes."""
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, argv: Sequence[str],
+                  data: bytes) -> Tuple[int, bytes, bytes, float]:
+    """Run a job by the service.
+
+    :param reader: Connection reader.
+    :param writer: Connection writer.
+    :param argv: Program command and its arguments.
+    :param data: Input.
+    :return: Exit code, output, standard error and job latency in seconds.
+    """
+    arguments: bytes = '\0'.join(argv).encode()
+    writer.write(REQUEST_HEADER.pack(len(arguments), len(data)))
+    writer.write(arguments)
+    writer.write(data)
+    await writer.drain()
+    code, output_size, errors_size, latency = RESPONSE_HEADER.unpack(await reader.readexactly(RESPONSE_HEADER.size))
+    output: bytes = await reader.readexactly(output_size)
+    errors: bytes = await reader.readexactly(errors_size)
+    return code, output, errors, latency / 1e6
+
+
+async def open_connection(path: Optional[str] = None, host: Optional[str] = None,
+                          port: int = 0) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Connect to the service.
+
+    :param path: Path of a Unix socket, TCP is used if it is not given.
+    :param host: TCP host.
+    :param port: TCP port.
+    :return: Connection reader and writer.
+    """
+    if path is not None:
+        return await asyncio.open_unix_connection(path)
+    return await asyncio.open_connection(host, port)
+
+
+async def serve_forever(arguments: argparse.Namespace) -> None:
+    """Run the service until it is interrupted.
+
+    :param arguments: Parsed arguments.
+    """
+    service = Service(arguments.workers, arguments.max_jobs, arguments.max_input_size)
+    try:
+        server: asyncio.AbstractServer = await service.serve(arguments.socket, arguments.host, arguments.port)
+        async with server:
+            print(f'Serving on {", ".join(str(socket.getsockname()) for socket in server.sockets)}', file=sys.stderr)
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+async def run_client(arguments: argparse.Namespace) -> int:
+    """Run a job of standard input printing its output.
+
+    :param arguments: Parsed arguments.
+    :return: Exit code of the job.
+    """
+    reader, writer = await open_connection(arguments.socket, arguments.host, arguments.port)
+    try:
+        code, output, errors, _ = await request(reader, writer, arguments.argv, sys.stdin.buffer.read())
+    finally:
+        writer.close()
+    sys.stderr.buffer.write(errors)
+    sys.stdout.buffer.write(output)
+    return code
+
+
+def parse_arguments(argv: Sequence[str]) -> argparse.Namespace:
+    """Parse command line arguments.
+
+    :param argv: Command line arguments without the program name.
+    :return: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help='run the service')
+    client_parser = commands.add_parser('client', help='run a job of standard input')
+    for command_parser in (serve_parser, client_parser):
+        command_parser.add_argument('--socket', help='path of a Unix socket, TCP is used if it is not given')
+        command_parser.add_argument('--host', default='127.0.0.1')
+        command_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--workers', type=int, help='amount of worker processes, amount of CPUs by default')
+    serve_parser.add_argument('--max-jobs', type=int, help='limit of jobs given to workers at once')
+    serve_parser.add_argument('--max-input-size', type=int, default=DEFAULT_MAX_INPUT_SIZE,
+                              help='limit of job input size in bytes')
+    client_parser.add_argument('argv', nargs=argparse.REMAINDER,
+                               help=f'program command ({", ".join(PROGRAMS + (STATS_COMMAND,))}) and its arguments')
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] = ()) -> int:
+    """Execute main program flow.
+
+    :param argv: Command line arguments without the program name.
+    :return: Exit code.
+    """
+    arguments: argparse.Namespace = parse_arguments(argv)
+    if arguments.command == 'serve':
+        asyncio.run(serve_forever(arguments))
+        return 0
+    return asyncio.run(run_client(arguments))
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except KeyboardInterrupt:
+        exit(0)
@@ -0,0 +1,62 @@
+import copy
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import TestCase
+from unittest.mock import patch
+
+from test_skybonds.benchmarks import BENCHMARKS, LARGE_SIZES, STAGES, compare, main, parse_arguments, run
+
+
+class BenchmarksTestCase(TestCase):
+    def test_compare(self):
+        """Test reports round-trip through JSON and slower or larger stages are reported as regressions."""
+        report = run(sorted(BENCHMARKS), [200], seed=1, repeat=1)
+        self.assertEqual(len(report['results']), len(BENCHMARKS))
+        for result in report['results']:
+            self.assertSetEqual(set(result['stages']), set(STAGES))
+        loaded = json.loads(json.dumps(report))
+        self.assertDictEqual(loaded, report)
+        self.assertListEqual(compare(loaded, report, 0.1), [])
+
+        loaded['results'][0]['stages']['compute']['time'] = 0.01
+        loaded['results'][1]['stages']['parse']['peak_memory'] = 10000
+        current = copy.deepcopy(loaded)
+        current['results'][0]['stages']['compute']['time'] = 0.02
+        current['results'][1]['stages']['parse']['peak_memory'] = 20000
+        regressions = compare(loaded, current, 0.1)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith(f'{report["results"][0]["benchmark"]} size 200 compute time:'))
+        self.assertTrue(regressions[1].startswith(f'{report["results"][1]["benchmark"]} size 200 parse peak_memory:'))
+        self.assertListEqual(compare(loaded, current, 10), [])
+
+        # Times below the noise level and results missing in the baseline are not compared.
+        current = copy.deepcopy(loaded)
+        for result in current['results']:
+            result['stages']['output']['time'] = 0.0005
+            result['size'] = 300
+        self.assertListEqual(compare(loaded, current, 0.1), [])
+
+    def test_main(self):
+        """Test reports written by the run command are compared by the compare command."""
+        with tempfile.TemporaryDirectory() as directory:
+            baseline, current = os.path.join(directory, 'baseline.json'), os.path.join(directory, 'current.json')
+            with patch('sys.stdout', StringIO()) as out:
+                self.assertEqual(main(['run', '--benchmarks', 'mega_trader', '--sizes', '100', '--repeat', '1',
+                                       '--output', baseline]), 0)
+            self.assertIn('mega_trader', out.getvalue())
+            with open(baseline) as report_file:
+                report = json.load(report_file)
+            report['results'][0]['stages']['compute']['time'] = 1.0
+            with open(current, 'w') as report_file:
+                json.dump(report, report_file)
+
+            with patch('sys.stdout', StringIO()) as out:
+                self.assertEqual(main(['compare', baseline, baseline]), 0)
+                self.assertEqual(main(['compare', baseline, current]), 1)
+            self.assertTrue(out.getvalue().startswith('Regression: mega_trader size 100 compute time:'))
+
+        arguments = parse_arguments(['run', '--large'])
+        self.assertTrue(arguments.large)
+        self.assertTrue(set(LARGE_SIZES).isdisjoint(arguments.sizes))
@@ -0,0 +1,94 @@
+import asyncio
+import json
+from unittest import TestCase
+
+from test_skybonds.mega_trader.mega_trader import logger
+from test_skybonds.mega_trader.test_mega_trader import generate_input_values, run_main
+from test_skybonds.service import MAX_ARGUMENTS_SIZE, REQUEST_HEADER, Service, open_connection, request
+
+
+class ServiceTestCase(TestCase):
+    def test_service(self):
+        """Test the service runs jobs of concurrent clients giving the output of the main program."""
+        lots = generate_input_values(300, 10, 5, 20000)
+        with self.assertLogs(logger):
+            expected_output = run_main(lots)
+        data = '\n'.join(lots).encode()
+
+        async def run_client(port):
+            reader, writer = await open_connection(port=port, host='127.0.0.1')
+            responses = [await request(reader, writer, argv, data)
+                         for argv in [['mega-trader'], ['mega-trader', '--bulk']]]
+            responses.append(await request(reader, writer, ['fractions'], b'2\n1.5\n0.5\n'))
+            writer.close()
+            await writer.wait_closed()
+            return responses
+
+        async def run_service(workers):
+            service = Service(workers=workers)
+            server = await service.serve(host='127.0.0.1')
+            try:
+                port = server.sockets[0].getsockname()[1]
+                clients = await asyncio.gather(*(run_client(port) for _ in range(3)))
+                reader, writer = await open_connection(port=port, host='127.0.0.1')
+                unknown = await request(reader, writer, ['unknown'], b'')
+                stats = json.loads((await request(reader, writer, ['stats'], b''))[1])
+                writer.close()
+                await writer.wait_closed()
+            finally:
+                server.close()
+                await server.wait_closed()
+                service.close()
+            return clients, unknown, stats
+
+        for workers in [0, 1]:
+            clients, unknown, stats = asyncio.run(run_service(workers))
+            for responses in clients:
+                for code, output, errors, _ in responses[:2]:
+                    self.assertEqual(code, 0)
+                    self.assertListEqual(output.decode().splitlines(), expected_output)
+                    self.assertTrue(errors)
+                self.assertEqual(responses[2][:3], (0, b'0.750\n0.250\n', b''))
+            self.assertEqual(unknown[0], 2)
+            self.assertEqual(stats['programs']['mega-trader']['jobs'], 6)
+            self.assertEqual(stats['programs']['fractions']['failed'], 0)
+
+    def test_invalid_jobs(self):
+        """Test truncated jobs end with an error, jobs with not allowed options or large arguments are rejected."""
+        async def run_service():
+            service = Service(workers=1)
+            server = await service.serve(host='127.0.0.1')
+            try:
+                reader, writer = await open_connection(port=server.sockets[0].getsockname()[1], host='127.0.0.1')
+                truncated = [await asyncio.wait_for(request(reader, writer, argv, data), 30)
+                             for argv, data in [(['fractions'], b''), (['fractions'], b'3\n1\n'),
+                                                (['fractions-decimal'], b'2\n'), (['mega-trader'], b'')]]
+                rejected = [await request(reader, writer, argv, b'2 2 8000\n')
+                            for argv in [['mega-trader', '--cache', '/tmp'], ['mega-trader', '--spill-dir=/tmp'],
+                                         ['mega-trader', '--memory-budget', '1000'],
+                                         ['mega-trader', '--workers', '2'], ['fractions', '--work', '2']]]
+                allowed = await request(reader, writer, ['mega-trader', '--solver', 'exact', '--bulk'], b'2 2 8000\n')
+                writer.close()
+                await writer.wait_closed()
+
+                # Frames with too large arguments are not read, the connection is closed.
+                reader, writer = await open_connection(port=server.sockets[0].getsockname()[1], host='127.0.0.1')
+                writer.write(REQUEST_HEADER.pack(MAX_ARGUMENTS_SIZE + 1, 0))
+                closed = await asyncio.wait_for(reader.read(), 30)
+                writer.close()
+                await writer.wait_closed()
+            finally:
+                server.close()
+                await server.wait_closed()
+                service.close()
+            return truncated, rejected, allowed, closed
+
+        truncated, rejected, allowed, closed = asyncio.run(run_service())
+        for code, output, errors, _ in truncated:
+            self.assertEqual(code, 1)
+            self.assertTrue(errors.startswith(b'Unexpected end of input.'), errors)
+        for code, output, errors, _ in rejected:
+            self.assertEqual((code, output), (2, b''))
+            self.assertIn(b'is not allowed', errors)
+        self.assertEqual(allowed[:3], (0, b'0\n', b''))
+        self.assertEqual(closed, b'')
@@ -0,0 +1,28 @@
+from unittest import TestCase
+
+from test_skybonds.mega_trader.mega_trader import logger
+from test_skybonds.mega_trader.test_mega_trader import run_main
+from test_skybonds.workloads import generate, write_fractions_input, write_mega_trader_input
+
+
+class WorkloadsTestCase(TestCase):
+    def test_workloads(self):
+        """Test generated inputs are reproducible and have requested invalid and rejected lots."""
+        data = generate(write_mega_trader_input, 3000, seed=1, days=10, saturation=2, invalid=0.1, names=5)
+        self.assertEqual(data, generate(write_mega_trader_input, 3000, seed=1, days=10, saturation=2, invalid=0.1,
+                                        names=5))
+        self.assertNotEqual(data, generate(write_mega_trader_input, 3000, seed=2, days=10, saturation=2, invalid=0.1,
+                                           names=5))
+        lines = data.splitlines()
+        self.assertEqual(lines[0], '10 150 30000000')
+        self.assertEqual(len({line.split()[1] for line in lines[1:]}), 5)
+        with self.assertLogs(logger) as logs:
+            self.assertTrue(run_main(lines, '--aggregate-errors'))
+        invalid, exceeded = (int(line.split('(')[1].split()[0]) for line in logs.output)
+        self.assertTrue(200 < invalid < 400)
+        self.assertEqual(exceeded, 3000 - invalid - 1500)
+
+        fractions = generate(write_fractions_input, 1000, seed=1, invalid=0.5).split()
+        self.assertEqual(fractions[0], '1000')
+        self.assertEqual(len([fraction for fraction in fractions[1:] if fraction != '0.000']), 1000)
+        self.assertTrue(400 < fractions.count('0.000') < 600)
@@ -0,0 +1,64 @@
+"""Aggregated reports of input errors shared by all programs.
+
+Bulk readers classify all lines at once and collect errors into a report instead of logging
+every invalid line, so dirty input costs a counter increment per line and a log record per kind
+of error.
+"""
+import logging
+from typing import Dict, Iterable, List, Tuple
+
+#: Amount of line numbers kept as samples of every error.
+SAMPLE_SIZE: int = 5
+
+
+class ErrorReport:
+    """Errors counted by message with first line numbers of every one."""
+
+    def __init__(self, sample_size: int = SAMPLE_SIZE) -> None:
+        """Initialize an instance.
+
+        :param sample_size: Amount of line numbers kept as samples of every error.
+        """
+        self.sample_size: int = sample_size
+        #: Counts of errors by messages in order of their first occurrence.
+        self.counts: Dict[str, int] = {}
+        self.samples: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    def add(self, line_number: int, message: str) -> None:
+        """Add an error.
+
+        :param line_number: Number of the input line counted from 1.
+        :param message: Error message.
+        """
+        count: int = self.counts.get(message, 0)
+        self.counts[message] = count + 1
+        if count < self.sample_size:
+            self.samples.setdefault(message, []).append(line_number)
+
+    def extend(self, errors: Iterable[Tuple[int, str]]) -> None:
+        """Add errors.
+
+        :param errors: Pairs of line number and message.
+        """
+        for line_number, message in errors:
+            self.add(line_number, message)
+
+    def format(self) -> List[str]:
+        """Format the report.
+
+        :return: A line for every error message.
+        """
+        return [f'{message} ({count} line{"s" if count > 1 else ""}: '
+                f'{", ".join(map(str, self.samples[message]))}{", ..." if count > self.sample_size else ""})'
+                for message, count in self.counts.items()]
+
+    def log(self, logger: logging.Logger) -> None:
+        """Log the report with a record for every error message.
+
+        :param logger: Logger.
+        """
+        for line in self.format():
+            logger.error(line)
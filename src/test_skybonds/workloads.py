@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Seeded generators of large inputs of all programs.
+
+Inputs are generated in chunks of lines: random columns of a chunk are drawn at once with NumPy
+if it is installed (random.Random otherwise), bond names and percents are taken from tables and
+the whole chunk is formatted by one formatting operation and written to a binary stream, so
+inputs of hundreds of millions of lines are generated with memory of one chunk, e.g.
+
+    python -m test_skybonds.workloads mega-trader 100000000 --seed 1 --invalid 0.01 --output lots.txt
+    python -m test_skybonds.workloads fractions 10000000 --skew 3 --output fractions.txt
+
+The same seed gives the same input with the same random backend, NumPy and random.Random give
+different inputs.
+"""
+import argparse
+import random
+import sys
+from io import BytesIO
+from itertools import chain
+from typing import BinaryIO, Callable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#: Random backend, inputs generated with the same seed are the same only with the same backend.
+BACKEND: str = 'numpy' if np is not None else 'random'
+#: Amount of lines generated at once.
+CHUNK_SIZE: int = 1 << 16
+#: Price percents which do not match the input format, lines with them are invalid.
+INVALID_PERCENTS: List[str] = ['100,2', 'abc', '-1.0']
+
+
+class RandomColumns:
+    """Random columns drawn by NumPy or by random.Random if it is not installed."""
+
+    def __init__(self, seed: int) -> None:
+        """Initialize an instance.
+
+        :param seed: Random seed.
+        """
+        self.generator = np.random.default_rng(seed) if np is not None else random.Random(seed)
+
+    def integers(self, low: int, high: int, amount: int) -> List[int]:
+        """Draw uniformly distributed integers.
+
+        :param low: The least value.
+        :param high: The greatest value.
+        :param amount: Amount of values.
+        :return: Values.
+        """
+        if np is not None:
+            return self.generator.integers(low, high, amount, endpoint=True).tolist()
+        randrange = self.generator.randrange
+        return [randrange(low, high + 1) for _ in range(amount)]
+
+    def skewed(self, low: int, high: int, skew: float, amount: int) -> List[int]:
+        """Draw integers skewed to the least value.
+
+        :param low: The least value.
+        :param high: The greatest value.
+        :param skew: Power of uniform values in [0, 1), 1 gives the uniform distribution and greater ones skew to low.
+        :param amount: Amount of values.
+        :return: Values.
+        """
+        if skew == 1:
+            return self.integers(low, high, amount)
+        if np is not None:
+            return (low + (self.generator.random(amount) ** skew * (high - low + 1)).astype(np.int64)).tolist()
+        uniform = self.generator.random
+        return [low + int(uniform() ** skew * (high - low + 1)) for _ in range(amount)]
+
+    def choices(self, probability: float, amount: int) -> List[bool]:
+        """Draw random events.
+
+        :param probability: Probability of an event.
+        :param amount: Amount of trials.
+        :return: Whether every event has happened.
+        """
+        if np is not None:
+            return (self.generator.random(amount) < probability).tolist()
+        uniform = self.generator.random
+        return [uniform() < probability for _ in range(amount)]
+
+
+def write_mega_trader_input(stream: BinaryIO, size: int, seed: int = 0, days: Optional[int] = None,
+                            saturation: Optional[float] = None, balance: Optional[int] = None,
+                            min_percent: int = 900, max_percent: int = 1109, skew: float = 1,
+                            max_amount: int = 50, names: int = 1000, invalid: float = 0) -> None:
+    """Write input of the mega trader.
+
+    :param stream: Binary output stream.
+    :param size: Amount of lots.
+    :param seed: Random seed.
+    :param days: Issue period in days, a day per 100 lots by default.
+    :param saturation: Ratio of lots to the capacity of the market, days are filled beyond their daily
+        amount of lots and extra lots are rejected if it is greater than 1, the capacity is not limited by default.
+    :param balance: Balance in whole units, 10 000 per lot by default.
+    :param min_percent: The least price percent in tenths.
+    :param max_percent: The greatest price percent in tenths.
+    :param skew: Skew of price percents to the least one, 1 gives the uniform distribution.
+    :param max_amount: The greatest amount of bonds in a lot.
+    :param names: Amount of distinct bond names.
+    :param invalid: Share of lines with invalid price percents.
+    """
+    columns = RandomColumns(seed)
+    days = days or max(1, size // 100)
+    lots_per_day: int = size if saturation is None else max(1, round(size / (days * saturation)))
+    stream.write(f'{days} {lots_per_day} {size * 10000 if balance is None else balance}\n'.encode())
+
+    bond_names: List[str] = [f'bond-{number}' for number in range(1, names + 1)]
+    percents: List[str] = ['{}.{}'.format(*divmod(percent, 10)) for percent in range(max_percent + 1)]
+    for first in range(0, size, CHUNK_SIZE):
+        amount: int = min(CHUNK_SIZE, size - first)
+        chunk_percents: List[str] = list(map(percents.__getitem__,
+                                             columns.skewed(min_percent, max_percent, skew, amount)))
+        if invalid:
+            for position in (position for position, chosen in enumerate(columns.choices(invalid, amount)) if chosen):
+                chunk_percents[position] = INVALID_PERCENTS[position % len(INVALID_PERCENTS)]
+        values: tuple = tuple(chain.from_iterable(zip(
+            columns.integers(1, days, amount), map(bond_names.__getitem__, columns.integers(0, names - 1, amount)),
+            chunk_percents, columns.integers(1, max_amount, amount))))
+        stream.write((('%d %s %s %d\n' * amount) % values).encode())
+
+
+def write_fractions_input(stream: BinaryIO, size: int, seed: int = 0, min_fraction: int = 1,
+                          max_fraction: int = 100000, skew: float = 1, invalid: float = 0) -> None:
+    """Write input of fraction percent calculations.
+
+    :param stream: Binary output stream.
+    :param size: Amount of fractions.
+    :param seed: Random seed.
+    :param min_fraction: The least fraction in thousandths.
+    :param max_fraction: The greatest fraction in thousandths.
+    :param skew: Skew of fractions to the least one, 1 gives the uniform distribution.
+    :param invalid: Share of invalid zero fractions, they are added to the given amount of valid ones.
+    """
+    columns = RandomColumns(seed)
+    stream.write(f'{size}\n'.encode())
+    written: int = 0
+    while written < size:
+        amount: int = min(CHUNK_SIZE, size - written)
+        fractions: List[int] = columns.skewed(min_fraction, max_fraction, skew, amount)
+        if invalid:
+            # Invalid fractions are replaced with the following ones, so they do not count.
+            fractions = list(chain.from_iterable(
+                (0, fraction) if chosen else (fraction,)
+                for fraction, chosen in zip(fractions, columns.choices(invalid, amount))))
+        written += amount
+        values: tuple = tuple(chain.from_iterable(map(divmod, fractions, [1000] * len(fractions))))
+        stream.write((('%d.%03d\n' * len(fractions)) % values).encode())
+
+
+#: Input writers by program commands.
+WRITERS = {
+    'mega-trader': write_mega_trader_input,
+    'fractions': write_fractions_input,
+}
+
+
+def generate(writer: Callable[..., None], size: int, seed: int = 0, **options) -> str:
+    """Generate input in memory.
+
+    :param writer: Input writer, one of WRITERS.
+    :param size: Amount of lots or fractions.
+    :param seed: Random seed.
+    :param options: Options of the writer.
+    :return: Input data.
+    """
+    stream = BytesIO()
+    writer(stream, size, seed, **options)
+    return stream.getvalue().decode()
+
+
+def parse_arguments(argv: Sequence[str]) -> argparse.Namespace:
+    """Parse command line arguments.
+
+    :param argv: Command line arguments without the program name.
+    :return: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    trader_parser = commands.add_parser('mega-trader', help='generate lots')
+    fractions_parser = commands.add_parser('fractions', help='generate fractions')
+    for command_parser in (trader_parser, fractions_parser):
+        command_parser.add_argument('size', type=int, help='amount of lots or fractions')
+        command_parser.add_argument('--seed', type=int, default=0)
+        command_parser.add_argument('--skew', type=float, default=1,
+                                    help='power skewing values to the least one, 1 gives the uniform distribution')
+        command_parser.add_argument('--invalid', type=float, default=0, help='share of invalid lines')
+        command_parser.add_argument('--output', type=argparse.FileType('wb'), default=sys.stdout.buffer,
+                                    help='file to write input to, standard output by default')
+    trader_parser.add_argument('--days', type=int, help='issue period, a day per 100 lots by default')
+    trader_parser.add_argument('--saturation', type=float,
+                               help='ratio of lots to the capacity of the market, not limited by default')
+    trader_parser.add_argument('--balance', type=int, help='balance, 10000 per lot by default')
+    trader_parser.add_argument('--min-percent', type=int, default=900, help='the least price percent in tenths')
+    trader_parser.add_argument('--max-percent', type=int, default=1109, help='the greatest price percent in tenths')
+    trader_parser.add_argument('--max-amount', type=int, default=50, help='the greatest amount of bonds in a lot')
+    trader_parser.add_argument('--names', type=int, default=1000, help='amount of distinct bond names')
+    fractions_parser.add_argument('--min-fraction', type=int, default=1, help='the least fraction in thousandths')
+    fractions_parser.add_argument('--max-fraction', type=int, default=100000,
+                                  help='the greatest fraction in thousandths')
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] = ()) -> None:
+    """Execute main program flow.
+
+    :param argv: Command line arguments without the program name.
+    """
+    arguments: argparse.Namespace = parse_arguments(argv)
+    options = {name: value for name, value in vars(arguments).items() if name not in ('command', 'output')}
+    with arguments.output:
+        WRITERS[arguments.command](arguments.output, **options)
+
+
+if __name__ == '__main__':
+    try:
+        main(sys.argv[1:])
+    except KeyboardInterrupt:
+        exit(0)